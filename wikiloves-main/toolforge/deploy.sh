@@ -20,6 +20,26 @@ scp "$SRC/app.py" \
     "$SRC/config.py" \
     "$SRC/routes.py" \
     "$SRC/queries.py" \
+    "$SRC/file_cache.py" \
+    "$SRC/cache_refresh.py" \
+    "$SRC/negative_cache.py" \
+    "$SRC/miss_batcher.py" \
+    "$SRC/prefetch.py" \
+    "$SRC/request_stats.py" \
+    "$SRC/replica_router.py" \
+    "$SRC/query_watchdog.py" \
+    "$SRC/circuit_breaker.py" \
+    "$SRC/standin_db.py" \
+    "$SRC/db_cassette.py" \
+    "$SRC/column_values.py" \
+    "$SRC/memory_profile.py" \
+    "$SRC/job_store.py" \
+    "$SRC/job_worker.py" \
+    "$SRC/fetch_jobs.py" \
+    "$SRC/job_events.py" \
+    "$SRC/actor_registry.py" \
+    "$SRC/bulk_aggregates.py" \
+    "$SRC/category_fingerprints.py" \
     "$SRC/campaigns_metadata.py" \
     "$SRC/auth.py" \
     "$SRC/campaign_admin.py" \
@@ -29,8 +49,9 @@ scp "$SRC/app.py" \
 echo ""
 echo "Done. Now on Toolforge run:"
 echo "  ssh $USERNAME@login.toolforge.org"
-echo "  cp ~/app.py ~/config.py ~/routes.py ~/queries.py ~/campaigns_metadata.py ~/auth.py ~/campaign_admin.py ~/requirements.txt $TOOLFORGE_APP_DIR/"
+echo "  cp ~/app.py ~/config.py ~/routes.py ~/queries.py ~/file_cache.py ~/cache_refresh.py ~/negative_cache.py ~/miss_batcher.py ~/prefetch.py ~/request_stats.py ~/replica_router.py ~/query_watchdog.py ~/circuit_breaker.py ~/standin_db.py ~/db_cassette.py ~/column_values.py ~/memory_profile.py ~/job_store.py ~/job_worker.py ~/fetch_jobs.py ~/job_events.py ~/actor_registry.py ~/bulk_aggregates.py ~/category_fingerprints.py ~/campaigns_metadata.py ~/auth.py ~/campaign_admin.py ~/requirements.txt $TOOLFORGE_APP_DIR/"
 echo "  become wikiloves-data"
 echo "  toolforge webservice python3.13 restart"
+echo "  toolforge jobs restart wikiloves-worker   # fetch job worker (first time: see job_worker.py)"
 echo ""
 echo "To deploy the frontend, run: bash wikiloves-main/toolforge/deploy_frontend.sh"
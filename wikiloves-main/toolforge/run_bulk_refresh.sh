@@ -33,7 +33,10 @@ for script in fetch_earth.sh fetch_monuments.sh fetch_folklore.sh fetch_science.
   fi
 done
 
-# 3) Process TSVs to JSON (writes shared/data/*_processed.json)
+# 3) Fetch registrations for actors not in the local store yet (shared/data/actors.sqlite)
+python3 "$SRC/actor_registry.py" --fill-from-tsv "$OUTDIR"
+
+# 4) Process TSVs to JSON (writes shared/data/*_processed.json)
 python3 "$SRC/process_all.py" earth monuments folklore science africa food public_art
 
 echo "[$(date -Iseconds)] Daily bulk refresh done"
@@ -0,0 +1,180 @@
+"""
+Local actor -> registration store.
+
+The "new uploader" test only needs user_registration, which never changes
+once an account exists. Instead of joining actor and user in every replica
+query (and repeating the registration on every bulk TSV row), registrations
+are kept in shared/data/actors.sqlite and fetched from the replica only for
+actor ids not seen before.
+
+Usage (between the bulk fetch and process_all.py):
+    python3 actor_registry.py --fill-from-tsv /tmp/wl_bulk
+"""
+
+import csv
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import Config
+
+ACTOR_REGISTRY_FILENAME = 'actors.sqlite'
+
+
+def normalize_registration(value: Any) -> str:
+    """Registration as 'YYYYMMDDHHMMSS', or '' for anonymous/unknown actors."""
+    if value is None:
+        return ''
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8', 'replace')
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y%m%d%H%M%S')
+    value = str(value).strip()
+    if value in ('', 'NULL', '\\N'):
+        return ''
+    return ''.join(ch for ch in value if ch.isdigit())[:14]
+
+
+def is_new_registration(registration: str, start_date: str, end_date: str) -> bool:
+    """True if a normalized registration falls inside [start_date, end_date]."""
+    return bool(registration) and start_date <= registration <= end_date
+
+
+class ActorRegistry:
+    """SQLite-backed actor_id -> registration map, filled incrementally from the replica."""
+
+    def __init__(self, path: Path, fetch_chunk: int = 1000):
+        self.path = path
+        self.fetch_chunk = max(1, fetch_chunk)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            # Shared storage is NFS, where WAL does not work (see job_store.py): use the
+            # rollback journal, also for a file an earlier version switched to WAL
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS actor_registration ('
+                'actor_id INTEGER PRIMARY KEY, registration TEXT NOT NULL)'
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, actor_ids: Iterable[int]) -> Dict[int, str]:
+        """Known registrations for actor_ids (unknown ids are omitted)."""
+        ids = list({int(a) for a in actor_ids})
+        found: Dict[int, str] = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT actor_id, registration FROM actor_registration "
+                    f"WHERE actor_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                found.update(rows)
+        return found
+
+    def get(self, actor_id: int) -> Optional[str]:
+        """Registration for one actor, or None if it has not been fetched yet."""
+        return self.get_many([actor_id]).get(int(actor_id))
+
+    def store(self, rows: Iterable[Tuple[int, Any]]) -> int:
+        """Insert (actor_id, registration) pairs. Returns the number of rows written."""
+        values = [(int(a), normalize_registration(r)) for a, r in rows]
+        if not values:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            conn.executemany('INSERT OR REPLACE INTO actor_registration VALUES (?, ?)', values)
+            conn.commit()
+        return len(values)
+
+    def ensure(self, actor_ids: Iterable[int], use_analytics: bool = False) -> Dict[int, str]:
+        """
+        Registrations for actor_ids, querying the replica only for unknown ids.
+
+        Returns:
+            Dict actor_id -> registration ('' for actors without an account).
+        """
+        ids = {int(a) for a in actor_ids}
+        known = self.get_many(ids)
+        missing = sorted(ids - set(known))
+        if missing:
+            from database import get_db
+            db = get_db()
+            for i in range(0, len(missing), self.fetch_chunk):
+                chunk = missing[i:i + self.fetch_chunk]
+                rows = db.execute_query(
+                    f"""
+SELECT a.actor_id, u.user_registration
+FROM actor a
+LEFT JOIN user u ON a.actor_user = u.user_id
+WHERE a.actor_id IN ({', '.join(str(a) for a in chunk)})
+""",
+                    use_analytics=use_analytics,
+                    template='actor_registrations'
+                )
+                fetched = {int(r['actor_id']): r.get('user_registration') for r in rows}
+                # Ids the replica does not return are stored empty so they are not asked again
+                self.store((a, fetched.get(a)) for a in chunk)
+            known = self.get_many(ids)
+        return known
+
+    def count(self) -> int:
+        """Number of actors stored."""
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM actor_registration').fetchone()[0]
+
+
+def collect_tsv_actor_ids(tsv_dir: Path) -> List[int]:
+    """Distinct actor ids in the bulk upload TSVs ({campaign}_{year}.tsv)."""
+    ids = set()
+    for path in sorted(tsv_dir.glob('*_*.tsv')):
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            if 'actor_id' not in (reader.fieldnames or []):
+                continue
+            for row in reader:
+                try:
+                    ids.add(int(row['actor_id']))
+                except (TypeError, ValueError):
+                    continue
+    return sorted(ids)
+
+
+# Global actor registry instance
+_actor_registry: Optional[ActorRegistry] = None
+
+
+def get_actor_registry() -> ActorRegistry:
+    """Get global actor registry instance."""
+    global _actor_registry
+    if _actor_registry is None:
+        _actor_registry = ActorRegistry(Config.DATA_DIR / ACTOR_REGISTRY_FILENAME)
+    return _actor_registry
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Fill the local actor registration store.')
+    parser.add_argument('--fill-from-tsv', metavar='DIR', default='/tmp/wl_bulk',
+                        help='Fetch registrations for actor ids in bulk TSVs not stored yet')
+    parser.add_argument('--analytics', action='store_true',
+                        help='Query the analytics replica instead of the web replica')
+    args = parser.parse_args()
+    registry = get_actor_registry()
+    actor_ids = collect_tsv_actor_ids(Path(args.fill_from_tsv))
+    before = registry.count()
+    registry.ensure(actor_ids, use_analytics=args.analytics)
+    print(f'{len(actor_ids)} actors in TSVs; {registry.count() - before} fetched, {registry.count()} stored')
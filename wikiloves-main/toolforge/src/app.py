@@ -15,8 +15,10 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from routes import register_routes
 from config import Config
+from database import set_connection_limit
 from auth import auth_bp
 from campaign_admin import admin_bp
+from memory_profile import install_request_profiling
 
 _src_dir = os.path.abspath(os.path.dirname(__file__))
 _static_dir = os.path.join(_src_dir, 'static')
@@ -25,6 +27,7 @@ app = Flask(__name__, static_folder=_static_dir, static_url_path='')
 CORS(app, supports_credentials=True)
 
 app.config.from_object(Config)
+set_connection_limit(Config.DB_MAX_CONNECTIONS)
 
 _secret_file = Config.SHARED_STORAGE / 'flask_secret_key'
 if _secret_file.is_file():
@@ -39,6 +42,7 @@ else:
 register_routes(app)
 app.register_blueprint(auth_bp)
 app.register_blueprint(admin_bp)
+install_request_profiling(app)
 
 
 @app.route('/api')
@@ -58,6 +62,10 @@ def api_info():
             "fetch_all": "/api/fetch/all",
             "fetch_campaign": "/api/fetch/<campaign_slug>",
             "fetch_campaign_year": "/api/fetch/<campaign_slug>/<year>",
+            "jobs": "/api/jobs",
+            "job": "/api/jobs/<job_id>",
+            "job_events": "/api/jobs/events (Server-Sent Events)",
+            "job_control": "/api/jobs/<job_id>/cancel|pause|resume (POST)",
             "prebuild": "/api/prebuild (POST - warm country + uploaders cache)",
             "logs": "/api/logs",
         }
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Benchmark for process_all.process_campaign.
+
+Generates synthetic bulk TSVs ({slug}_{year}.tsv, same columns as
+fetch_all.sh writes) with Monuments-like cardinalities, plus the matching
+used-files TSV and actor registry, then runs process_campaign on each size in
+a fresh subprocess and reports rows/s, wall time per stage, peak RSS and the
+number of output files. Results are saved as JSON so runs on different
+commits can be compared:
+
+    python3 bench_process_all.py --rows 10k 100k 1M
+    python3 bench_process_all.py --rows 10k 100k 1M --compare ~/shared/data/benchmarks/process_all_abc1234.json
+
+Generated inputs are kept in the work directory (by size and seed) and
+reused, since the 10M-row file takes minutes to write.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import Config
+
+SLUG = 'monuments'
+YEAR = 2024
+COUNTRIES = 50  # country categories per year (Monuments has 40-60)
+ROWS_PER_UPLOADER = 12  # Monuments: ~300k files from ~25k uploaders
+MULTI_COUNTRY_SHARE = 0.03  # files in two country categories (two rows, one page_id)
+NON_COUNTRY_SHARE = 0.01  # regional splits process_all skips (..._in_Germany_-_Bavaria)
+LATE_SHARE = 0.05  # files dated after the competition month
+USED_SHARE = 0.25  # files with global usage
+NEW_UPLOADER_SHARE = 0.3  # uploaders registered during the competition
+ANONYMOUS_SHARE = 0.02  # actors without a registration
+
+CHUNK = 50000
+
+
+def parse_rows(value: str) -> int:
+    """'10k' -> 10000, '1M' -> 1000000."""
+    value = value.strip().lower()
+    factor = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * factor)
+
+
+def generate_inputs(work_dir: Path, rows: int, seed: int) -> Path:
+    """
+    Write {slug}_{year}.tsv, {slug}_used_files.tsv and actors.sqlite for one size.
+
+    Returns:
+        The TSV directory (reused if it was already generated).
+    """
+    from actor_registry import ACTOR_REGISTRY_FILENAME, ActorRegistry
+    from process_all import CAMPAIGN_META
+    from standin_db import COUNTRIES as COUNTRY_NAMES
+
+    tsv_dir = work_dir / f'{SLUG}_{rows}_seed{seed}'
+    done_marker = tsv_dir / '.complete'
+    if done_marker.exists():
+        return tsv_dir
+    tsv_dir.mkdir(parents=True, exist_ok=True)
+
+    rng = random.Random(seed)
+    prefix = CAMPAIGN_META[SLUG]['prefix']
+    month = CAMPAIGN_META[SLUG]['comp_month']
+    countries = COUNTRY_NAMES[:COUNTRIES]
+    country_weights = [1.0 / (rank ** 1.1) for rank in range(1, len(countries) + 1)]
+    uploaders = max(50, rows // ROWS_PER_UPLOADER)
+    uploader_weights = [rng.paretovariate(1.2) for _ in range(uploaders)]
+    days = [f'{YEAR}-{month:02d}-{d:02d}' for d in range(1, 31)]
+    late_days = [f'{YEAR}-{month + 1:02d}-{d:02d}' for d in range(1, 31)]
+
+    page_id = 0
+    written = 0
+    with open(tsv_dir / f'{SLUG}_{YEAR}.tsv', 'w', encoding='utf-8', newline='') as f, \
+            open(tsv_dir / f'{SLUG}_used_files.tsv', 'w', encoding='utf-8', newline='') as used:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(['category', 'page_id', 'actor_id', 'actor_name', 'upload_date'])
+        used.write('page_id\n')
+        while written < rows:
+            n = min(CHUNK, rows - written)
+            chosen_countries = rng.choices(countries, weights=country_weights, k=n)
+            chosen_uploaders = rng.choices(range(1, uploaders + 1), weights=uploader_weights, k=n)
+            batch = []
+            for country, actor_id in zip(chosen_countries, chosen_uploaders):
+                page_id += 1
+                roll = rng.random()
+                date = rng.choice(late_days) if roll < LATE_SHARE else rng.choice(days)
+                category = f'{prefix}_{YEAR}_in_{country}'
+                if roll > 1 - NON_COUNTRY_SHARE:
+                    category += '_-_Region'
+                name = f'Uploader_{actor_id}'
+                batch.append((category, page_id, actor_id, name, date))
+                if rng.random() < MULTI_COUNTRY_SHARE:
+                    batch.append((f'{prefix}_{YEAR}_in_{rng.choice(countries)}', page_id, actor_id, name, date))
+                if rng.random() < USED_SHARE:
+                    used.write(f'{page_id}\n')
+            batch = batch[:rows - written]
+            writer.writerows(batch)
+            written += len(batch)
+
+    registry = ActorRegistry(tsv_dir / ACTOR_REGISTRY_FILENAME)
+    registrations = []
+    for actor_id in range(1, uploaders + 1):
+        roll = rng.random()
+        if roll < ANONYMOUS_SHARE:
+            registrations.append((actor_id, None))
+        elif roll < ANONYMOUS_SHARE + NEW_UPLOADER_SHARE:
+            registrations.append((actor_id, f'{YEAR}{month:02d}{rng.randint(1, 28):02d}120000'))
+        else:
+            registrations.append((actor_id, f'{rng.randint(2008, YEAR - 1)}0615120000'))
+    for i in range(0, len(registrations), CHUNK):
+        registry.store(registrations[i:i + CHUNK])
+    done_marker.touch()
+    return tsv_dir
+
+
+def _count_files(path: Path) -> int:
+    return sum(1 for p in path.iterdir() if p.is_file()) if path.exists() else 0
+
+
+def _micro(fn, args: List[tuple]) -> float:
+    """Microseconds per call of fn over args."""
+    start = time.perf_counter()
+    for a in args:
+        fn(*a)
+    return round(1e6 * (time.perf_counter() - start) / max(1, len(args)), 3)
+
+
+def run_child(tsv_dir: Path, rows: int) -> Dict[str, Any]:
+    """Run process_campaign on one generated size (in a fresh process, for its own peak RSS)."""
+    import process_all
+    from actor_registry import ACTOR_REGISTRY_FILENAME, ActorRegistry
+
+    out_dir = tsv_dir / 'out'
+    process_all.TSV_DIR = str(tsv_dir)
+    process_all.DATA_DIR = out_dir
+    process_all.COUNTRY_DETAIL_DIR = out_dir / 'country_detail'
+    process_all.UPLOADERS_DIR = out_dir / 'uploaders'
+    process_all.BULK_DIR = out_dir / process_all.BULK_DIRNAME
+    for d in (process_all.COUNTRY_DETAIL_DIR, process_all.UPLOADERS_DIR, process_all.BULK_DIR):
+        d.mkdir(parents=True, exist_ok=True)
+
+    stages: Dict[str, float] = {}
+    rss_start_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    used_files = process_all.load_used_files(SLUG)
+    stages['load_used_files'] = time.perf_counter() - start
+
+    registry = ActorRegistry(tsv_dir / ACTOR_REGISTRY_FILENAME)
+    run_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_all.process_campaign(SLUG, used_files=used_files, actor_registry=registry, timings=stages)
+    stages['process_campaign'] = time.perf_counter() - run_start
+    total = time.perf_counter() - start
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Per-call cost of the row helpers, on the same kind of inputs
+    prefix = process_all.CAMPAIGN_META[SLUG]['prefix']
+    with open(tsv_dir / f'{SLUG}_{YEAR}.tsv', encoding='utf-8') as f:
+        sample = [line.split('\t') for _, line in zip(range(100000), f)][1:]
+    micro = {
+        'extract_country_us': _micro(process_all.extract_country, [(r[0], prefix, YEAR) for r in sample]),
+        'clean_reg_us': _micro(process_all.clean_reg, [('2024-09-12 10:00:00',)] * len(sample)),
+        'is_file_used_us': _micro(process_all.is_file_used, [(used_files, r[1]) for r in sample]),
+    }
+
+    return {
+        'rows': rows,
+        'wall_sec': round(total, 3),
+        'rows_per_sec': round(rows / total) if total else None,
+        'stages_sec': {k: round(v, 3) for k, v in stages.items()},
+        'peak_rss_mb': round(peak_rss_kb / 1024, 1),
+        'startup_rss_mb': round(rss_start_kb / 1024, 1),
+        'outputs': {
+            'country_detail': _count_files(process_all.COUNTRY_DETAIL_DIR),
+            'uploaders': _count_files(process_all.UPLOADERS_DIR),
+            'bulk': _count_files(process_all.BULK_DIR),
+            'processed_bytes': (out_dir / f'{SLUG}_processed.json').stat().st_size,
+        },
+        'micro': micro,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Lines describing differences against a baseline result file; regressions are flagged."""
+    lines = []
+    base_by_rows = {r['rows']: r for r in baseline.get('results', [])}
+    for r in current['results']:
+        b = base_by_rows.get(r['rows'])
+        if not b:
+            continue
+        speed = r['rows_per_sec'] / b['rows_per_sec'] if b.get('rows_per_sec') else 1.0
+        rss = r['peak_rss_mb'] / b['peak_rss_mb'] if b.get('peak_rss_mb') else 1.0
+        flag = ' REGRESSION' if speed < 1 - tolerance or rss > 1 + tolerance else ''
+        lines.append(
+            f"{r['rows']:>10} rows: rows/s {b['rows_per_sec']} -> {r['rows_per_sec']} ({speed - 1:+.1%}), "
+            f"peak RSS {b['peak_rss_mb']} -> {r['peak_rss_mb']} MB ({rss - 1:+.1%}){flag}"
+        )
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark process_all.process_campaign on synthetic TSVs.')
+    parser.add_argument('--rows', nargs='+', default=['10k', '100k', '1M'], help='Sizes, e.g. 10k 1M 10M')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--work-dir', default=str(Config.DATA_DIR / 'benchmarks' / 'process_all_inputs'))
+    parser.add_argument('--out', default=None, help='Result JSON (default benchmarks/process_all_<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier result JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed slowdown / RSS growth (0.1 = 10%%)')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(Path(args.child), parse_rows(args.rows[0]))))
+        return 0
+
+    work_dir = Path(args.work_dir)
+    commit = git_commit()
+    report: Dict[str, Any] = {
+        'benchmark': 'process_all.process_campaign',
+        'commit': commit,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'results': [],
+    }
+    for size in args.rows:
+        rows = parse_rows(size)
+        start = time.perf_counter()
+        tsv_dir = generate_inputs(work_dir, rows, args.seed)
+        print(f'{rows} rows: inputs ready in {time.perf_counter() - start:.1f}s ({tsv_dir})', flush=True)
+        child = subprocess.run(
+            [sys.executable, __file__, '--child', str(tsv_dir), '--rows', str(rows)],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(child.stderr, file=sys.stderr)
+            return child.returncode
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        report['results'].append(result)
+        print(
+            f"  {result['rows_per_sec']} rows/s, {result['wall_sec']}s "
+            f"(aggregate {result['stages_sec']['aggregate']}s, write {result['stages_sec']['write_outputs']}s), "
+            f"peak RSS {result['peak_rss_mb']} MB, {result['outputs']['country_detail']} countries",
+            flush=True
+        )
+
+    out = Path(args.out) if args.out else Config.DATA_DIR / 'benchmarks' / f'process_all_{commit}.json'
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved {out}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines = compare(report, baseline, args.tolerance)
+        print(f"Compared with {baseline.get('commit')}:")
+        print('\n'.join(lines) or '  (no common sizes)')
+        if any(line.endswith('REGRESSION') for line in lines):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Bulk aggregates written by process_all.py.
+
+For every campaign year the bulk pipeline already has complete per-country
+data (daily stats, every uploader with uploads and images used). It is kept
+in shared/data/bulk/{campaign}_{year}.json as
+
+    {"generated_at": ..., "countries": {country: {"country_detail": {...},
+                                                  "uploaders": {...}}}}
+
+where the two payloads have exactly the shape of the API cache files, so
+prebuild_uploaders_cache can materialize caches from them without querying
+the replica.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from file_cache import write_cache
+
+BULK_DIRNAME = 'bulk'
+
+
+def bulk_year_path(bulk_dir: Path, campaign_slug: str, year: int) -> Path:
+    """Path of the aggregates file for one campaign year."""
+    return bulk_dir / f"{campaign_slug}_{year}.json"
+
+
+def write_bulk_year(
+    bulk_dir: Path,
+    campaign_slug: str,
+    year: int,
+    countries: Dict[str, Dict[str, Any]]
+) -> Path:
+    """
+    Write the aggregates of one campaign year atomically.
+
+    Args:
+        countries: Mapping country -> {'country_detail': ..., 'uploaders': ...}.
+
+    Returns:
+        Path of the written file.
+    """
+    path = bulk_year_path(bulk_dir, campaign_slug, year)
+    write_cache(path, {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'countries': countries,
+    })
+    return path
+
+
+def load_bulk_year(bulk_dir: Path, campaign_slug: str, year: int) -> Dict[str, Dict[str, Any]]:
+    """Read the per-country aggregates of one campaign year. Empty if missing."""
+    try:
+        with open(bulk_year_path(bulk_dir, campaign_slug, year), 'r', encoding='utf-8') as f:
+            return json.load(f).get('countries') or {}
+    except (json.JSONDecodeError, OSError):
+        return {}
@@ -0,0 +1,100 @@
+"""
+Background refresh queue for file-backed API caches.
+
+Requests that find a stale or missing cache entry enqueue a rebuild here
+instead of starting their own thread. Jobs are deduplicated by key and run
+by a small, fixed pool of worker threads so cache misses can never open
+more replica connections than there are workers.
+"""
+
+import itertools
+import queue
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from config import Config
+from logger import get_logger
+
+# Lower number runs first
+PRIORITY_USER = 0
+PRIORITY_PREFETCH = 10
+
+
+class RefreshQueue:
+    """Priority queue of deduplicated cache rebuild jobs."""
+
+    def __init__(self, workers: int = 2):
+        self._workers = max(1, workers)
+        self._queue: 'queue.PriorityQueue' = queue.PriorityQueue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._seq = itertools.count()
+
+    def enqueue(
+        self,
+        key: Hashable,
+        fn: Callable[[], None],
+        priority: int = PRIORITY_USER
+    ) -> bool:
+        """
+        Schedule fn to run in the background unless key is already pending.
+
+        Returns:
+            True if the job was queued, False if it was already pending.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            self._ensure_workers()
+        self._queue.put((priority, next(self._seq), key, fn))
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        """True if key is queued or currently being rebuilt."""
+        with self._lock:
+            return key in self._pending
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and worker count, for status endpoints."""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'queued': self._queue.qsize(),
+                'workers': len(self._threads),
+            }
+
+    def _ensure_workers(self) -> None:
+        # Started lazily: uWSGI forks after import (lazy-apps), and threads
+        # created before the fork would not survive it.
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self._workers:
+            t = threading.Thread(target=self._run, name='cache-refresh', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _run(self) -> None:
+        logger = get_logger()
+        while True:
+            _, _, key, fn = self._queue.get()
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f'Cache refresh failed {key}: {e}', exc_info=True)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+
+# Global refresh queue instance
+_refresh_queue: Optional[RefreshQueue] = None
+
+
+def get_refresh_queue() -> RefreshQueue:
+    """Get global cache refresh queue instance."""
+    global _refresh_queue
+    if _refresh_queue is None:
+        _refresh_queue = RefreshQueue(workers=Config.CACHE_REFRESH_WORKERS)
+    return _refresh_queue
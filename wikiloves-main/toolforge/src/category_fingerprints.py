@@ -0,0 +1,62 @@
+"""
+Category fingerprints for incremental updates.
+
+incremental_update.py probes each recent campaign year with
+QueryManager.execute_category_fingerprints (member count and newest
+cl_timestamp per country category, index-only) and compares the result with
+shared/data/category_fingerprints.json:
+
+    {campaign: {year: {category: {"fp": [members, last_added], "row": {...} | null}}}}
+
+Only categories whose fingerprint changed are aggregated again; the stored
+aggregation rows of the others are reused as they are.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from file_cache import write_cache
+
+FINGERPRINTS_FILENAME = 'category_fingerprints.json'
+
+# Aggregation columns kept per category (everything processor.process_campaign_data reads)
+ROW_FIELDS = ('campaign_slug', 'year', 'country', 'uploads', 'uploaders', 'images_used', 'new_uploaders')
+
+
+def load_fingerprints(path: Path) -> Dict[str, Any]:
+    """Read stored fingerprints. Empty if the file is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def save_fingerprints(path: Path, state: Dict[str, Any]) -> None:
+    """Write fingerprints atomically."""
+    write_cache(path, state)
+
+
+def changed_categories(probe: Dict[str, List[Any]], stored: Dict[str, Any]) -> List[str]:
+    """Categories from the probe that are new or whose fingerprint differs from the stored one."""
+    return sorted(
+        category for category, fingerprint in probe.items()
+        if (stored.get(category) or {}).get('fp') != list(fingerprint)
+    )
+
+
+def stored_row(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """JSON-safe copy of an aggregation row (counts as int), or None for a category without files."""
+    if not row:
+        return None
+    out = {}
+    for field in ROW_FIELDS:
+        value = row.get(field)
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode('utf-8')
+        if field in ('campaign_slug', 'country'):
+            out[field] = (value or '').strip()
+        else:
+            out[field] = int(value or 0)
+    return out
@@ -0,0 +1,138 @@
+"""
+Circuit breakers for the replica hosts.
+
+When a replica is down every query waits for the connect timeout before
+failing, and cache-miss requests pile up behind it. Each host has a breaker:
+after failure_threshold consecutive failures (connection errors or timeouts)
+it opens and queries fail at once with CircuitOpenError, so routes can serve
+the last known data instead. After reset_timeout_sec one query is let through
+as a probe (half-open); its success closes the breaker, its failure opens it
+again.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+from errors import CircuitOpenError
+from logger import get_logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_sec: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_sec = reset_timeout_sec
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._last_error: Optional[str] = None
+
+    def before_call(self) -> None:
+        """
+        Admit one call, or raise CircuitOpenError.
+
+        Every admitted call must be followed by exactly one of record_success,
+        record_failure or record_neutral.
+        """
+        with self._lock:
+            if self._state == OPEN and time.time() - self._opened_at >= self.reset_timeout_sec:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self._rejected += 1
+            retry_in = max(0.0, self.reset_timeout_sec - (time.time() - self._opened_at))
+        raise CircuitOpenError(
+            f"{self.name} replica unavailable (circuit open after {self.failure_threshold} failures; "
+            f"retry in {retry_in:.0f}s)",
+            retry_after=retry_in,
+        )
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                get_logger().info(f'Circuit for {self.name} replica closed')
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    get_logger().warning(
+                        f'Circuit for {self.name} replica opened after {self._failures} failures: {error}'
+                    )
+                self._state = OPEN
+                self._opened_at = time.time()
+            self._probe_in_flight = False
+
+    def record_neutral(self) -> None:
+        """The call ended without saying anything about the host (e.g. it was cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open and not yet due for a probe)."""
+        with self._lock:
+            return self._state == OPEN and time.time() - self._opened_at < self.reset_timeout_sec
+
+    def stats(self) -> Dict[str, Any]:
+        """State and counters, for health/status endpoints."""
+        with self._lock:
+            state = self._state
+            if state == OPEN and time.time() - self._opened_at >= self.reset_timeout_sec:
+                state = HALF_OPEN
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'rejected': self._rejected,
+                'opened_seconds_ago': int(time.time() - self._opened_at) if self._opened_at else None,
+                'last_error': self._last_error,
+            }
+
+
+# Global breakers, one per replica host
+_breakers: Dict[bool, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(use_analytics: bool) -> CircuitBreaker:
+    """Get the global circuit breaker of the analytics or web replica."""
+    with _breakers_lock:
+        breaker = _breakers.get(use_analytics)
+        if breaker is None:
+            breaker = _breakers[use_analytics] = CircuitBreaker(
+                'analytics' if use_analytics else 'web',
+                failure_threshold=Config.DB_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout_sec=Config.DB_BREAKER_RESET_SEC,
+            )
+        return breaker
+
+
+def replica_available() -> bool:
+    """False while the breakers of both replicas are open."""
+    return not (get_circuit_breaker(False).is_open() and get_circuit_breaker(True).is_open())
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of both breakers, keyed by host label."""
+    return {
+        'web': get_circuit_breaker(False).stats(),
+        'analytics': get_circuit_breaker(True).stats(),
+    }
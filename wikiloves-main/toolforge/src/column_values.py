@@ -0,0 +1,41 @@
+"""
+JSON-safe encoding of replica column values.
+
+pymysql returns bytes for varbinary columns and datetime / Decimal for some
+aggregates, none of which JSON can hold. encode_value tags them so that
+decode_value gives back the same types. Used for replica results stored as
+JSON: cassettes (db_cassette.py) and job checkpoints (QueryManager).
+"""
+
+import base64
+import datetime
+import decimal
+from typing import Any
+
+
+def encode_value(value: Any) -> Any:
+    """JSON-safe form of a replica column value (see decode_value)."""
+    if isinstance(value, (bytes, bytearray)):
+        return {'$b': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, datetime.datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'$dec': str(value)}
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    """Column value from its encode_value form."""
+    if isinstance(value, dict) and len(value) == 1:
+        tag, raw = next(iter(value.items()))
+        if tag == '$b':
+            return base64.b64decode(raw)
+        if tag == '$dt':
+            return datetime.datetime.fromisoformat(raw)
+        if tag == '$d':
+            return datetime.date.fromisoformat(raw)
+        if tag == '$dec':
+            return decimal.Decimal(raw)
+    return value
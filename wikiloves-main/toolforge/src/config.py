@@ -23,6 +23,17 @@ class Config:
     LOGS_DIR = SHARED_STORAGE / 'logs'
     DATA_DIR = SHARED_STORAGE / 'data'
     
+    # 'replica' for the Wikimedia replicas, 'standin' for the local SQLite stand-in
+    # generated by standin_db.py (offline development and benchmarks)
+    DB_BACKEND = os.environ.get('WIKILOVES_DB_BACKEND', 'replica')
+    STANDIN_DB_PATH = Path(os.environ.get('WIKILOVES_STANDIN_DB', str(DATA_DIR / 'standin.sqlite')))
+    # Record replica responses to a cassette file, or answer queries from one
+    # (see db_cassette.py): '' (off), 'record' or 'replay'. Replayed queries take
+    # their recorded run time times DB_CASSETTE_LATENCY_SCALE (0 = instant)
+    DB_CASSETTE_MODE = os.environ.get('WIKILOVES_DB_CASSETTE', '')
+    DB_CASSETTE_FILE = Path(os.environ.get('WIKILOVES_DB_CASSETTE_FILE', str(DATA_DIR / 'cassettes' / 'replica.jsonl.gz')))
+    DB_CASSETTE_LATENCY_SCALE = float(os.environ.get('WIKILOVES_DB_CASSETTE_LATENCY', '0'))
+    
     # Ensure directories exist
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
     DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -38,14 +49,103 @@ class Config:
     # Processing settings
     MAX_QUERY_TIME = 10800  # 3 hours in seconds (for analytics DB)
     MAX_WEB_QUERY_TIME = 300  # 5 minutes for web DB
+    # Toolforge max_user_connections: shared by every process of the tool, so each
+    # process type gets a fixed share (checked below). Every process also opens one
+    # short-lived side connection at a time for KILL QUERY (see query_watchdog.py)
+    DB_USER_CONNECTION_LIMIT = 10
+    DB_MAX_CONNECTIONS = 4  # the webservice (uwsgi.ini: processes = 1)
+    SCRIPT_DB_CONNECTIONS = 1  # cron and shell scripts (daily refresh, prebuild), run one at a time
+    DB_SLOT_WAIT_SEC = 120  # wait this long for a free connection before failing
+    # Queries past their deadline (or cancelled by their job) are stopped with
+    # KILL QUERY from a side connection (see query_watchdog.py)
+    DB_WATCHDOG_INTERVAL_SEC = 1.0
+    DB_KILL_GRACE_SEC = 30  # client socket timeout = deadline + grace, as a backstop
+    # Circuit breaker per replica host: open after this many consecutive connection
+    # failures or timeouts, let one probe through after DB_BREAKER_RESET_SEC
+    DB_BREAKER_FAILURE_THRESHOLD = 3
+    DB_BREAKER_RESET_SEC = 60
+    HEALTH_PROBE_CACHE_SEC = 30  # /api/health reuses its last DB probe this long
+    # Queries sent with a template name go to the replica with the best average run
+    # time for that template (see replica_router.py); a timeout is retried once on
+    # the other replica
+    DB_ADAPTIVE_ROUTING = True
+    DB_ROUTING_EWMA_ALPHA = 0.3  # weight of the newest run in the average
+    DB_ROUTING_HEADROOM = 0.8  # a host qualifies if its average is below 80% of its limit
+    DB_ROUTING_MAX_AGE_SEC = 3600  # averages not updated for this long are forgotten
 
     # Uploaders cache: serve from file after first successful query (fast subsequent loads)
+    # Older than the TTL the file is stale: still served, refreshed in background.
+    # Older than MAX_STALE it is not served at all.
     UPLOADERS_CACHE_DIR = DATA_DIR / 'uploaders'
-    UPLOADERS_CACHE_TTL_SEC = 24 * 3600  # 24 hours
+    UPLOADERS_CACHE_TTL_SEC = 24 * 3600  # 24 hours (soft TTL)
+    UPLOADERS_CACHE_MAX_STALE_SEC = 7 * 24 * 3600  # 7 days (hard TTL)
     # Country detail cache: same idea so /api/data/<campaign>/<year>/<country> is instant
     COUNTRY_DETAIL_CACHE_DIR = DATA_DIR / 'country_detail'
-    COUNTRY_DETAIL_CACHE_TTL_SEC = 24 * 3600  # 24 hours
+    COUNTRY_DETAIL_CACHE_TTL_SEC = 24 * 3600  # 24 hours (soft TTL)
+    COUNTRY_DETAIL_CACHE_MAX_STALE_SEC = 7 * 24 * 3600  # 7 days (hard TTL)
+    # /api/query results (same soft/hard TTL scheme)
+    QUERY_CACHE_DIR = DATA_DIR / 'query'
+    QUERY_CACHE_TTL_SEC = 6 * 3600  # 6 hours (soft TTL)
+    QUERY_CACHE_MAX_STALE_SEC = 7 * 24 * 3600  # 7 days (hard TTL)
+    # Progressive mode: on a cache miss answer at once with index-only upload counts
+    # (partial: true) while the full aggregation fills the cache in the background.
+    # Per request: ?progressive=1 / ?progressive=0
+    PROGRESSIVE_RESPONSES = False
+    # Per campaign-year aggregates from process_all.py; prebuild derives both caches from them
+    BULK_DATA_DIR = DATA_DIR / 'bulk'
+    # Background threads rebuilding stale/missing cache entries (each holds one DB connection)
+    CACHE_REFRESH_WORKERS = 2
+    # Negative cache: keys the DB confirmed empty (for campaign years manifest.json does not cover)
+    NEGATIVE_CACHE_TTL_SEC = 6 * 3600  # 6 hours
+    NEGATIVE_CACHE_MAX_ENTRIES = 10000
+    # Cache misses for the same campaign/year within this window share one grouped query
+    MISS_BATCH_WINDOW_SEC = 1.0
+    MISS_BATCH_MAX_SIZE = 50  # categories per grouped query
+    UPLOADERS_PER_COUNTRY_LIMIT = 500
+    # Prefetch: when /api/data/<campaign>[/summary] is served, warm caches for the
+    # top countries of the most recent years at low priority
+    PREFETCH_ENABLED = True
+    PREFETCH_TOP_N = 5
+    PREFETCH_RECENT_YEARS = 2
+    PREFETCH_QUERIES_PER_MINUTE = 4  # grouped queries, shared by all campaigns
+    PREFETCH_MIN_INTERVAL_SEC = 10 * 60  # per campaign
+    # Request statistics (hits per cache key) used to rank prebuild work
+    REQUEST_STATS_FLUSH_SEC = 60
+    REQUEST_STATS_HALF_LIFE_SEC = 7 * 24 * 3600  # hits lose half their weight per week
+    # Prebuild limits (None = unlimited); each task costs two replica queries
+    PREBUILD_RECENT_YEARS = 3  # always prebuilt; older keys only when requested
+    PREBUILD_MAX_SECONDS = None
+    PREBUILD_MAX_QUERIES = None
+    PREBUILD_WORKERS = 1  # >1 builds tasks concurrently (capped by the process's connection share)
+    PREBUILD_QUERY_TIMEOUT_SEC = 600  # per query
+    PREBUILD_RETRIES = 2  # retries per task on database errors
+    PREBUILD_RETRY_BACKOFF_SEC = 5  # doubled after each retry
     
+    # Fetch job queue (job_store.py): /api/fetch/* enqueues, job_worker.py runs the jobs
+    JOB_DB_PATH = DATA_DIR / 'jobs.sqlite'
+    JOB_POLL_INTERVAL_SEC = 5  # idle worker checks the queue this often
+    JOB_HEARTBEAT_SEC = 30
+    JOB_CONTROL_POLL_SEC = 2  # running jobs notice pause/cancel requests this fast
+    # Replica connections all running fetch jobs may hold together (each fetch job
+    # holds one); jobs on different campaigns/years run concurrently up to this.
+    # The job worker's share of DB_USER_CONNECTION_LIMIT
+    JOB_DB_CONNECTIONS = 2
+    # A running job without a heartbeat for this long lost its worker: requeue it,
+    # or fail it after JOB_MAX_ATTEMPTS
+    JOB_STALE_SEC = 300
+    JOB_MAX_ATTEMPTS = 3
+    JOB_HISTORY_DAYS = 30  # finished jobs are deleted after this
+    # Job progress over Server-Sent Events (/api/jobs/events, see job_events.py).
+    # Each open stream holds a uWSGI thread (threads = 2), so only SSE_MAX_STREAMS
+    # stream at once; other clients get the current events and reconnect after SSE_RETRY_MS
+    SSE_POLL_INTERVAL_SEC = 1.0  # job store reads per web process while anyone watches
+    SSE_MAX_STREAMS = 1
+    SSE_STREAM_MAX_SEC = 60  # then the client reconnects (EventSource does this itself)
+    SSE_RETRY_MS = 3000
+    SSE_KEEPALIVE_SEC = 15
+    SSE_FINISHED_KEEP_SEC = 120  # finished jobs stay in the event list this long
+    SSE_IDLE_STOP_SEC = 60  # broadcaster thread stops when nobody asked for this long
+
     # Job settings
     DAILY_REFRESH_HOUR = 2  # UTC hour for daily refresh
     INCREMENTAL_INTERVAL_HOURS = 6  # Hours between incremental updates
@@ -53,9 +153,30 @@ class Config:
     # Campaign settings
     RECENT_YEARS_THRESHOLD = 2  # Years to check in incremental updates
     
+    # Memory profiling (memory_profile.py): tracemalloc per request and job phase.
+    # Slows the process down; enable only while diagnosing worker reloads
+    MEMORY_PROFILE = os.environ.get('WIKILOVES_MEMORY_PROFILE', '') not in ('', '0')
+    MEMORY_PROFILE_DIR = DATA_DIR / 'memory_profile'
+    MEMORY_PROFILE_FRAMES = 10  # traceback depth kept per allocation
+    MEMORY_PROFILE_TOP = 15  # allocation sites kept per phase
+    # uWSGI worker memory limits, as in uwsgi.ini (used by the memory report)
+    UWSGI_LIMIT_AS_MB = 512
+    UWSGI_RELOAD_ON_AS_MB = 400
+    UWSGI_RELOAD_ON_RSS_MB = 200
+    
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FORMAT = 'json'  # Use JSON format for structured logging
     
     # API settings
     API_TIMEOUT = 300  # 5 minutes timeout for API endpoints
+
+
+# Connection shares of the webservice, the job worker and scripts, each plus one
+# KILL QUERY connection, must fit the replica's per-user limit together
+_DB_CONNECTIONS_NEEDED = Config.DB_MAX_CONNECTIONS + Config.JOB_DB_CONNECTIONS + Config.SCRIPT_DB_CONNECTIONS + 3
+if _DB_CONNECTIONS_NEEDED > Config.DB_USER_CONNECTION_LIMIT:
+    raise ValueError(
+        f"DB_MAX_CONNECTIONS + JOB_DB_CONNECTIONS + SCRIPT_DB_CONNECTIONS + 3 kill connections "
+        f"= {_DB_CONNECTIONS_NEEDED} exceeds DB_USER_CONNECTION_LIMIT ({Config.DB_USER_CONNECTION_LIMIT})"
+    )
@@ -7,10 +7,52 @@ import pymysql
 import os
 from typing import List, Dict, Optional, Any
 from contextlib import contextmanager
+import math
+import threading
 import time
 
 from config import Config
-from errors import DatabaseError, QueryTimeoutError
+from errors import CircuitOpenError, DatabaseError, QueryCancelledError, QueryDeadlineError, QueryTimeoutError
+from circuit_breaker import get_circuit_breaker
+from db_cassette import get_cassette
+from logger import get_logger
+from query_watchdog import CANCELLED, DEADLINE, current_deadline, current_token, get_query_watchdog
+from replica_router import get_replica_router, host_label, host_limit
+from standin_db import connect_standin, kill_connection_query
+
+# Replica connections this process may hold: its share of DB_USER_CONNECTION_LIMIT.
+# Scripts keep SCRIPT_DB_CONNECTIONS; the webservice and the job worker take their
+# shares at startup with set_connection_limit
+_connection_limit = Config.SCRIPT_DB_CONNECTIONS
+_connection_slots = threading.BoundedSemaphore(_connection_limit)
+
+
+def set_connection_limit(limit: int) -> None:
+    """Set this process's replica connection share; call at startup, before any query."""
+    global _connection_limit, _connection_slots
+    _connection_limit = limit
+    _connection_slots = threading.BoundedSemaphore(limit)
+
+
+def connection_limit() -> int:
+    """Replica connections this process may hold at once."""
+    return _connection_limit
+
+# MySQL max_execution_time exceeded, MariaDB max_statement_time exceeded
+_STATEMENT_TIMEOUT_ERRNOS = (3024, 1969)
+
+
+def _is_client_error(e: Exception) -> bool:
+    """True for client-side errors (CR_* 2000-2999: cannot connect, server gone away, lost connection)."""
+    return bool(e.args) and isinstance(e.args[0], int) and 2000 <= e.args[0] < 3000
+
+
+def _is_timeout_error(e: Exception) -> bool:
+    """True for client read timeouts and server-side statement time limits."""
+    if e.args and e.args[0] in _STATEMENT_TIMEOUT_ERRNOS:
+        return True
+    message = str(e).lower()
+    return 'timeout' in message or 'timed out' in message
 
 
 class DatabaseConnection:
@@ -77,17 +119,31 @@ class DatabaseConnection:
         return credentials
     
     @contextmanager
-    def get_connection(self, use_analytics: bool = True, timeout: int = 60):
+    def get_connection(
+        self,
+        use_analytics: bool = True,
+        timeout: int = 60,
+        query_timeout: Optional[int] = None
+    ):
         """
         Get a database connection context manager.
         
+        Waits for one of this process's connection slots (see set_connection_limit).
+        The webservice, the job worker and scripts each hold a fixed share of the
+        replica's per-user connection limit (Config.DB_USER_CONNECTION_LIMIT), so
+        together they stay within it.
+        
         Args:
             use_analytics: If True, use analytics DB (for long queries up to 3 hours).
                          If False, use web DB (for quick queries).
             timeout: Connection timeout in seconds (default 60 for slow Toolforge→DB links).
+            query_timeout: Read/execution timeout in seconds (defaults to the host's maximum).
         
         Yields:
             pymysql.Connection: Database connection object.
+        
+        Raises:
+            DatabaseError: If no connection slot frees up within DB_SLOT_WAIT_SEC.
         """
         credentials = self._get_credentials()
         
@@ -97,21 +153,34 @@ class DatabaseConnection:
         else:
             host = self.config.DB_WEB_HOST
             max_execution_time = self.config.MAX_WEB_QUERY_TIME
+        if query_timeout:
+            max_execution_time = min(query_timeout, max_execution_time)
         
+        slots = _connection_slots
+        if not slots.acquire(timeout=self.config.DB_SLOT_WAIT_SEC):
+            raise DatabaseError(
+                f"No free database connection slot after {self.config.DB_SLOT_WAIT_SEC}s "
+                f"({_connection_limit} in use)"
+            )
         connection = None
         try:
-            connection = pymysql.connect(
-                host=host,
-                port=credentials.get('port', self.config.DB_PORT),
-                user=credentials.get('user'),
-                password=credentials.get('password'),
-                database=self.config.DB_NAME,
-                charset='utf8mb4',
-                connect_timeout=timeout,
-                read_timeout=max_execution_time,
-                write_timeout=max_execution_time,
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            if self.config.DB_BACKEND == 'standin':
+                connection = connect_standin(self.config.STANDIN_DB_PATH)
+            else:
+                connection = pymysql.connect(
+                    host=host,
+                    port=credentials.get('port', self.config.DB_PORT),
+                    user=credentials.get('user'),
+                    password=credentials.get('password'),
+                    database=self.config.DB_NAME,
+                    charset='utf8mb4',
+                    connect_timeout=timeout,
+                    # The watchdog kills the statement server-side at its deadline; the
+                    # socket timeout is only a backstop in case that fails
+                    read_timeout=max_execution_time + self.config.DB_KILL_GRACE_SEC,
+                    write_timeout=max_execution_time + self.config.DB_KILL_GRACE_SEC,
+                    cursorclass=pymysql.cursors.DictCursor
+                )
             
             # Set session max_execution_time if supported (MySQL 8.0.3+).
             # Analytics replica may not support it; skip without failing.
@@ -122,71 +191,246 @@ class DatabaseConnection:
             except pymysql.Error:
                 # Unknown system variable 'max_execution_time' on older replicas - ignore
                 pass
-            
-            yield connection
-            
         except pymysql.Error as e:
-            raise DatabaseError(f"Database connection error: {str(e)}") from e
-        finally:
             if connection:
                 connection.close()
+            slots.release()
+            raise DatabaseError(f"Database connection error: {str(e)}") from e
+        
+        # Errors raised by the caller's statements propagate unchanged, so
+        # execute_query can tell timeouts from other failures.
+        try:
+            yield connection
+        finally:
+            connection.close()
+            slots.release()
     
     def execute_query(
         self,
         query: str,
         use_analytics: bool = True,
         params: Optional[tuple] = None,
-        timeout: Optional[int] = None
+        timeout: Optional[int] = None,
+        template: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Execute a SQL query and return results as a list of dictionaries.
         
+        Queries with a template name are routed by observed latency (see
+        replica_router.py): use_analytics is then only the initial preference,
+        and a timeout is retried once on the other replica (unless the
+        enclosing query_scope deadline has passed), as is a query whose host
+        has an open circuit breaker.
+        
         Args:
             query: SQL query string.
             use_analytics: Use analytics DB for long queries.
             params: Query parameters for parameterized queries.
             timeout: Query timeout in seconds (overrides default).
+            template: Optional query template name used for routing.
         
         Returns:
             List of dictionaries, each representing a row.
         
         Raises:
             DatabaseError: If query execution fails.
-            QueryTimeoutError: If query exceeds timeout.
+            QueryTimeoutError: If query exceeds timeout or the query_scope deadline.
+            QueryCancelledError: If the query_scope token was cancelled.
+            CircuitOpenError: If the replica (both replicas, when routed) is marked unavailable.
+            CassetteMissError: If replaying a cassette that does not have the query.
         """
-        max_time = timeout or (self.config.MAX_QUERY_TIME if use_analytics else self.config.MAX_WEB_QUERY_TIME)
+        cassette = get_cassette()
+        if cassette is None:
+            return self._execute_routed(query, use_analytics, params, timeout, template)
+        if cassette.replaying:
+            return cassette.replay(query, params)
         start_time = time.time()
+        rows = self._execute_routed(query, use_analytics, params, timeout, template)
+        cassette.record(query, params, rows, time.time() - start_time, template)
+        return rows
+    
+    def _execute_routed(
+        self,
+        query: str,
+        use_analytics: bool,
+        params: Optional[tuple],
+        timeout: Optional[int],
+        template: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Run a query on the caller's host, or on the routed host when it has a template."""
+        if not template or not self.config.DB_ADAPTIVE_ROUTING:
+            return self._execute_on_host(query, use_analytics, params, timeout)
         
+        router = get_replica_router()
+        chosen = router.choose(template, use_analytics, timeout)
+        for analytics in (chosen, not chosen):
+            start_time = time.time()
+            scope_deadline = current_deadline()
+            # The limit this attempt runs with: caller timeout or host maximum, tightened by the scope
+            limit = host_limit(analytics, timeout)
+            if scope_deadline is not None:
+                limit = max(0.0, min(limit, scope_deadline - start_time))
+            try:
+                rows = self._execute_on_host(query, analytics, params, timeout)
+            except QueryTimeoutError:
+                router.record(template, analytics, time.time() - start_time, timed_out=True, timeout=limit)
+                if analytics != chosen or (scope_deadline is not None and time.time() >= scope_deadline):
+                    raise
+                get_logger().warning(
+                    f"Query '{template}' timed out on the {host_label(analytics)} replica, "
+                    f"retrying on the {host_label(not analytics)} replica"
+                )
+                continue
+            except CircuitOpenError:
+                if analytics != chosen:
+                    raise
+                continue
+            router.record(template, analytics, time.time() - start_time)
+            return rows
+    
+    def _execute_on_host(
+        self,
+        query: str,
+        use_analytics: bool,
+        params: Optional[tuple],
+        timeout: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Run a query on one replica through the host's circuit breaker.
+        
+        Connection failures and host-limit timeouts count against the host; errors the
+        server itself returns (bad SQL, ...) show that it is up.
+        
+        Raises:
+            CircuitOpenError: If the breaker rejects the call without trying the host.
+        """
+        breaker = get_circuit_breaker(use_analytics)
+        breaker.before_call()
         try:
-            with self.get_connection(use_analytics=use_analytics, timeout=60) as conn:
-                with conn.cursor() as cursor:
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
-                    
-                    # Fetch all results
-                    results = cursor.fetchall()
-                    
-                    # Convert to list of dicts if needed
-                    if results and isinstance(results[0], dict):
-                        return list(results)
-                    else:
-                        # Convert tuple results to dicts using column names
-                        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                        return [dict(zip(columns, row)) for row in results]
-        
-        except pymysql.OperationalError as e:
-            if 'timeout' in str(e).lower() or 'timed out' in str(e).lower():
-                elapsed = time.time() - start_time
-                raise QueryTimeoutError(
-                    f"Query exceeded timeout of {max_time}s (elapsed: {elapsed:.2f}s)"
-                ) from e
-            raise DatabaseError(f"Query execution error: {str(e)}") from e
+            rows = self._run_statement(query, use_analytics, params, timeout)
+        except (QueryCancelledError, QueryDeadlineError):
+            # The caller stopped the query; says nothing about the host
+            breaker.record_neutral()
+            raise
+        except QueryTimeoutError as e:
+            breaker.record_failure(str(e))
+            raise
+        except DatabaseError as e:
+            cause = e.__cause__
+            if isinstance(cause, pymysql.Error) and _is_client_error(cause):
+                breaker.record_failure(str(e))
+            elif isinstance(cause, pymysql.Error):
+                breaker.record_success()
+            else:
+                # e.g. no free connection slot: says nothing about the host
+                breaker.record_neutral()
+            raise
+        except BaseException:
+            breaker.record_neutral()
+            raise
+        breaker.record_success()
+        return rows
+    
+    def _run_statement(
+        self,
+        query: str,
+        use_analytics: bool,
+        params: Optional[tuple],
+        timeout: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Run a query on one replica (see execute_query).
+        
+        The statement's deadline is now + timeout (or the host's maximum),
+        tightened by the enclosing query_scope. The query watchdog kills it
+        server-side when the deadline passes or the scope's token is cancelled.
+        """
+        host_max_time = self.config.MAX_QUERY_TIME if use_analytics else self.config.MAX_WEB_QUERY_TIME
+        max_time = timeout or host_max_time
+        start_time = time.time()
+        deadline = start_time + max_time
+        scope_deadline = current_deadline()
+        if scope_deadline is not None:
+            deadline = min(deadline, scope_deadline)
+        # Stopped before the host's own limit: the caller's deadline, not a slow host
+        timeout_error = QueryDeadlineError if deadline < start_time + host_max_time else QueryTimeoutError
+        token = current_token()
+        if token is not None and token.cancelled:
+            raise QueryCancelledError(f"Query cancelled before start ({token.reason})")
+        if deadline <= start_time:
+            raise QueryDeadlineError("Query deadline passed before start")
+        
+        watchdog = get_query_watchdog()
+        killed = None
+        try:
+            with self.get_connection(
+                use_analytics=use_analytics, timeout=60, query_timeout=math.ceil(deadline - start_time)
+            ) as conn:
+                handle = watchdog.register(conn.thread_id(), use_analytics, deadline, token)
+                try:
+                    with conn.cursor() as cursor:
+                        if params:
+                            cursor.execute(query, params)
+                        else:
+                            cursor.execute(query)
+                        
+                        # Fetch all results
+                        results = cursor.fetchall()
+                finally:
+                    killed = watchdog.unregister(handle)
+                
+                # Convert to list of dicts if needed
+                if results and isinstance(results[0], dict):
+                    return list(results)
+                else:
+                    # Convert tuple results to dicts using column names
+                    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                    return [dict(zip(columns, row)) for row in results]
         
         except pymysql.Error as e:
+            elapsed = time.time() - start_time
+            if killed == CANCELLED or (killed is None and token is not None and token.cancelled):
+                raise QueryCancelledError(
+                    f"Query cancelled ({token.reason if token else 'cancelled'}, elapsed: {elapsed:.2f}s)"
+                ) from e
+            if killed == DEADLINE or _is_timeout_error(e):
+                raise timeout_error(
+                    f"Query exceeded timeout of {deadline - start_time:.0f}s (elapsed: {elapsed:.2f}s)"
+                ) from e
+            if isinstance(e, pymysql.OperationalError):
+                raise DatabaseError(f"Query execution error: {str(e)}") from e
             raise DatabaseError(f"Database error: {str(e)}") from e
     
+    def kill_query(self, use_analytics: bool, connection_id: int) -> None:
+        """
+        Stop the statement running on another connection with KILL QUERY.
+        
+        Uses its own short-lived connection outside the connection slots: the
+        kill must not wait behind the queries it is meant to stop. The watchdog
+        kills one query at a time, so this is the one extra connection per
+        process that Config's connection budget reserves.
+        """
+        if self.config.DB_BACKEND == 'standin':
+            kill_connection_query(connection_id)
+            return
+        credentials = self._get_credentials()
+        connection = pymysql.connect(
+            host=self.config.DB_ANALYTICS_HOST if use_analytics else self.config.DB_WEB_HOST,
+            port=credentials.get('port', self.config.DB_PORT),
+            user=credentials.get('user'),
+            password=credentials.get('password'),
+            database=self.config.DB_NAME,
+            charset='utf8mb4',
+            connect_timeout=30,
+            read_timeout=30,
+            write_timeout=30
+        )
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"KILL QUERY {int(connection_id)}")
+        finally:
+            connection.close()
+    
     def execute_campaign_query(
         self,
         campaign_slug: str,
@@ -218,11 +462,12 @@ class DatabaseConnection:
         Returns:
             Tuple of (success: bool, error_message: Optional[str])
         """
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return True, None
         try:
-            with self.get_connection(use_analytics=use_analytics) as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    cursor.fetchone()
+            # Through the circuit breaker: no connection attempt while it is open
+            self._execute_on_host("SELECT 1", use_analytics, None, None)
             return True, None
         except Exception as e:
             return False, str(e)
@@ -0,0 +1,185 @@
+"""
+Record/replay of replica responses ("cassettes").
+
+In record mode DatabaseConnection.execute_query appends every query it runs
+(normalized text, parameters, result rows and wall time) to a gzip JSON-lines
+cassette file. In replay mode execute_query answers from the cassette without
+touching any database, optionally sleeping for the recorded run time (scaled),
+so execute_campaign_quarry_style, prebuild_uploaders_cache and the routes can
+be benchmarked offline against production-shaped data.
+
+    WIKILOVES_DB_CASSETTE=record WIKILOVES_DB_CASSETTE_FILE=earth.jsonl.gz python3 prebuild_uploaders_cache.py ...
+    WIKILOVES_DB_CASSETTE=replay WIKILOVES_DB_CASSETTE_FILE=earth.jsonl.gz WIKILOVES_DB_CASSETTE_LATENCY=1 ...
+
+A query recorded several times is replayed in recording order, the last
+recording repeating. Deadlines and cancel tokens of the enclosing query_scope
+apply to replayed latencies as they do to live queries.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from column_values import decode_value, encode_value
+from config import Config
+from errors import CassetteMissError, QueryCancelledError, QueryTimeoutError
+from logger import get_logger
+from query_watchdog import current_deadline, current_token
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """Query text with whitespace collapsed and the trailing semicolon dropped."""
+    return _WHITESPACE.sub(' ', query).strip().rstrip(';').rstrip()
+
+
+def query_key(query: str, params: Optional[tuple] = None) -> str:
+    """Stable key of a query and its parameters."""
+    text = normalize_query(query) + '\x00' + json.dumps(list(params or ()), default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """One cassette file, open for recording or for replay."""
+
+    def __init__(self, path: Path, mode: str, latency_scale: float = 0.0):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        # key -> recorded entries, and how many of them were replayed so far
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._recorded = 0
+        self._replayed = 0
+        self._misses = 0
+        if mode == REPLAY:
+            self._load()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _load(self) -> None:
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry['key'], []).append(entry)
+        get_logger().info(
+            f"Replaying {sum(len(e) for e in self._entries.values())} recorded queries from {self.path}"
+        )
+
+    def record(
+        self,
+        query: str,
+        params: Optional[tuple],
+        rows: List[Dict[str, Any]],
+        seconds: float,
+        template: Optional[str] = None
+    ) -> None:
+        """Append one query and its result to the cassette."""
+        columns = list(rows[0]) if rows else []
+        entry = {
+            'key': query_key(query, params),
+            'query': normalize_query(query),
+            'params': [encode_value(p) for p in (params or ())],
+            'template': template,
+            'seconds': round(seconds, 4),
+            'columns': columns,
+            'rows': [[encode_value(row.get(c)) for c in columns] for row in rows],
+        }
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            # Each append is its own gzip member; gzip.open reads them back as one stream
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(line)
+            self._recorded += 1
+
+    def replay(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """
+        Answer a query from the cassette.
+
+        Raises:
+            CassetteMissError: If the query was never recorded.
+            QueryTimeoutError: If the replayed latency runs past the query_scope deadline.
+            QueryCancelledError: If the query_scope token is cancelled while waiting.
+        """
+        key = query_key(query, params)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self._misses += 1
+                raise CassetteMissError(
+                    f"Query not in cassette {self.path.name}: {normalize_query(query)[:200]}"
+                )
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            entry = entries[min(index, len(entries) - 1)]
+            self._replayed += 1
+        if self.latency_scale > 0:
+            self._wait(entry['seconds'] * self.latency_scale)
+        columns = entry['columns']
+        return [{c: decode_value(v) for c, v in zip(columns, values)} for values in entry['rows']]
+
+    def _wait(self, seconds: float) -> None:
+        start = time.time()
+        deadline = current_deadline()
+        token = current_token()
+        end = start + seconds
+        while True:
+            now = time.time()
+            if token is not None and token.cancelled:
+                raise QueryCancelledError(f"Query cancelled after {now - start:.2f}s")
+            if deadline is not None and now >= deadline:
+                raise QueryTimeoutError(
+                    f"Query exceeded timeout of {max(0, int(deadline - start))}s (elapsed: {now - start:.2f}s)"
+                )
+            if now >= end:
+                return
+            time.sleep(min(0.05, end - now))
+
+    def stats(self) -> Dict[str, Any]:
+        """Mode and counters, for status endpoints."""
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'file': str(self.path),
+                'recorded': self._recorded,
+                'replayed': self._replayed,
+                'misses': self._misses,
+                'latency_scale': self.latency_scale,
+            }
+
+
+# Global cassette, None unless Config.DB_CASSETTE_MODE is set
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Get the global cassette, or None when recording/replay is off."""
+    global _cassette
+    if not Config.DB_CASSETTE_MODE:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(
+                Config.DB_CASSETTE_FILE,
+                Config.DB_CASSETTE_MODE,
+                latency_scale=Config.DB_CASSETTE_LATENCY_SCALE,
+            )
+        return _cassette
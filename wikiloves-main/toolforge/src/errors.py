@@ -18,6 +18,29 @@ class QueryTimeoutError(DatabaseError):
     pass
 
 
+class QueryDeadlineError(QueryTimeoutError):
+    """Query stopped at its caller's deadline (timeout argument or query_scope), before the host's own limit."""
+    pass
+
+
+class QueryCancelledError(DatabaseError):
+    """Query was stopped because its owner no longer wanted the result."""
+    pass
+
+
+class CircuitOpenError(DatabaseError):
+    """Replica marked unavailable by its circuit breaker; the query was not attempted."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CassetteMissError(DatabaseError):
+    """Query not found in the replay cassette."""
+    pass
+
+
 class ProcessingError(WikiLovesError):
     """Data processing error."""
     pass
@@ -21,8 +21,9 @@ fetch_campaign_year() {
     $MARIA -e "
 SELECT
   cl.cl_to AS category,
+  p.page_id,
+  a.actor_id,
   a.actor_name,
-  u.user_registration,
   DATE(img.img_timestamp) AS upload_date
 FROM categorylinks cl
 JOIN page p ON cl.cl_from = p.page_id
@@ -30,7 +31,6 @@ JOIN page p ON cl.cl_from = p.page_id
   AND p.page_is_redirect = 0
 JOIN image img ON img.img_name = p.page_title
 JOIN actor a ON img.img_actor = a.actor_id
-LEFT JOIN user u ON a.actor_user = u.user_id
 WHERE cl.cl_to LIKE '${pattern}'
   AND cl.cl_to NOT LIKE '%/%'
   AND cl.cl_to NOT LIKE '%_by_%'
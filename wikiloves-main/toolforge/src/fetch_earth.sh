@@ -22,8 +22,9 @@ fetch_campaign_year() {
     $MARIA -e "
 SELECT
   cl.cl_to AS category,
+  p.page_id,
+  a.actor_id,
   a.actor_name,
-  u.user_registration,
   DATE(img.img_timestamp) AS upload_date
 FROM categorylinks cl
 JOIN page p ON cl.cl_from = p.page_id
@@ -31,7 +32,6 @@ JOIN page p ON cl.cl_from = p.page_id
   AND p.page_is_redirect = 0
 JOIN image img ON img.img_name = p.page_title
 JOIN actor a ON img.img_actor = a.actor_id
-LEFT JOIN user u ON a.actor_user = u.user_id
 WHERE cl.cl_to LIKE '${pattern}'
   AND cl.cl_to NOT LIKE '%/%'
   AND cl.cl_to NOT LIKE '%_by_%'
@@ -66,6 +66,23 @@ GROUP BY cl.cl_to
 " > "${OUTDIR}/earth_images_used.tsv"
 echo "  -> images_used saved to ${OUTDIR}/earth_images_used.tsv"
 
+echo ""
+echo "--- Fetching used files (page ids with global usage) ---"
+$MARIA -e "
+SELECT DISTINCT
+  p.page_id
+FROM categorylinks cl
+JOIN page p ON cl.cl_from = p.page_id
+  AND p.page_namespace = 6
+  AND p.page_is_redirect = 0
+WHERE cl.cl_to LIKE '${PREFIX}_%'
+  AND cl.cl_to NOT LIKE '%/%'
+  AND cl.cl_to NOT LIKE '%_by_%'
+  AND cl.cl_to NOT LIKE '%_at_%'
+  AND EXISTS (SELECT 1 FROM globalimagelinks gil WHERE gil.gil_to = p.page_title)
+" > "${OUTDIR}/earth_used_files.tsv"
+echo "  -> used files saved to ${OUTDIR}/earth_used_files.tsv"
+
 echo ""
 echo "============================================"
 echo "  Earth fetch complete!"
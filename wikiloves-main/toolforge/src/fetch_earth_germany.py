@@ -58,44 +58,48 @@ CATEGORY = 'Images_from_Wiki_Loves_Earth_2025_in_Germany'
 
 DETAIL_SQL = f"""
 SELECT 
-    COUNT(DISTINCT i.img_name) AS uploads,
-    COUNT(DISTINCT a.actor_name) AS uploaders,
-    COUNT(DISTINCT CASE WHEN il_used.il_to IS NOT NULL THEN i.img_name END) AS images_used,
+    COUNT(*) AS uploads,
+    COUNT(DISTINCT f.actor_id) AS uploaders,
+    SUM(f.is_used) AS images_used,
     COUNT(DISTINCT CASE 
         WHEN u.user_registration >= '20250501000000' AND u.user_registration <= '20250531235959'
-        THEN a.actor_name
+        THEN f.actor_id
     END) AS new_uploaders
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id AND p.page_namespace = 6 AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
+FROM (
+    SELECT p.page_id, i.img_actor AS actor_id,
+        EXISTS (SELECT 1 FROM imagelinks il WHERE il.il_to = p.page_title) AS is_used
+    FROM categorylinks cl
+    JOIN page p ON cl.cl_from = p.page_id AND p.page_namespace = 6 AND p.page_is_redirect = 0
+    JOIN image i ON i.img_name = p.page_title
+    WHERE cl.cl_type = 'file'
+      AND cl.cl_to = '{CATEGORY}'
+) f
+LEFT JOIN actor act ON act.actor_id = f.actor_id
 LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND cl.cl_to = '{CATEGORY}'
 """
 
 UPLOADERS_SQL = f"""
 SELECT 
     a.actor_name AS username,
-    COUNT(DISTINCT i.img_name) AS images,
-    COUNT(DISTINCT CASE WHEN il_used.il_to IS NOT NULL THEN i.img_name END) AS images_used,
+    COUNT(*) AS images,
+    SUM(f.is_used) AS images_used,
     u.user_registration AS user_registration,
     CASE 
         WHEN u.user_registration >= '20250501000000' AND u.user_registration <= '20250531235959'
         THEN 1 ELSE 0
     END AS is_new_uploader
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id AND p.page_namespace = 6 AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND cl.cl_to = '{CATEGORY}'
-GROUP BY a.actor_name, u.user_registration
+FROM (
+    SELECT p.page_id, i.img_actor AS actor_id,
+        EXISTS (SELECT 1 FROM imagelinks il WHERE il.il_to = p.page_title) AS is_used
+    FROM categorylinks cl
+    JOIN page p ON cl.cl_from = p.page_id AND p.page_namespace = 6 AND p.page_is_redirect = 0
+    JOIN image i ON i.img_name = p.page_title
+    WHERE cl.cl_type = 'file'
+      AND cl.cl_to = '{CATEGORY}'
+) f
+JOIN actor_image a ON a.actor_id = f.actor_id
+LEFT JOIN user u ON a.actor_user = u.user_id
+GROUP BY f.actor_id, a.actor_name, u.user_registration
 ORDER BY images DESC
 LIMIT 500
 """
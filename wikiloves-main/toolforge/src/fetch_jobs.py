@@ -0,0 +1,255 @@
+"""
+Job handlers, run by job_worker.py for jobs queued by /api/fetch/* and
+/api/prebuild.
+
+Each handler takes the worker's JobContext and the job's params, reports
+per-step progress through ctx.progress() (campaign, year, category index,
+rows and the fraction done, from which the context derives the ETA), and
+returns a JSON-serializable result stored with the job. An exception fails
+the job; QueryCancelledError after a pause or cancel request stops it.
+Quarry-style fetches and prebuild save finished categories / campaigns /
+tasks in ctx.checkpoints, so a resumed job skips them.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from errors import CampaignNotFoundError, ProcessingError, QueryCancelledError
+from logger import get_logger, log_processing_complete, log_query_execution
+from processor import get_processor
+from queries import get_query_manager
+
+logger = get_logger('fetch_jobs')
+
+
+def fetch_all(ctx, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Full data refresh for all campaigns with the unified query."""
+    logger.info('Starting full data refresh')
+    query_manager = get_query_manager()
+    processor = get_processor()
+
+    ctx.progress(step='unified_query', steps_done=0, steps_total=2, fraction=0.0)
+    start_time = time.time()
+    raw_data = query_manager.execute_unified_query(use_analytics=True)
+    query_duration = time.time() - start_time
+    log_query_execution(logger, 'unified_all_campaigns', query_duration, rows_returned=len(raw_data))
+
+    ctx.progress(step='process', steps_done=1, steps_total=2, rows=len(raw_data))
+    processed_data = processor.process_campaign_data(raw_data)
+    for campaign_slug, campaign_data in processed_data.items():
+        errors = processor.validate_data(campaign_data)
+        if errors:
+            logger.warning(f'Validation errors for {campaign_slug}', extra={'errors': errors})
+    for campaign_slug, campaign_data in processed_data.items():
+        output_path = Config().DATA_DIR / f'{campaign_slug}_processed.json'
+        processor.save_processed_data(campaign_data, str(output_path))
+
+    duration = time.time() - start_time
+    log_processing_complete(logger, records_processed=len(raw_data), duration_seconds=duration)
+    ctx.progress(step='done', steps_done=2, steps_total=2, rows=len(raw_data), fraction=1.0)
+    return {'campaigns': sorted(processed_data), 'rows': len(raw_data), 'duration_sec': round(duration, 1)}
+
+
+def _category_progress(ctx, campaign_slug: str, campaigns_done: int, campaigns_total: int) -> Callable[[Dict[str, Any]], None]:
+    """on_progress callback for execute_campaign_quarry_style, as one campaign of a job of campaigns_total."""
+    def report(p: Dict[str, Any]) -> None:
+        year_fraction = p['category_index'] / p['category_total'] if p['category_total'] else 1.0
+        campaign_fraction = (p['year_index'] + year_fraction) / p['years_total']
+        ctx.progress(
+            step=f"{campaign_slug} {p['year']}: category {p['category_index']}/{p['category_total']}",
+            campaign=campaign_slug,
+            year=p['year'],
+            category=p['category'],
+            category_index=p['category_index'],
+            category_total=p['category_total'],
+            rows=p['rows'],
+            fraction=(campaigns_done + campaign_fraction) / campaigns_total
+        )
+    return report
+
+
+def _fetch_campaign_quarry_style(
+    campaign_slug: str,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    checkpoint: Optional[Any] = None
+) -> int:
+    """Fetch, process and save one campaign (Quarry-style). Returns the raw row count."""
+    query_manager = get_query_manager()
+    processor = get_processor()
+    start_time = time.time()
+    # Quarry-style: per-category exact-match queries (fast ~14 sec each)
+    raw_data = query_manager.execute_campaign_quarry_style(
+        campaign_slug, use_analytics=True, on_progress=on_progress, checkpoint=checkpoint
+    )
+    log_query_execution(
+        logger,
+        'campaign_query',
+        time.time() - start_time,
+        rows_returned=len(raw_data),
+        campaign_slug=campaign_slug
+    )
+
+    processed_data = processor.process_campaign_data(raw_data, campaign_slug=campaign_slug)
+    errors = processor.validate_data(processed_data)
+    if errors:
+        logger.warning(f'Validation errors for {campaign_slug}', extra={'errors': errors})
+
+    output_path = Config().DATA_DIR / f'{campaign_slug}_processed.json'
+    processor.save_processed_data(processed_data, str(output_path))
+    log_processing_complete(
+        logger,
+        campaign_slug=campaign_slug,
+        records_processed=len(raw_data),
+        duration_seconds=time.time() - start_time
+    )
+    return len(raw_data)
+
+
+def fetch_batch(ctx, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Fetch campaigns one by one (avoids the unified query timeout)."""
+    campaigns = params['campaigns']
+    # Campaigns finished before a pause or worker restart
+    completed = [c for c in campaigns if ctx.checkpoints.get(f'batch:{c}')]
+    failed = []
+    for i, campaign_slug in enumerate(campaigns):
+        if campaign_slug in completed:
+            continue
+        ctx.progress(
+            step=f'{campaign_slug} ({i + 1}/{len(campaigns)})',
+            campaign=campaign_slug,
+            year=None,
+            category=None,
+            category_index=None,
+            category_total=None,
+            steps_done=i,
+            steps_total=len(campaigns),
+            completed=completed,
+            failed=failed,
+            fraction=i / len(campaigns)
+        )
+        try:
+            logger.info(f'Batch fetch: {campaign_slug} ({i+1}/{len(campaigns)}) Quarry-style')
+            _fetch_campaign_quarry_style(
+                campaign_slug, _category_progress(ctx, campaign_slug, i, len(campaigns)), ctx.checkpoints
+            )
+            completed.append(campaign_slug)
+            ctx.checkpoints.put(f'batch:{campaign_slug}', True)
+        except QueryCancelledError:
+            raise
+        except CampaignNotFoundError:
+            logger.error(f'Campaign not found: {campaign_slug}')
+            failed.append(campaign_slug)
+        except Exception as e:
+            logger.error(f'Error fetching campaign {campaign_slug}: {str(e)}', exc_info=True)
+            failed.append(campaign_slug)
+    ctx.progress(
+        step='done',
+        steps_done=len(campaigns),
+        steps_total=len(campaigns),
+        completed=completed,
+        failed=failed,
+        fraction=1.0
+    )
+    logger.info(f'Batch fetch done: {len(completed)} ok, {len(failed)} failed', extra={
+        'completed': completed,
+        'failed': failed
+    })
+    result = {'completed': completed, 'failed': failed}
+    if failed:
+        raise ProcessingError(f'Failed: {", ".join(failed)}')
+    return result
+
+
+def fetch_campaign(ctx, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Fetch one campaign, all recent years (Quarry-style)."""
+    campaign_slug = params['campaign']
+    logger.info(f'Starting data fetch for campaign: {campaign_slug} (Quarry-style)')
+    ctx.progress(step=campaign_slug, campaign=campaign_slug, fraction=0.0)
+    rows = _fetch_campaign_quarry_style(campaign_slug, _category_progress(ctx, campaign_slug, 0, 1), ctx.checkpoints)
+    ctx.progress(step='done', rows=rows, fraction=1.0)
+    return {'campaign': campaign_slug, 'rows': rows}
+
+
+def fetch_campaign_year(ctx, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Fetch one campaign year with the campaign query."""
+    campaign_slug = params['campaign']
+    year = params['year']
+    logger.info(f'Starting data fetch for {campaign_slug} {year}')
+    query_manager = get_query_manager()
+    processor = get_processor()
+
+    ctx.progress(step='campaign_year_query', campaign=campaign_slug, year=year, steps_done=0, steps_total=2, fraction=0.0)
+    start_time = time.time()
+    raw_data = query_manager.execute_campaign_query(campaign_slug, year=year, use_analytics=True)
+    log_query_execution(
+        logger,
+        'campaign_year_query',
+        time.time() - start_time,
+        rows_returned=len(raw_data),
+        campaign_slug=campaign_slug
+    )
+
+    ctx.progress(step='process', steps_done=1, steps_total=2, rows=len(raw_data))
+    processed_data = processor.process_campaign_data(raw_data, campaign_slug=campaign_slug)
+    errors = processor.validate_data(processed_data)
+    if errors:
+        logger.warning(f'Validation errors for {campaign_slug} {year}', extra={'errors': errors})
+
+    output_path = Config().DATA_DIR / f'{campaign_slug}_{year}_processed.json'
+    processor.save_processed_data(processed_data, str(output_path))
+
+    duration = time.time() - start_time
+    log_processing_complete(
+        logger,
+        campaign_slug=campaign_slug,
+        year=year,
+        records_processed=len(raw_data),
+        duration_seconds=duration
+    )
+    ctx.progress(step='done', steps_done=2, steps_total=2, rows=len(raw_data), fraction=1.0)
+    return {'campaign': campaign_slug, 'year': year, 'rows': len(raw_data)}
+
+
+def prebuild(ctx, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Prebuild country detail + uploaders caches (prebuild_uploaders_cache.main)."""
+    from prebuild_uploaders_cache import main as prebuild_main
+    from file_cache import safe_cache_key
+
+    def report(p: Dict[str, Any]) -> None:
+        campaign_slug, year, country = p['task'] or (None, None, None)
+        if p['task'] and p['task_ok']:
+            ctx.checkpoints.put(f'prebuild:{safe_cache_key(*p["task"])}', True)
+        ctx.progress(
+            step=f"prebuild {p['tasks_done']}/{p['tasks_total']}",
+            campaign=campaign_slug,
+            year=year,
+            country=country,
+            tasks_done=p['tasks_done'],
+            tasks_total=p['tasks_total'],
+            queries=p['queries'],
+            fraction=p['tasks_done'] / p['tasks_total'] if p['tasks_total'] else 1.0
+        )
+
+    exit_code = prebuild_main(
+        max_seconds=params.get('max_seconds'),
+        max_queries=params.get('max_queries'),
+        workers=params.get('workers'),
+        token=ctx.token,
+        on_progress=report,
+        skip_keys={key[len('prebuild:'):] for key in ctx.checkpoints.keys('prebuild:')}
+    )
+    if ctx.token.cancelled:
+        # prebuild_main stops starting tasks and returns; report the stop to the worker
+        raise QueryCancelledError(f'Prebuild stopped ({ctx.token.reason})')
+    return {'all_built': exit_code == 0}
+
+
+# Job kind -> handler(ctx, params)
+JOB_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Dict[str, Any]]] = {
+    'fetch_all': fetch_all,
+    'fetch_batch': fetch_batch,
+    'fetch_campaign': fetch_campaign,
+    'fetch_campaign_year': fetch_campaign_year,
+    'prebuild': prebuild,
+}
@@ -0,0 +1,86 @@
+"""
+File-backed JSON caches used by the API (uploaders, country detail).
+
+Each entry has a soft TTL and a hard TTL. Younger than the soft TTL it is
+fresh; between the two it is stale but still served while a background
+refresh rebuilds it; older than the hard TTL it is treated as missing.
+"""
+
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+def safe_cache_key(campaign_slug: str, year: int, country: str) -> str:
+    """Filesystem-safe key for a (campaign, year, country) cache entry."""
+    return re.sub(r'[^\w\-]', '_', f"{campaign_slug}_{year}_{country}")[:120]
+
+
+def read_cache(
+    path: Path,
+    soft_ttl: float,
+    hard_ttl: float,
+) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+    """
+    Read a cache file and classify it by age.
+
+    Returns:
+        Tuple of (data, state, age_seconds). data and state are None when the
+        file is missing, unreadable or older than hard_ttl.
+    """
+    try:
+        age = time.time() - path.stat().st_mtime
+    except OSError:
+        return None, None, 0.0
+    if age >= hard_ttl:
+        return None, None, age
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None, None, age
+    return data, (FRESH if age < soft_ttl else STALE), age
+
+
+def is_fresh(path: Path, soft_ttl: float) -> bool:
+    """True if the cache file exists and is younger than soft_ttl."""
+    try:
+        return (time.time() - path.stat().st_mtime) < soft_ttl
+    except OSError:
+        return False
+
+
+def write_cache(path: Path, data: Dict[str, Any], mtime: Optional[float] = None) -> None:
+    """
+    Write a cache file atomically so readers never see a partial file.
+
+    Args:
+        mtime: Time the data was generated, if older than now; the entry then
+            ages from that time (its soft and hard TTL count from mtime).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A temp file of its own per call: threads and processes may write the same key at once
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp', delete=False
+    ) as f:
+        tmp_path = f.name
+        try:
+            json.dump(data, f, ensure_ascii=False)
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    try:
+        if mtime is not None:
+            os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
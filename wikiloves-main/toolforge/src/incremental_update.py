@@ -3,6 +3,11 @@
 Incremental update job for recent Wiki Loves campaigns.
 This script checks for new data in recent campaigns (last 2 years).
 Scheduled to run every 6 hours via Toolforge Jobs framework.
+
+Each campaign year is first probed with an index-only fingerprint query
+(member count and newest cl_timestamp per country category). Only categories
+whose fingerprint changed since the last run are aggregated again; campaign
+years without changes are skipped entirely.
 """
 
 import sys
@@ -17,6 +22,9 @@ from queries import get_query_manager
 from processor import get_processor
 from logger import get_logger, log_processing_start, log_processing_complete, log_query_execution
 from config import Config
+from category_fingerprints import (
+    FINGERPRINTS_FILENAME, changed_categories, load_fingerprints, save_fingerprints, stored_row
+)
 
 
 def main():
@@ -47,36 +55,89 @@ def main():
             logger.warning('Could not load campaign metadata, using default campaigns')
             campaigns = ['earth', 'monuments', 'africa', 'folklore', 'science', 'food', 'public_art']
         
+        fingerprints_path = config.DATA_DIR / FINGERPRINTS_FILENAME
+        fingerprints = load_fingerprints(fingerprints_path)
+        
         log_processing_start(logger)
         start_time = time.time()
         
         total_processed = 0
+        skipped = 0
         for campaign_slug in campaigns:
             logger.info(f'Processing incremental update for: {campaign_slug}')
             
             for year in recent_years:
                 try:
-                    # Execute campaign query for specific year
+                    stored_year = fingerprints.get(campaign_slug, {}).get(str(year), {})
+                    
+                    # Probe: cheap index-only fingerprint per country category
                     query_start = time.time()
-                    raw_data = query_manager.execute_campaign_query(
-                        campaign_slug,
-                        year=year,
-                        use_analytics=False  # Use web DB for faster queries
+                    probe = query_manager.execute_category_fingerprints(campaign_slug, year)
+                    log_query_execution(
+                        logger,
+                        'category_fingerprint_probe',
+                        time.time() - query_start,
+                        rows_returned=len(probe),
+                        campaign_slug=campaign_slug
                     )
-                    query_duration = time.time() - query_start
                     
-                    if not raw_data:
-                        logger.debug(f'No data found for {campaign_slug} {year}')
+                    if not probe:
+                        logger.debug(f'No categories found for {campaign_slug} {year}')
+                        continue
+                    
+                    changed = changed_categories(probe, stored_year)
+                    if not changed and set(stored_year) == set(probe):
+                        skipped += 1
+                        logger.info(f'Unchanged {campaign_slug} {year}: {len(probe)} categories, skipped')
                         continue
                     
+                    # Re-aggregate only the categories whose fingerprint changed
+                    query_start = time.time()
+                    fresh = {}
+                    batch_size = config.MISS_BATCH_MAX_SIZE
+                    for i in range(0, len(changed), batch_size):
+                        fresh.update(query_manager.execute_category_batch_quarry_style(
+                            campaign_slug,
+                            year,
+                            changed[i:i + batch_size],
+                            use_analytics=False  # Use web DB for faster queries
+                        ))
+                    query_duration = time.time() - query_start
+                    
                     log_query_execution(
                         logger,
-                        'campaign_year_query',
+                        'category_batch_query',
                         query_duration,
-                        rows_returned=len(raw_data),
+                        rows_returned=len(fresh),
                         campaign_slug=campaign_slug
                     )
                     
+                    # A changed category with members but no aggregation row was not
+                    # answered (a failed or partial batch), not found empty: keep its
+                    # previous entry, if any, so the next run aggregates it again
+                    missing = [c for c in changed if c not in fresh and probe[c][0] > 0]
+                    if missing:
+                        logger.warning(
+                            f'No aggregation for {len(missing)} non-empty categories of '
+                            f'{campaign_slug} {year}; retrying them next run'
+                        )
+                    year_state = {}
+                    for category, fingerprint in probe.items():
+                        if category in missing:
+                            if category in stored_year:
+                                year_state[category] = stored_year[category]
+                        elif category in changed:
+                            year_state[category] = {'fp': list(fingerprint), 'row': stored_row(fresh.get(category))}
+                        else:
+                            year_state[category] = {'fp': list(fingerprint), 'row': stored_year[category].get('row')}
+                    raw_data = [entry['row'] for entry in year_state.values() if entry['row']]
+                    
+                    if not raw_data:
+                        logger.debug(f'No data found for {campaign_slug} {year}')
+                        fingerprints.setdefault(campaign_slug, {})[str(year)] = year_state
+                        save_fingerprints(fingerprints_path, fingerprints)
+                        continue
+                    
                     # Process data
                     processed_data = processor.process_campaign_data(
                         raw_data,
@@ -98,9 +159,14 @@ def main():
                     output_path = Config().DATA_DIR / f'{campaign_slug}_{year}_processed.json'
                     processor.save_processed_data(processed_data, str(output_path))
                     
-                    total_processed += len(raw_data)
+                    # Remember fingerprints only once the year has been saved
+                    fingerprints.setdefault(campaign_slug, {})[str(year)] = year_state
+                    save_fingerprints(fingerprints_path, fingerprints)
+                    
+                    total_processed += len(changed)
                     logger.info(
-                        f'Updated {campaign_slug} {year}: {len(raw_data)} records'
+                        f'Updated {campaign_slug} {year}: {len(changed)}/{len(probe)} categories changed, '
+                        f'{len(raw_data)} records'
                     )
                     
                 except Exception as e:
@@ -118,7 +184,8 @@ def main():
         )
         
         logger.info(
-            f'Incremental update completed: {total_processed} records in {duration:.2f} seconds'
+            f'Incremental update completed: {total_processed} categories re-aggregated, '
+            f'{skipped} unchanged campaign years skipped in {duration:.2f} seconds'
         )
         return 0
         
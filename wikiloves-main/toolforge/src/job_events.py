@@ -0,0 +1,222 @@
+"""
+Server-Sent Events for fetch and prebuild job progress (/api/jobs/events).
+
+One broadcaster thread per web process reads the job store every
+Config.SSE_POLL_INTERVAL_SEC while someone is watching, turns each changed
+job into a pre-rendered SSE event, and wakes the streams waiting on it. The
+store is read once per tick however many clients watch, and an event is
+serialized once however many streams send it.
+
+A streaming response holds one of uWSGI's threads for its whole life, so at
+most Config.SSE_MAX_STREAMS requests stream at once, each for at most
+Config.SSE_STREAM_MAX_SEC. Further clients get the current events at once
+with a retry hint, and EventSource reconnects after Config.SSE_RETRY_MS
+(sending Last-Event-ID, so only newer events are sent again). Server
+resources stay fixed however many dashboards are open. The thread stops
+once nobody has asked for events for Config.SSE_IDLE_STOP_SEC.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from job_store import ACTIVE_STATES, FINISHED_STATES, PAUSED, JobStore, get_job_store
+from logger import get_logger
+
+# Progress fields copied into events
+_PROGRESS_FIELDS = (
+    'step', 'campaign', 'year', 'country', 'category', 'category_index', 'category_total',
+    'rows', 'tasks_done', 'tasks_total', 'fraction', 'elapsed_sec', 'eta_sec',
+)
+
+
+def job_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Event payload for one job record (from JobStore.active_jobs or get)."""
+    progress = job['progress'] or {}
+    event = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'description': job['description'],
+        'status': job['status'],
+        'started': job['started'],
+        'updated': progress.get('updated') or job['heartbeat'] or job['created'],
+    }
+    event.update({field: progress.get(field) for field in _PROGRESS_FIELDS})
+    if job.get('control'):
+        event['control'] = job['control']  # pause/cancel requested, not yet reached
+    if 'queue_position' in job:
+        event['queue_position'] = job['queue_position']
+        event['waiting_for'] = job['waiting_for']
+    if job['status'] in FINISHED_STATES + (PAUSED,):
+        event['finished'] = job['finished']
+        event['error'] = job['error']
+    return event
+
+
+class JobEventBroadcaster:
+    """Shared source of job progress events for all SSE streams of a process."""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._cond = threading.Condition()
+        self._streams = threading.BoundedSemaphore(Config.SSE_MAX_STREAMS)
+        # job id -> (version of its last change, status, payload, rendered event)
+        self._events: Dict[int, Tuple[int, str, str, str]] = {}
+        self._version = 0
+        self._last_demand = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_running(self) -> None:
+        with self._cond:
+            self._last_demand = time.time()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='job-events', daemon=True)
+                self._thread.start()
+                # Serve the first client fresh events rather than an empty snapshot
+                self._poll_locked()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(Config.SSE_POLL_INTERVAL_SEC)
+            with self._cond:
+                if time.time() - self._last_demand > Config.SSE_IDLE_STOP_SEC:
+                    self._thread = None
+                    return
+                try:
+                    self._poll_locked()
+                except Exception as e:
+                    get_logger().warning(f'Job events poll failed: {e}')
+
+    def _poll_locked(self) -> None:
+        """Read the store and record changed jobs as new events (caller holds _cond)."""
+        jobs = self.store.active_jobs()
+        cutoff = time.time() - Config.SSE_FINISHED_KEEP_SEC
+        active_ids = {job['id'] for job in jobs}
+        finished = [
+            job for job in self.store.list_jobs(FINISHED_STATES + (PAUSED,), limit=20)
+            if (job['finished'] or 0) >= cutoff
+        ]
+        # Jobs that were active at the last poll and have left the recent list
+        # already still get their final event
+        for job_id in set(self._events) - active_ids - {job['id'] for job in finished}:
+            if self._events[job_id][1] in ACTIVE_STATES:
+                job = self.store.get(job_id)
+                if job is not None:
+                    finished.append(job)
+        changed = False
+        seen = set()
+        for job in jobs + finished:
+            seen.add(job['id'])
+            payload = json.dumps(job_event(job), sort_keys=True)
+            previous = self._events.get(job['id'])
+            if previous is not None and previous[2] == payload:
+                continue
+            if not changed:
+                self._version += 1
+                changed = True
+            self._events[job['id']] = (
+                self._version,
+                job['status'],
+                payload,
+                f"id: {self._version}\nevent: progress\ndata: {payload}\n\n",
+            )
+        for job_id in set(self._events) - seen:
+            del self._events[job_id]
+        if changed:
+            self._cond.notify_all()
+
+    def events_since(self, version: int, job_id: Optional[int] = None) -> Tuple[int, List[str]]:
+        """
+        Rendered events that changed after version, optionally for one job.
+
+        Returns:
+            (current version, events).
+        """
+        self._ensure_running()
+        with self._cond:
+            return self._version, self._select(version, job_id)
+
+    def _select(self, version: int, job_id: Optional[int]) -> List[str]:
+        # A Last-Event-ID from before a worker reload is ahead of our counter: send everything
+        if version > self._version:
+            version = 0
+        return [
+            rendered for event_id, (changed, _, _, rendered) in sorted(self._events.items())
+            if changed > version and (job_id is None or event_id == job_id)
+        ]
+
+    def wait(self, version: int, timeout: float, job_id: Optional[int] = None) -> Tuple[int, List[str]]:
+        """Block until events newer than version exist (or timeout); same result as events_since."""
+        self._ensure_running()
+        with self._cond:
+            self._cond.wait_for(lambda: bool(self._select(version, job_id)), timeout=timeout)
+            return self._version, self._select(version, job_id)
+
+    def stream(self, version: int, job_id: Optional[int] = None) -> Optional['EventStream']:
+        """
+        SSE body streaming events newer than version for up to SSE_STREAM_MAX_SEC,
+        or None if SSE_MAX_STREAMS streams are already open.
+        """
+        if not self._streams.acquire(blocking=False):
+            return None
+
+        def generate() -> Iterator[str]:
+            current = version
+            yield f"retry: {Config.SSE_RETRY_MS}\n\n"
+            end = time.time() + Config.SSE_STREAM_MAX_SEC
+            while time.time() < end:
+                current, events = self.wait(
+                    current, min(Config.SSE_KEEPALIVE_SEC, max(0.0, end - time.time())), job_id
+                )
+                # A comment line keeps proxies from closing an idle stream
+                yield ''.join(events) if events else ': keepalive\n\n'
+
+        return EventStream(generate(), self._streams.release)
+
+    def snapshot(self, version: int, job_id: Optional[int] = None) -> str:
+        """SSE body with the current events and a retry hint, for clients over the stream limit."""
+        _, events = self.events_since(version, job_id)
+        return f"retry: {Config.SSE_RETRY_MS}\n\n" + ''.join(events)
+
+
+class EventStream:
+    """
+    SSE body holding one stream slot until it is closed.
+
+    The WSGI server closes the response when the stream ends, the client
+    disconnects, or the body is never iterated (HEAD), so the slot is
+    released in close() rather than in the generator, whose cleanup does not
+    run if it never started.
+    """
+
+    def __init__(self, chunks: Iterator[str], release: Callable[[], None]):
+        self._chunks = chunks
+        self._release: Optional[Callable[[], None]] = release
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[str]:
+        return self._chunks
+
+    def close(self) -> None:
+        """Stop the stream and give its slot back (safe to call more than once)."""
+        self._chunks.close()
+        with self._lock:
+            release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+# Global broadcaster instance
+_broadcaster: Optional[JobEventBroadcaster] = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_job_broadcaster() -> JobEventBroadcaster:
+    """Get the global job event broadcaster (its thread starts on first use)."""
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = JobEventBroadcaster(get_job_store())
+        return _broadcaster
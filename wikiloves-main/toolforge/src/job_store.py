@@ -0,0 +1,479 @@
+"""
+Persistent queue for fetch jobs (SQLite on shared storage).
+
+The /api/fetch/* routes only enqueue a job record here; job_worker.py, a
+separate continuous Toolforge job, claims queued jobs and runs them. Work
+therefore survives webservice restarts and uWSGI reloads (reload-on-rss),
+never takes request threads or web worker memory, and its state is visible
+to every process that opens the store.
+
+Every job names the data it writes as resource keys, "<campaign>:<year>",
+"<campaign>:*" (all years) or "*" (everything). claim() is the scheduler:
+it starts the oldest queued job that conflicts neither with a running job
+nor with an older queued one (so a big job is not starved by small ones),
+as long as the connections of all running jobs stay within
+Config.JOB_DB_CONNECTIONS. Fetches of different campaigns or years run
+side by side; conflicting ones wait their turn instead of being rejected.
+
+A job moves queued -> running -> done | failed. The running worker writes a
+heartbeat (and per-step progress) regularly; a running job whose heartbeat
+is older than Config.JOB_STALE_SEC lost its worker and is put back in the
+queue, or failed once it used up Config.JOB_MAX_ATTEMPTS.
+
+request_control() pauses or cancels a job: a queued job at once, a running
+one through its control column, which the worker polls and answers by
+cancelling the job's queries and stopping at the next category boundary
+(running -> paused | cancelled). Handlers save per-category results as
+checkpoints (JobCheckpoints); resume() queues a paused or failed job again
+and its handler skips the checkpointed work. Checkpoints are deleted when
+the job is done or cancelled.
+
+Shared storage on Toolforge is NFS, where SQLite's WAL mode does not work;
+the store uses the default rollback journal and short BEGIN IMMEDIATE
+transactions, which is plenty for a handful of writes per minute.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+PAUSED = 'paused'
+CANCELLED = 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Control requests for running jobs (also the CancelToken reasons the worker uses)
+PAUSE = 'pause'
+CANCEL = 'cancel'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    resources TEXT NOT NULL,
+    connections INTEGER NOT NULL,
+    control TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+    job_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, key)
+);
+"""
+
+_JSON_COLUMNS = ('params', 'resources', 'progress', 'result')
+
+ALL_RESOURCES = '*'
+
+
+def resource_key(campaign: str, year: Optional[int] = None) -> str:
+    """Resource key of a campaign year, or of all years of a campaign."""
+    return f"{campaign}:{'*' if year is None else year}"
+
+
+def _resources_conflict(a: List[str], b: List[str]) -> bool:
+    """True if two jobs' resource keys overlap."""
+    for key_a in a:
+        for key_b in b:
+            if ALL_RESOURCES in (key_a, key_b):
+                return True
+            campaign_a, _, year_a = key_a.partition(':')
+            campaign_b, _, year_b = key_b.partition(':')
+            if campaign_a == campaign_b and (year_a == year_b or '*' in (year_a, year_b)):
+                return True
+    return False
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    for column in _JSON_COLUMNS:
+        job[column] = json.loads(job[column]) if job[column] else None
+    return job
+
+
+def _next_runnable(rows: List[sqlite3.Row], connection_budget: int) -> Optional[int]:
+    """Id of the oldest queued job that may start now (see JobStore.claim)."""
+    in_use = sum(row['connections'] for row in rows if row['status'] == RUNNING)
+    ahead: List[List[str]] = []  # resources of running jobs and older queued jobs
+    for row in rows:
+        resources = json.loads(row['resources'])
+        if row['status'] == QUEUED and in_use + row['connections'] <= connection_budget:
+            if not any(_resources_conflict(resources, other) for other in ahead):
+                return row['id']
+        ahead.append(resources)
+    return None
+
+
+class JobStore:
+    """Job records in one SQLite file; safe to use from several processes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per operation: cheap for SQLite, and never shared between threads
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Connection inside BEGIN IMMEDIATE (other writers wait), committed on success."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def enqueue(
+        self,
+        kind: str,
+        params: Dict[str, Any],
+        description: str,
+        resources: List[str],
+        connections: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Add a job to the queue. An identical job that is still queued is
+        returned instead of adding a second one.
+
+        Args:
+            kind: Handler name (see fetch_jobs.JOB_HANDLERS).
+            params: JSON-serializable handler arguments.
+            description: Short human-readable task name for status displays.
+            resources: Resource keys the job writes (see resource_key).
+            connections: Replica connections the job holds at once.
+
+        Returns:
+            The job record.
+        """
+        params_json = json.dumps(params, sort_keys=True)
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND kind = ? AND params = ? LIMIT 1",
+                (QUEUED, kind, params_json)
+            ).fetchone()
+            if row is not None:
+                job_id = row['id']
+            else:
+                job_id = conn.execute(
+                    "INSERT INTO jobs (kind, params, description, status, created, resources, connections) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (kind, params_json, description, QUEUED, time.time(), json.dumps(resources), connections)
+                ).lastrowid
+        return self.get(job_id)
+
+    def claim(self, worker: str, connection_budget: int) -> Optional[Dict[str, Any]]:
+        """
+        Start the next job that can run now, marking it as running for this worker.
+
+        A queued job can run if its resources conflict with no running job and
+        no older queued job, and the running jobs plus this one hold at most
+        connection_budget replica connections.
+
+        Returns:
+            The claimed job record, or None if no queued job can run now.
+        """
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, status, resources, connections FROM jobs WHERE status IN (?, ?) ORDER BY id",
+                ACTIVE_STATES
+            ).fetchall()
+            job_id = _next_runnable(rows, connection_budget)
+            if job_id is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started = ?, heartbeat = ?, attempts = attempts + 1 "
+                    "WHERE id = ?",
+                    (RUNNING, worker, now, now, job_id)
+                )
+        return self.get(job_id) if job_id is not None else None
+
+    def heartbeat(self, job_id: int, worker: str, progress: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Record that the worker is still running the job, optionally with new progress.
+
+        Returns:
+            False if the job is no longer running for this worker (it was
+            requeued as stale, or finished elsewhere).
+        """
+        if progress is None:
+            updated = self._write(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), job_id, worker, RUNNING)
+            )
+        else:
+            updated = self._write(
+                "UPDATE jobs SET heartbeat = ?, progress = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), json.dumps(progress), job_id, worker, RUNNING)
+            )
+        return updated > 0
+
+    def finish(self, job_id: int, worker: str, result: Optional[Dict[str, Any]] = None) -> None:
+        """Mark a running job as done (its checkpoints are no longer needed)."""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, heartbeat = ?, result = ?, control = NULL "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, time.time(), time.time(), json.dumps(result), job_id, worker, RUNNING)
+            ).rowcount
+            if updated:
+                conn.execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+
+    def fail(self, job_id: int, worker: str, error: str, result: Optional[Dict[str, Any]] = None) -> None:
+        """Mark a running job as failed."""
+        self._write(
+            "UPDATE jobs SET status = ?, finished = ?, heartbeat = ?, error = ?, result = ?, control = NULL "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (FAILED, time.time(), time.time(), error, json.dumps(result), job_id, worker, RUNNING)
+        )
+
+    def stop(self, job_id: int, worker: str, status: str) -> None:
+        """Mark a running job as paused or cancelled after its worker stopped it."""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, heartbeat = ?, control = NULL "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (status, time.time(), time.time(), job_id, worker, RUNNING)
+            ).rowcount
+            if updated and status == CANCELLED:
+                conn.execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+
+    def request_control(self, job_id: int, action: str) -> Optional[Dict[str, Any]]:
+        """
+        Pause or cancel a job. Queued jobs (and paused ones, for cancel) change
+        state at once; running jobs get the request in their control column and
+        their worker stops them.
+
+        Args:
+            job_id: Job id.
+            action: PAUSE or CANCEL.
+
+        Returns:
+            The job record, or None if the job does not exist or already finished.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row['status'] in FINISHED_STATES:
+                return None
+            status = row['status']
+            if status == RUNNING:
+                conn.execute("UPDATE jobs SET control = ? WHERE id = ?", (action, job_id))
+            elif action == CANCEL:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ? WHERE id = ?", (CANCELLED, time.time(), job_id)
+                )
+                conn.execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+            elif status == QUEUED:
+                conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (PAUSED, job_id))
+        return self.get(job_id)
+
+    def resume(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Queue a paused or failed job again; its handler continues from its checkpoints.
+
+        Returns:
+            The job record, or None if the job is not paused or failed.
+        """
+        updated = self._write(
+            "UPDATE jobs SET status = ?, worker = NULL, finished = NULL, error = NULL, control = NULL, attempts = 0 "
+            "WHERE id = ? AND status IN (?, ?)",
+            (QUEUED, job_id, PAUSED, FAILED)
+        )
+        return self.get(job_id) if updated else None
+
+    def control(self, job_id: int) -> Optional[str]:
+        """Pending control request (PAUSE / CANCEL) of a running job, if any."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT control FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return row['control'] if row else None
+
+    def checkpoints(self, job_id: int) -> 'JobCheckpoints':
+        """Checkpoint storage of one job."""
+        return JobCheckpoints(self, job_id)
+
+    def requeue_stale(self, stale_sec: float, max_attempts: int) -> int:
+        """
+        Recover running jobs whose worker stopped sending heartbeats.
+
+        Jobs with attempts left go back to the queue (keeping their checkpoints);
+        the others fail.
+
+        Returns:
+            Number of jobs recovered.
+        """
+        cutoff = time.time() - stale_sec
+        with self._transaction() as conn:
+            # A pause or cancel requested before the worker died is honoured instead
+            stopped = conn.execute(
+                "UPDATE jobs SET status = CASE control WHEN ? THEN ? ELSE ? END, finished = ?, control = NULL "
+                "WHERE status = ? AND heartbeat < ? AND control IS NOT NULL",
+                (CANCEL, CANCELLED, PAUSED, time.time(), RUNNING, cutoff)
+            ).rowcount
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ? "
+                "WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (FAILED, time.time(), 'Worker stopped responding', RUNNING, cutoff, max_attempts)
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat < ?",
+                (QUEUED, RUNNING, cutoff)
+            ).rowcount
+        return stopped + failed + requeued
+
+    def prune(self, older_than_sec: float) -> int:
+        """Delete finished jobs older than older_than_sec (and their checkpoints). Returns the number deleted."""
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished < ?",
+                FINISHED_STATES + (time.time() - older_than_sec,)
+            ).rowcount
+            conn.execute("DELETE FROM job_checkpoints WHERE job_id NOT IN (SELECT id FROM jobs)")
+        return deleted
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """One job record, or None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(self, states: Optional[tuple] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally only those in the given states."""
+        sql = "SELECT * FROM jobs"
+        params: tuple = ()
+        if states:
+            sql += f" WHERE status IN ({', '.join('?' for _ in states)})"
+            params = tuple(states)
+        sql += " ORDER BY id DESC LIMIT ?"
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params + (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [_row_to_job(row) for row in rows]
+
+    def active_jobs(self) -> List[Dict[str, Any]]:
+        """
+        Queued and running jobs, oldest first. Queued jobs carry their
+        queue_position (1 = next) and the ids of the active jobs they wait for.
+        """
+        jobs = list(reversed(self.list_jobs(ACTIVE_STATES, limit=1000)))
+        position = 0
+        for i, job in enumerate(jobs):
+            if job['status'] != QUEUED:
+                continue
+            position += 1
+            job['queue_position'] = position
+            job['waiting_for'] = [
+                other['id'] for other in jobs[:i]
+                if _resources_conflict(job['resources'], other['resources'])
+            ]
+        return jobs
+
+    def queue_info(self, job_id: int) -> Dict[str, Any]:
+        """queue_position and waiting_for of a queued job (empty dict otherwise)."""
+        for job in self.active_jobs():
+            if job['id'] == job_id and job['status'] == QUEUED:
+                return {'queue_position': job['queue_position'], 'waiting_for': job['waiting_for']}
+        return {}
+
+
+class JobCheckpoints:
+    """Per-step results of one job, kept until it is done or cancelled."""
+
+    def __init__(self, store: JobStore, job_id: int):
+        self.store = store
+        self.job_id = job_id
+
+    def get(self, key: str) -> Optional[Any]:
+        """Saved data for key, or None."""
+        conn = self.store._connect()
+        try:
+            row = conn.execute(
+                "SELECT data FROM job_checkpoints WHERE job_id = ? AND key = ?", (self.job_id, key)
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row['data']) if row else None
+
+    def put(self, key: str, data: Any) -> None:
+        """Save JSON-serializable data under key."""
+        self.store._write(
+            "INSERT OR REPLACE INTO job_checkpoints (job_id, key, data) VALUES (?, ?, ?)",
+            (self.job_id, key, json.dumps(data))
+        )
+
+    def keys(self, prefix: str = '') -> List[str]:
+        """Saved keys starting with prefix."""
+        conn = self.store._connect()
+        try:
+            rows = conn.execute(
+                "SELECT key FROM job_checkpoints WHERE job_id = ? AND substr(key, 1, ?) = ?",
+                (self.job_id, len(prefix), prefix)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [row['key'] for row in rows]
+
+
+# Global job store instance
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Get the global job store (created on first use)."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore(Config.JOB_DB_PATH)
+        return _job_store
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Worker process for the fetch job queue (job_store.py).
+
+Runs as a continuous Toolforge job, separate from the webservice:
+
+    toolforge jobs run wikiloves-worker --continuous --image python3.13 \\
+        --command "cd ~/www/python/src && python3 job_worker.py"
+
+It claims queued jobs (JobStore.claim decides which may run: no conflicting
+resources, within Config.JOB_DB_CONNECTIONS), runs each in its own thread
+with its handler (fetch_jobs.py) and stores the result. While a job runs a
+heartbeat thread keeps its record fresh and polls its control column every
+Config.JOB_CONTROL_POLL_SEC: a pause or cancel request (or finding the job
+is no longer ours, requeued as stale by another worker) cancels the job's
+CancelToken, which kills its running replica query and stops the handler at
+the next category boundary; the job then ends as paused or cancelled. Jobs interrupted by a
+restart of the worker are requeued once their heartbeat is older than
+Config.JOB_STALE_SEC.
+
+    python3 job_worker.py --once   # run queued jobs, exit when the queue is empty
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import Config
+from database import set_connection_limit
+from fetch_jobs import JOB_HANDLERS
+from job_store import CANCEL, CANCELLED, PAUSE, PAUSED, JobStore, get_job_store
+from logger import get_logger
+from memory_profile import memory_phase
+from query_watchdog import CancelToken, query_scope
+
+logger = get_logger('job_worker')
+
+# CancelToken reason when the job was requeued by another worker
+LOST = 'job lost'
+
+
+class JobContext:
+    """Handle passed to job handlers: progress reporting and checkpoints for one running job."""
+
+    def __init__(self, store: JobStore, job: Dict[str, Any], worker: str):
+        self.store = store
+        self.job = job
+        self.worker = worker
+        self.token = CancelToken()
+        # Per-step results saved by the handler; survive pause, resume and worker restarts
+        self.checkpoints = store.checkpoints(job['id'])
+        self._progress: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def progress(self, fraction: Optional[float] = None, **fields) -> None:
+        """
+        Merge fields into the job's progress record and write it with a heartbeat.
+
+        Args:
+            fraction: Part of the whole job done so far (0..1); adds the
+                estimated time to completion (eta_sec) to the record.
+            **fields: Progress fields (step, campaign, year, category_index, rows, ...).
+        """
+        now = time.time()
+        with self._lock:
+            self._progress.update(fields)
+            self._progress['updated'] = now
+            elapsed = now - (self.job['started'] or now)
+            self._progress['elapsed_sec'] = round(elapsed, 1)
+            if fraction is not None:
+                fraction = min(max(fraction, 0.0), 1.0)
+                self._progress['fraction'] = round(fraction, 4)
+                self._progress['eta_sec'] = round(elapsed * (1 - fraction) / fraction) if fraction > 0 else None
+            snapshot = dict(self._progress)
+        if not self.store.heartbeat(self.job['id'], self.worker, snapshot):
+            self.token.cancel(LOST)
+
+    def heartbeat(self) -> None:
+        if not self.store.heartbeat(self.job['id'], self.worker):
+            self.token.cancel(LOST)
+
+    def check_control(self) -> None:
+        """Cancel the job's queries if a pause or cancel was requested."""
+        action = self.store.control(self.job['id'])
+        if action in (PAUSE, CANCEL) and not self.token.cancelled:
+            logger.info(f"Job {self.job['id']}: {action} requested")
+            self.token.cancel(action)
+
+
+class JobWorker:
+    """Claims and runs jobs from the store until stopped."""
+
+    def __init__(self, store: JobStore, worker_id: str, slots: int):
+        self.store = store
+        self.worker_id = worker_id
+        self.slots = max(1, slots)
+        self._stop = threading.Event()
+        # Set whenever a job thread finishes, so the loop can claim the next job at once
+        self._finished = threading.Event()
+        self._running: Dict[int, threading.Thread] = {}
+        self._last_prune = 0.0
+
+    def stop(self) -> None:
+        """Stop claiming jobs; running jobs finish first."""
+        self._stop.set()
+        self._finished.set()
+
+    def run(self, once: bool = False) -> int:
+        """
+        Run jobs until stopped (or, with once, until no job is running or runnable).
+
+        Returns:
+            Number of jobs started.
+        """
+        logger.info(f'Job worker {self.worker_id} started ({self.slots} slots)')
+        count = 0
+        while not self._stop.is_set():
+            self._finished.clear()
+            recovered = self.store.requeue_stale(Config.JOB_STALE_SEC, Config.JOB_MAX_ATTEMPTS)
+            if recovered:
+                logger.warning(f'Recovered {recovered} jobs from stopped workers')
+            if time.time() - self._last_prune >= 3600:
+                self._last_prune = time.time()
+                self.store.prune(Config.JOB_HISTORY_DAYS * 24 * 3600)
+            self._running = {job_id: t for job_id, t in self._running.items() if t.is_alive()}
+            while len(self._running) < self.slots:
+                job = self.store.claim(self.worker_id, Config.JOB_DB_CONNECTIONS)
+                if job is None:
+                    break
+                thread = threading.Thread(target=self._run_thread, args=(job,), name=f"job-{job['id']}")
+                self._running[job['id']] = thread
+                thread.start()
+                count += 1
+            if once and not self._running:
+                break
+            self._finished.wait(Config.JOB_POLL_INTERVAL_SEC)
+        for thread in list(self._running.values()):
+            thread.join()
+        logger.info(f'Job worker {self.worker_id} stopped after {count} jobs')
+        return count
+
+    def _run_thread(self, job: Dict[str, Any]) -> None:
+        try:
+            self.run_job(job)
+        finally:
+            self._finished.set()
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """Run one claimed job and record its outcome."""
+        ctx = JobContext(self.store, job, self.worker_id)
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            self.store.fail(job['id'], self.worker_id, f"Unknown job kind: {job['kind']}")
+            return
+
+        done = threading.Event()
+
+        def beat():
+            last_beat = time.time()
+            while not done.wait(Config.JOB_CONTROL_POLL_SEC):
+                try:
+                    ctx.check_control()
+                    if time.time() - last_beat >= Config.JOB_HEARTBEAT_SEC:
+                        last_beat = time.time()
+                        ctx.heartbeat()
+                except Exception as e:
+                    logger.warning(f"Heartbeat for job {job['id']} failed: {e}")
+
+        heartbeat_thread = threading.Thread(target=beat, name=f"job-{job['id']}-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        start = time.time()
+        logger.info(f"Running job {job['id']}: {job['description']} (attempt {job['attempts']})")
+        try:
+            with query_scope(token=ctx.token), memory_phase(f"job:{job['kind']}"):
+                result = handler(ctx, job['params'])
+            self.store.finish(job['id'], self.worker_id, result)
+            logger.info(f"Job {job['id']} done in {time.time() - start:.1f}s")
+        except Exception as e:
+            reason = ctx.token.reason if ctx.token.cancelled else None
+            if reason in (PAUSE, CANCEL):
+                self.store.stop(job['id'], self.worker_id, PAUSED if reason == PAUSE else CANCELLED)
+                logger.info(f"Job {job['id']} {'paused' if reason == PAUSE else 'cancelled'} after {time.time() - start:.1f}s")
+            elif reason == LOST:
+                logger.warning(f"Job {job['id']} was taken over by another worker; stopped here")
+            else:
+                logger.error(f"Job {job['id']} failed: {e}", exc_info=True)
+                self.store.fail(job['id'], self.worker_id, str(e))
+        finally:
+            done.set()
+            heartbeat_thread.join()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Run queued fetch jobs.')
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}')
+    args = parser.parse_args()
+
+    set_connection_limit(Config.JOB_DB_CONNECTIONS)
+    worker = JobWorker(get_job_store(), args.worker_id, slots=Config.JOB_DB_CONNECTIONS)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    worker.run(once=args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
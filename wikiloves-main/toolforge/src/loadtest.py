@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the read API, under the production uWSGI settings.
+
+Starts app:app against a local home directory (HOME/shared/data with
+*_processed.json, country_detail/ and uploaders/, e.g. a copy of the tool's
+shared/ directory) and replays a request mix modelled on the dashboard:
+campaign data and summaries, country details and uploader lists (popular
+countries more often) and static SPA assets. For each concurrency level it
+reports p50/p95/p99 latency, throughput and error rate, and samples the
+worker's RSS over time (with worker reloads) against reload-on-rss.
+
+    python3 loadtest.py --home /tmp/wl-home --concurrency 1 2 4 8 16 --duration 30
+    python3 loadtest.py --home /tmp/wl-home --standin ~/shared/data/standin.sqlite
+    python3 loadtest.py --url http://127.0.0.1:8000 --home /tmp/wl-home   # server already running
+
+uWSGI is started with processes, threads, lazy-apps and the memory limits
+of ../uwsgi.ini. Without uwsgi installed the Flask development server is
+used instead; it does not cap threads, so saturation comes later than in
+production (the report says which server ran).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SRC_DIR = Path(__file__).parent
+UWSGI_INI = SRC_DIR.parent / 'uwsgi.ini'
+
+# Settings copied from uwsgi.ini into the local instance (paths and sockets are not)
+UWSGI_KEYS = (
+    'processes', 'threads', 'master', 'enable-threads', 'lazy-apps',
+    'single-interpreter', 'limit-as', 'reload-on-as', 'reload-on-rss',
+)
+
+# Share of requests per kind
+REQUEST_MIX = {
+    'campaign_data': 0.20,
+    'campaign_summary': 0.20,
+    'country_detail': 0.25,
+    'uploaders': 0.15,
+    'campaigns': 0.05,
+    'static': 0.15,
+}
+
+
+def read_uwsgi_settings(path: Path = UWSGI_INI) -> Dict[str, str]:
+    """The UWSGI_KEYS settings of the production uwsgi.ini."""
+    settings = {}
+    for line in path.read_text().splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.strip() in UWSGI_KEYS:
+            settings[key.strip()] = value.strip()
+    return settings
+
+
+def build_targets(data_dir: Path, static_dir: Path) -> Dict[str, List[Tuple[str, float]]]:
+    """
+    URL paths per request kind, each with a weight.
+
+    Countries are weighted by uploads, so the mix hits the big countries'
+    (large) files as often as real visitors do.
+    """
+    targets: Dict[str, List[Tuple[str, float]]] = {kind: [] for kind in REQUEST_MIX}
+    targets['campaigns'].append(('/api/campaigns', 1.0))
+    for path in sorted(data_dir.glob('*_processed.json')):
+        slug = path.stem.replace('_processed', '')
+        if slug == 'all':
+            continue
+        with open(path, encoding='utf-8') as f:
+            processed = json.load(f)
+        targets['campaign_data'].append((f'/api/data/{slug}', 1.0))
+        targets['campaign_summary'].append((f'/api/data/{slug}/summary', 1.0))
+        for year in processed.get('years', []):
+            for row in year.get('country_rows', []):
+                country = urllib.parse.quote(row['country'])
+                weight = float(row.get('images') or 1)
+                targets['country_detail'].append((f"/api/data/{slug}/{year['year']}/{country}", weight))
+                targets['uploaders'].append((f"/api/data/{slug}/{year['year']}/{country}/uploaders", weight))
+    if static_dir.exists():
+        for path in sorted(static_dir.rglob('*')):
+            if path.is_file():
+                targets['static'].append(('/' + path.relative_to(static_dir).as_posix(), 1.0))
+    if not targets['static']:
+        targets['static'].append(('/', 1.0))
+    return {kind: entries for kind, entries in targets.items() if entries}
+
+
+class RequestPicker:
+    """Weighted random choice of request kind, then of URL within the kind."""
+
+    def __init__(self, targets: Dict[str, List[Tuple[str, float]]], seed: int):
+        self.rng = random.Random(seed)
+        self.kinds = [k for k in REQUEST_MIX if k in targets]
+        self.kind_weights = [REQUEST_MIX[k] for k in self.kinds]
+        self.paths = {k: [p for p, _ in targets[k]] for k in self.kinds}
+        self.weights = {k: [w for _, w in targets[k]] for k in self.kinds}
+
+    def pick(self) -> Tuple[str, str]:
+        kind = self.rng.choices(self.kinds, weights=self.kind_weights)[0]
+        return kind, self.rng.choices(self.paths[kind], weights=self.weights[kind])[0]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(home: Path, port: int, standin: Optional[Path], log_path: Path) -> Tuple[subprocess.Popen, str]:
+    """Start app:app with the production uWSGI settings (or the Flask server). Returns (process, server name)."""
+    pythonpath = os.pathsep.join(p for p in (str(SRC_DIR), os.environ.get('PYTHONPATH')) if p)
+    env = dict(os.environ, HOME=str(home), PYTHONPATH=pythonpath)
+    if standin:
+        env['WIKILOVES_DB_BACKEND'] = 'standin'
+        env['WIKILOVES_STANDIN_DB'] = str(standin)
+    log = open(log_path, 'w')
+    if shutil.which('uwsgi'):
+        ini = log_path.with_suffix('.ini')
+        lines = ['[uwsgi]', 'module = app:app', f'chdir = {SRC_DIR}', f'pythonpath = {SRC_DIR}',
+                 f'http-socket = 127.0.0.1:{port}', 'memory-report = true']
+        lines += [f'{k} = {v}' for k, v in read_uwsgi_settings().items()]
+        ini.write_text('\n'.join(lines) + '\n')
+        return subprocess.Popen(['uwsgi', '--ini', str(ini)], env=env, stdout=log, stderr=log), 'uwsgi'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app:app', 'run', '--port', str(port), '--with-threads'],
+        cwd=SRC_DIR, env=env, stdout=log, stderr=log
+    )
+    return process, 'flask-dev'
+
+
+def wait_ready(host: str, port: int, process: Optional[subprocess.Popen], timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode} (see its log)')
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request('GET', '/api')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f'Server on {host}:{port} not ready after {timeout}s')
+
+
+def _rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+class RssSampler(threading.Thread):
+    """Samples the serving process's RSS (uWSGI: each worker) and notices worker reloads."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[str, Any]] = []
+        self.workers_seen: set = set()
+        self._stop_event = threading.Event()
+        self.started = time.time()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            workers = _children(self.pid) or [self.pid]
+            self.workers_seen.update(workers)
+            rss = {w: _rss_kb(w) for w in workers}
+            self.samples.append({
+                't': round(time.time() - self.started, 1),
+                'rss_mb': {str(w): round(v / 1024, 1) for w, v in rss.items() if v is not None},
+            })
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def peak_mb(self, since: float = 0.0) -> float:
+        values = [v for s in self.samples if s['t'] >= since for v in s['rss_mb'].values()]
+        return max(values) if values else 0.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return round(sorted_values[index], 2)
+
+
+def run_level(host: str, port: int, picker_seed: int, targets, concurrency: int, duration: float) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` clients sending back-to-back requests for `duration` seconds."""
+    results: List[Tuple[str, int, float]] = []
+    results_lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(n: int) -> None:
+        picker = RequestPicker(targets, picker_seed * 1000 + n)
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        local = []
+        while time.time() < stop_at:
+            kind, path = picker.pick()
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+            local.append((kind, status, (time.perf_counter() - start) * 1000))
+        conn.close()
+        with results_lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - started
+
+    def summarize(entries: List[Tuple[str, int, float]]) -> Dict[str, Any]:
+        latencies = sorted(e[2] for e in entries)
+        errors = sum(1 for e in entries if e[1] == 0 or e[1] >= 500)
+        return {
+            'requests': len(entries),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'error_rate': round(errors / len(entries), 4) if entries else 0.0,
+        }
+
+    level = summarize(results)
+    level.update({
+        'concurrency': concurrency,
+        'duration_sec': round(elapsed, 1),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else 0.0,
+        'by_kind': {k: summarize([e for e in results if e[0] == k]) for k in REQUEST_MIX},
+        'status_counts': {},
+    })
+    for _, status, _ in results:
+        level['status_counts'][str(status)] = level['status_counts'].get(str(status), 0) + 1
+    return level
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Load test the read API under the production uWSGI settings.')
+    parser.add_argument('--home', required=True, help='HOME for the app (its shared/data holds the processed data)')
+    parser.add_argument('--url', default=None, help='Test an already running server instead of starting one')
+    parser.add_argument('--standin', default=None, help='Serve cache misses from this stand-in DB (standin_db.py)')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per concurrency level')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds of load before the first level')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default=None, help='Report JSON (default <home>/shared/data/benchmarks/loadtest_<commit>.json)')
+    args = parser.parse_args()
+
+    home = Path(args.home).expanduser().resolve()
+    data_dir = home / 'shared' / 'data'
+    targets = build_targets(data_dir, SRC_DIR / 'static')
+    if 'campaign_data' not in targets:
+        print(f'No *_processed.json in {data_dir}', file=sys.stderr)
+        return 1
+    print('Request kinds: ' + ', '.join(f'{k} ({len(v)} urls)' for k, v in targets.items()))
+
+    process = None
+    server = 'external'
+    log_dir = Path(tempfile.mkdtemp(prefix='wl-loadtest-'))
+    if args.url:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = '127.0.0.1', _free_port()
+        standin = Path(args.standin).expanduser().resolve() if args.standin else None
+        process, server = start_server(home, port, standin, log_dir / 'server.log')
+        print(f'Started {server} on port {port} (log {log_dir / "server.log"})')
+    sampler = None
+    try:
+        wait_ready(host, port, process)
+        if process is not None:
+            sampler = RssSampler(process.pid)
+            sampler.start()
+        if args.warmup:
+            run_level(host, port, args.seed, targets, max(args.concurrency), args.warmup)
+        levels = []
+        for concurrency in args.concurrency:
+            since = time.time() - sampler.started if sampler else 0.0
+            level = run_level(host, port, args.seed, targets, concurrency, args.duration)
+            if sampler:
+                level['peak_rss_mb'] = sampler.peak_mb(since)
+            levels.append(level)
+            print(
+                f"c={concurrency:>3}: {level['throughput_rps']:>7} req/s  p50 {level['p50_ms']} ms  "
+                f"p95 {level['p95_ms']} ms  p99 {level['p99_ms']} ms  errors {level['error_rate']:.2%}"
+                + (f"  peak RSS {level['peak_rss_mb']} MB" if sampler else ''),
+                flush=True
+            )
+    finally:
+        if sampler:
+            sampler.stop()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    uwsgi_settings = read_uwsgi_settings()
+    report = {
+        'benchmark': 'loadtest',
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'server': server,
+        'uwsgi_settings': uwsgi_settings if server == 'uwsgi' else None,
+        'standin': bool(args.standin),
+        'request_mix': REQUEST_MIX,
+        'levels': levels,
+    }
+    if sampler:
+        # A uWSGI worker reload shows up as a new worker pid
+        report['worker_pids_seen'] = len(sampler.workers_seen)
+        report['rss_timeline'] = sampler.samples
+        reload_rss = float(uwsgi_settings.get('reload-on-rss', 0) or 0)
+        peak = sampler.peak_mb()
+        report['peak_rss_mb'] = peak
+        print(f"Peak worker RSS {peak} MB (reload-on-rss {reload_rss:g} MB), "
+              f"{len(sampler.workers_seen)} worker pid(s) seen")
+
+    out = Path(args.out) if args.out else data_dir / 'benchmarks' / f"loadtest_{report['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved {out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
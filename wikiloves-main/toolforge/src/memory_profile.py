@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Memory profiling mode for the web app and the jobs.
+
+uwsgi.ini caps the worker at 512 MB of address space (limit-as) and reloads
+it above 400 MB of address space (reload-on-as) or 200 MB RSS
+(reload-on-rss); large processed files, fetchall() results and prebuild
+threads all share that process. With WIKILOVES_MEMORY_PROFILE=1 tracemalloc
+runs in the process and every request (per endpoint) and job phase
+(memory_phase('prebuild:bulk'), ...) records its peak traced memory, the RSS
+and address space at its end, and - for its worst occurrence - the top
+allocation sites (tracemalloc snapshot diff around the phase).
+
+Reports go to shared/data/memory_profile/<process>_<pid>.json;
+    python3 memory_profile.py
+prints all of them ranked by how close each phase came to a reload limit.
+
+tracemalloc is process-wide, so with uWSGI's two threads concurrent requests
+share their peaks, and tracing slows Python code down several times: enable
+it while diagnosing reloads, not in normal operation.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import Config
+
+
+def process_memory_mb() -> Dict[str, float]:
+    """Current RSS, peak RSS and address space of this process, in MB (Linux /proc)."""
+    values = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('VmRSS', 'VmHWM', 'VmSize'):
+                    values[key] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return {'rss': values.get('VmRSS', 0.0), 'peak_rss': values.get('VmHWM', 0.0), 'as': values.get('VmSize', 0.0)}
+
+
+class MemoryProfiler:
+    """Per-phase memory statistics from tracemalloc and /proc."""
+
+    def __init__(self, report_path: Path, frames: int, top: int, flush_interval_sec: float = 30.0):
+        self.report_path = report_path
+        self.frames = frames
+        self.top = top
+        self.flush_interval_sec = flush_interval_sec
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._phases: Dict[str, Dict[str, Any]] = {}
+        self._last_flush = 0.0
+        self._started = time.time()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        atexit.register(self.flush)
+
+    def begin(self, name: str) -> Dict[str, Any]:
+        """Start measuring one occurrence of a phase. Pass the result to end()."""
+        tracemalloc.reset_peak()
+        return {
+            'name': name,
+            'start': time.time(),
+            'traced_start': tracemalloc.get_traced_memory()[0],
+            'memory_start': process_memory_mb(),
+            'snapshot': tracemalloc.take_snapshot(),
+        }
+
+    def end(self, state: Dict[str, Any]) -> None:
+        """Finish a phase started with begin()."""
+        traced_now, traced_peak = tracemalloc.get_traced_memory()
+        memory = process_memory_mb()
+        peak_mb = round((traced_peak - state['traced_start']) / 1024 / 1024, 2)
+        growth_mb = round(memory['rss'] - state['memory_start']['rss'], 1)
+        with self._lock:
+            phase = self._phases.setdefault(state['name'], {
+                'count': 0, 'total_sec': 0.0, 'max_traced_peak_mb': 0.0, 'max_rss_mb': 0.0,
+                'max_as_mb': 0.0, 'max_rss_growth_mb': 0.0, 'retained_mb': 0.0, 'top_sites': [],
+            })
+            phase['count'] += 1
+            phase['total_sec'] = round(phase['total_sec'] + time.time() - state['start'], 3)
+            phase['max_rss_mb'] = max(phase['max_rss_mb'], memory['rss'])
+            phase['max_as_mb'] = max(phase['max_as_mb'], memory['as'])
+            phase['max_rss_growth_mb'] = max(phase['max_rss_growth_mb'], growth_mb)
+            worst = peak_mb > phase['max_traced_peak_mb'] or not phase['top_sites']
+            if worst:
+                phase['max_traced_peak_mb'] = max(phase['max_traced_peak_mb'], peak_mb)
+                phase['retained_mb'] = round((traced_now - state['traced_start']) / 1024 / 1024, 2)
+        if worst:
+            # Only for a new worst case: the snapshot diff costs more than the phase itself
+            filters = [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+            diff = tracemalloc.take_snapshot().filter_traces(filters).compare_to(
+                state['snapshot'].filter_traces(filters), 'lineno'
+            )
+            sites = [
+                {
+                    'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                    'size_diff_kb': round(stat.size_diff / 1024, 1),
+                    'count_diff': stat.count_diff,
+                }
+                for stat in sorted(diff, key=lambda s: -abs(s.size_diff))[:self.top]
+            ]
+            with self._lock:
+                phase['top_sites'] = sites
+        if time.time() - self._last_flush >= self.flush_interval_sec:
+            self.flush()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = {name: dict(p) for name, p in self._phases.items()}
+        return {
+            'process': _process_name(),
+            'pid': os.getpid(),
+            'started': self._started,
+            'updated': time.time(),
+            'memory': process_memory_mb(),
+            'limits_mb': {
+                'reload_on_rss': Config.UWSGI_RELOAD_ON_RSS_MB,
+                'reload_on_as': Config.UWSGI_RELOAD_ON_AS_MB,
+                'limit_as': Config.UWSGI_LIMIT_AS_MB,
+            },
+            'phases': phases,
+        }
+
+    def flush(self) -> None:
+        """Write the report file (atomically)."""
+        self._last_flush = time.time()
+        with self._flush_lock:
+            try:
+                self.report_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.report_path.with_name(f'.{self.report_path.name}.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.report(), f, indent=1)
+                os.replace(tmp_path, self.report_path)
+            except OSError:
+                pass
+
+
+def _process_name() -> str:
+    name = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else ''
+    return name if name and name not in ('-c', 'uwsgi') else 'app'
+
+
+# Global profiler, None unless Config.MEMORY_PROFILE is set
+_profiler: Optional[MemoryProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_memory_profiler() -> Optional[MemoryProfiler]:
+    """Get the global profiler (started on first use), or None when profiling is off."""
+    global _profiler
+    if not Config.MEMORY_PROFILE:
+        return None
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = MemoryProfiler(
+                Config.MEMORY_PROFILE_DIR / f'{_process_name()}_{os.getpid()}.json',
+                frames=Config.MEMORY_PROFILE_FRAMES,
+                top=Config.MEMORY_PROFILE_TOP,
+            )
+            _profiler.start()
+        return _profiler
+
+
+@contextmanager
+def memory_phase(name: str):
+    """Profile the enclosed block as job phase `name` (no-op when profiling is off)."""
+    profiler = get_memory_profiler()
+    if profiler is None:
+        yield
+        return
+    state = profiler.begin(name)
+    try:
+        yield
+    finally:
+        profiler.end(state)
+
+
+def install_request_profiling(app) -> None:
+    """Profile every request of a Flask app, per endpoint (no-op when profiling is off)."""
+    if get_memory_profiler() is None:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _memory_begin():
+        rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+        g.memory_phase = get_memory_profiler().begin(f'{request.method} {rule}')
+
+    @app.teardown_request
+    def _memory_end(exc):
+        state = g.pop('memory_phase', None)
+        if state is not None:
+            get_memory_profiler().end(state)
+
+
+def print_report(report_dir: Path) -> int:
+    """Print all reports in report_dir, phases ranked by their closest reload limit."""
+    rows: List[tuple] = []
+    for path in sorted(report_dir.glob('*.json')):
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        limits = report['limits_mb']
+        for name, phase in report['phases'].items():
+            closeness = max(
+                phase['max_rss_mb'] / limits['reload_on_rss'],
+                phase['max_as_mb'] / limits['reload_on_as'],
+            )
+            rows.append((closeness, f"{report['process']}[{report['pid']}]", name, phase, limits))
+    if not rows:
+        print(f'No memory reports in {report_dir}')
+        return 1
+    rows.sort(key=lambda r: -r[0])
+    print(f"{'limit %':>7}  {'max RSS':>8}  {'max AS':>8}  {'py peak':>8}  {'count':>6}  phase")
+    for closeness, process, name, phase, limits in rows:
+        print(
+            f"{100 * closeness:>6.0f}%  {phase['max_rss_mb']:>7.1f}M  {phase['max_as_mb']:>7.1f}M  "
+            f"{phase['max_traced_peak_mb']:>7.1f}M  {phase['count']:>6}  {process} {name}"
+        )
+    closeness, process, name, phase, limits = rows[0]
+    print(
+        f"\nClosest to a reload: {process} {name} "
+        f"(RSS {phase['max_rss_mb']}/{limits['reload_on_rss']} MB, AS {phase['max_as_mb']}/{limits['reload_on_as']} MB)"
+    )
+    for site in phase['top_sites'][:10]:
+        print(f"  {site['size_diff_kb']:>10.1f} KB  {site['count_diff']:>8}  {site['site']}")
+    return 0
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Show memory profiling reports (WIKILOVES_MEMORY_PROFILE=1).')
+    parser.add_argument('--dir', default=str(Config.MEMORY_PROFILE_DIR))
+    args = parser.parse_args()
+    sys.exit(print_report(Path(args.dir)))
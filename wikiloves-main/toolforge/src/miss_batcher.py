@@ -0,0 +1,155 @@
+"""
+Micro-batching of cache misses.
+
+Opening a campaign-year page makes the SPA request country detail and
+uploaders for many countries within a few seconds. Instead of one replica
+query per country, misses for the same (campaign, year) are collected for a
+short window and served by one grouped query whose results are fanned out
+to every waiting request.
+"""
+
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from cache_refresh import get_refresh_queue, PRIORITY_USER
+
+# run_batch(campaign_slug, year, countries) -> {country: result}; missing countries resolve to None
+BatchRunner = Callable[[str, int, List[str]], Dict[str, Any]]
+
+
+class MissBatcher:
+    """Coalesces per-country cache misses into one query per (campaign, year)."""
+
+    def __init__(self, name: str, run_batch: BatchRunner, window_sec: float, max_batch: int):
+        self.name = name
+        self.run_batch = run_batch
+        self.window_sec = window_sec
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        # (campaign, year) -> {country: Future} still collecting
+        self._open: Dict[Tuple[str, int], Dict[str, Future]] = {}
+        self._priority: Dict[Tuple[str, int], int] = {}
+        # (campaign, year, country) -> Future queued or running, for deduplication
+        self._inflight: Dict[Tuple[str, int, str], Future] = {}
+        # Flushed batches not started yet: batch id -> (campaign, year, pending, priority),
+        # and the batch id of each of their keys, so a user request can promote them
+        self._queued: Dict[int, Tuple[str, int, Dict[str, Future], int]] = {}
+        self._queued_keys: Dict[Tuple[str, int, str], int] = {}
+        self._seq = itertools.count()
+
+    def submit(self, campaign_slug: str, year: int, country: str, priority: int = PRIORITY_USER) -> Future:
+        """
+        Request the result for one country. Returns a Future shared by every
+        caller asking for the same key until its batch has completed.
+        """
+        group = (campaign_slug, year)
+        key = (campaign_slug, year, country)
+        with self._lock:
+            existing = self._inflight.get(key)
+            if existing is not None:
+                batch_id = self._queued_keys.get(key)
+                if batch_id is None:
+                    if country in self._open.get(group, {}):
+                        self._priority[group] = min(self._priority[group], priority)
+                    return existing
+                if priority >= self._queued[batch_id][3]:
+                    return existing
+                # A user request joining a queued prefetch batch queues it again
+                # at its priority; whichever copy runs first does the work
+                self._queued[batch_id] = self._queued[batch_id][:3] + (priority,)
+            else:
+                batch_id = None
+                future: Future = Future()
+                self._inflight[key] = future
+                pending = self._open.get(group)
+                if pending is None:
+                    pending = self._open[group] = {}
+                    self._priority[group] = priority
+                    # Bound to this group's dict: a later group of the same key has its own timer
+                    timer = threading.Timer(self.window_sec, self._flush, args=(group, pending))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    # A user request joining a prefetch batch promotes the whole batch
+                    self._priority[group] = min(self._priority[group], priority)
+                pending[country] = future
+                full = len(pending) >= self.max_batch
+        if batch_id is not None:
+            self._enqueue(batch_id, group, priority)
+            return existing
+        if full:
+            self._flush(group, pending)
+        return future
+
+    def is_inflight(self, campaign_slug: str, year: int, country: str) -> bool:
+        """True if a result for this key is being collected, queued or computed."""
+        with self._lock:
+            return (campaign_slug, year, country) in self._inflight
+
+    def _flush(self, group: Tuple[str, int], pending: Dict[str, Future]) -> None:
+        with self._lock:
+            if self._open.get(group) is not pending:
+                return
+            del self._open[group]
+            priority = self._priority.pop(group, PRIORITY_USER)
+            batch_id = next(self._seq)
+            self._queued[batch_id] = (group[0], group[1], pending, priority)
+            for country in pending:
+                self._queued_keys[(group[0], group[1], country)] = batch_id
+        self._enqueue(batch_id, group, priority)
+
+    def _enqueue(self, batch_id: int, group: Tuple[str, int], priority: int) -> None:
+        campaign_slug, year = group
+        get_refresh_queue().enqueue(
+            (self.name, campaign_slug, year, batch_id, priority),
+            lambda: self._start(batch_id),
+            priority=priority
+        )
+
+    def _start(self, batch_id: int) -> None:
+        with self._lock:
+            batch = self._queued.pop(batch_id, None)
+            if batch is None:
+                # Already run from its promoted (or original) queue entry
+                return
+            campaign_slug, year, pending, _ = batch
+            for country in pending:
+                self._queued_keys.pop((campaign_slug, year, country), None)
+        self._run(campaign_slug, year, pending)
+
+    def _run(self, campaign_slug: str, year: int, pending: Dict[str, Future]) -> None:
+        try:
+            results = self.run_batch(campaign_slug, year, list(pending))
+        except BaseException as e:
+            for future in pending.values():
+                future.set_exception(e)
+            raise
+        else:
+            for country, future in pending.items():
+                future.set_result(results.get(country))
+        finally:
+            with self._lock:
+                for country in pending:
+                    self._inflight.pop((campaign_slug, year, country), None)
+
+
+# Global batcher instances, keyed by name
+_batchers: Dict[str, MissBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(name: str, run_batch: BatchRunner) -> MissBatcher:
+    """Get (or create) the global batcher for one kind of cache entry."""
+    with _batchers_lock:
+        batcher: Optional[MissBatcher] = _batchers.get(name)
+        if batcher is None:
+            batcher = _batchers[name] = MissBatcher(
+                name,
+                run_batch,
+                window_sec=Config.MISS_BATCH_WINDOW_SEC,
+                max_batch=Config.MISS_BATCH_MAX_SIZE,
+            )
+        return batcher
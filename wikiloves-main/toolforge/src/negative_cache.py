@@ -0,0 +1,175 @@
+"""
+Negative-result cache for (campaign, year, country) lookups.
+
+Two layers keep requests for pages that do not exist away from the replica:
+
+- A manifest of every known key, written whenever processed data is
+  regenerated. It covers a (campaign, year) only once that year is complete
+  in the processed data (written after the year ended); for covered years a
+  key missing from the manifest is a definite 404 and lookups are O(1) set
+  membership.
+- A bounded in-memory TTL cache of keys the database has confirmed empty,
+  for years the manifest does not cover (the running year, campaigns not
+  processed yet).
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+
+from config import Config
+from file_cache import write_cache
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def normalize_country(country: str) -> str:
+    """Case/underscore-insensitive form used for manifest lookups."""
+    return ' '.join(country.replace('_', ' ').split()).lower()
+
+
+def collect_keys(processed: Dict) -> Dict[str, List[str]]:
+    """Map year -> country names from one *_processed.json payload."""
+    keys = {}
+    for y in processed.get('years') or []:
+        year = int(y.get('year', 0) or 0)
+        if not year:
+            continue
+        rows = y.get('country_rows') or y.get('country_stats') or []
+        countries = keys.setdefault(str(year), [])
+        for c in rows:
+            name = (c.get('country') or c.get('name') or '').strip()
+            if name and name not in countries:
+                countries.append(name)
+    return keys
+
+
+def write_manifest(data_dir: Path) -> Path:
+    """
+    Rebuild the manifest from all *_processed.json files in data_dir.
+
+    Returns:
+        Path of the written manifest.
+    """
+    campaigns: Dict[str, Dict[str, List[str]]] = {}
+    complete: Dict[str, List[int]] = {}
+    for path in sorted(data_dir.glob('*_processed.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                processed = json.load(f)
+            written_year = time.gmtime(path.stat().st_mtime).tm_year
+        except (json.JSONDecodeError, OSError):
+            continue
+        slug = processed.get('campaign') or path.stem.replace('_processed', '')
+        if slug == 'all':
+            continue
+        years = campaigns.setdefault(slug, {})
+        for year, countries in collect_keys(processed).items():
+            merged = years.setdefault(year, [])
+            merged.extend(c for c in countries if c not in merged)
+            # Data written during the campaign year may still miss countries
+            if int(year) < written_year and int(year) not in complete.setdefault(slug, []):
+                complete[slug].append(int(year))
+
+    manifest_path = data_dir / MANIFEST_FILENAME
+    write_cache(manifest_path, {'generated_at': time.time(), 'campaigns': campaigns, 'complete': complete})
+    return manifest_path
+
+
+class KeyManifest:
+    """In-memory view of the manifest, reloaded when the file changes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._covered = frozenset()
+        self._countries: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            covered, countries = set(), {}
+            if mtime is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                except (json.JSONDecodeError, OSError):
+                    manifest = {}
+                for slug, years in (manifest.get('complete') or {}).items():
+                    covered.update((slug, int(year)) for year in years)
+                for slug, years in (manifest.get('campaigns') or {}).items():
+                    for year, names in years.items():
+                        for name in names:
+                            countries[(slug, int(year), normalize_country(name))] = name
+            self._covered = frozenset(covered)
+            self._countries = countries
+            self._mtime = mtime
+
+    def covers(self, campaign_slug: str, year: int) -> bool:
+        """True if the manifest lists every key of this campaign year (the year is complete)."""
+        self._refresh()
+        return (campaign_slug, year) in self._covered
+
+    def get_country(self, campaign_slug: str, year: int, country: str) -> Optional[str]:
+        """Canonical country name for a known key, or None if the key is unknown."""
+        self._refresh()
+        return self._countries.get((campaign_slug, year, normalize_country(country)))
+
+
+class NegativeCache:
+    """Bounded TTL set of keys the database has confirmed to have no data."""
+
+    def __init__(self, ttl_sec: float, max_entries: int):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries[key] = time.time() + self.ttl_sec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def contains(self, key: Hashable) -> bool:
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self._entries[key]
+                return False
+            return True
+
+
+# Global instances
+_key_manifest: Optional[KeyManifest] = None
+_negative_cache: Optional[NegativeCache] = None
+
+
+def get_key_manifest() -> KeyManifest:
+    """Get global key manifest instance."""
+    global _key_manifest
+    if _key_manifest is None:
+        _key_manifest = KeyManifest(Config.DATA_DIR / MANIFEST_FILENAME)
+    return _key_manifest
+
+
+def get_negative_cache() -> NegativeCache:
+    """Get global negative-result cache instance."""
+    global _negative_cache
+    if _negative_cache is None:
+        _negative_cache = NegativeCache(Config.NEGATIVE_CACHE_TTL_SEC, Config.NEGATIVE_CACHE_MAX_ENTRIES)
+    return _negative_cache
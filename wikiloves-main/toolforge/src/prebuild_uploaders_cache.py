@@ -1,28 +1,37 @@
 #!/usr/bin/env python3
 """
-Pre-build uploaders and country-detail caches for all campaign/year/country in processed data.
+Pre-build uploaders and country-detail caches for campaign/year/country keys in processed data.
 Run on Toolforge (e.g. daily after daily_refresh) so the frontend gets data immediately
 when clicking a country (e.g. earth/2025/Germany): both country stats and contributors
 are served from cache, no DB wait.
+
+Keys covered by the bulk aggregates of process_all.py (shared/data/bulk/) are
+written from those files for every year, without touching the replica. Only
+keys missing from the bulk data are queried, in order of recorded API demand
+(see request_stats.py); that part can be capped with --max-seconds /
+--max-queries. Use --workers N to build several tasks concurrently within the
+process's share of the DB connection limit (Config.SCRIPT_DB_CONNECTIONS
+from a shell, JOB_DB_CONNECTIONS in the job worker).
 """
 
 import sys
 import json
-import re
 from pathlib import Path
+from typing import Any, Callable, Dict, Optional
 
 # Add src directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config import Config
+from database import connection_limit
 from queries import get_query_manager
 from logger import get_logger
-from errors import CampaignNotFoundError
-
-
-def safe_cache_key(campaign_slug: str, year: int, country: str) -> str:
-    """Same key logic as routes.get_country_uploaders."""
-    return re.sub(r'[^\w\-]', '_', f"{campaign_slug}_{year}_{country}")[:120]
+from errors import CampaignNotFoundError, DatabaseError, QueryCancelledError, QueryTimeoutError
+from file_cache import safe_cache_key, write_cache
+from bulk_aggregates import bulk_year_path, load_bulk_year
+from request_stats import STATS_FILENAME, load_request_stats
+from query_watchdog import CancelToken, query_scope
+from memory_profile import memory_phase
 
 
 def build_one_uploaders_cache(
@@ -33,17 +42,25 @@ def build_one_uploaders_cache(
     query_manager,
     logger,
     use_analytics: bool = True,
+    timeout: Optional[int] = None,
+    raise_errors: bool = False,
 ) -> bool:
-    """Build and write uploaders JSON for one (campaign, year, country). Returns True on success."""
+    """
+    Build and write uploaders JSON for one (campaign, year, country). Returns True on success.
+    A country without files gets an empty list. With raise_errors, database errors
+    propagate (so the caller can retry) instead of returning False.
+    """
     safe_key = safe_cache_key(campaign_slug, year, country)
     cache_file = cache_dir / f"{safe_key}.json"
     try:
-        raw_data = query_manager.execute_uploader_query(
-            campaign_slug, year=year, country=country, use_analytics=use_analytics
+        # Exact country category, as the API's batch builder queries it
+        rows_by_country = query_manager.execute_uploader_batch_quarry_style(
+            campaign_slug, year=year, countries=[country], use_analytics=use_analytics, timeout=timeout
         )
+        raw_data = rows_by_country.get(country, [])
         total = sum(int(r.get('images', 0) or 0) for r in raw_data)
         result = []
-        for r in raw_data:
+        for r in raw_data[:Config.UPLOADERS_PER_COUNTRY_LIMIT]:
             uploads = int(r.get('images', 0) or 0)
             result.append({
                 'username': (r.get('username') or '').strip(),
@@ -52,11 +69,16 @@ def build_one_uploaders_cache(
                 'percentage': round(100 * uploads / total, 2) if total else 0,
             })
         data = {'uploaders': result, 'total_uploads': total}
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
+        write_cache(cache_file, data)
         logger.info(f'Prebuilt uploaders: {safe_key} ({len(result)} uploaders)')
         return True
+    except CampaignNotFoundError:
+        return False
+    except DatabaseError:
+        if raise_errors:
+            raise
+        logger.warning(f'Prebuild failed {safe_key}', exc_info=True)
+        return False
     except Exception as e:
         logger.warning(f'Prebuild failed {safe_key}: {e}')
         return False
@@ -70,42 +92,46 @@ def build_one_country_detail_cache(
     query_manager,
     logger,
     use_analytics: bool = True,
+    timeout: Optional[int] = None,
+    raise_errors: bool = False,
 ) -> bool:
-    """Build and write country detail JSON for one (campaign, year, country). Returns True on success."""
+    """
+    Build and write country detail JSON for one (campaign, year, country). Returns True on success.
+    A country without files has no detail to write and also counts as success.
+    With raise_errors, database errors propagate (so the caller can retry) instead of returning False.
+    """
     safe_key = safe_cache_key(campaign_slug, year, country)
     cache_file = cache_dir / f"{safe_key}.json"
     try:
-        raw_data = query_manager.execute_campaign_query(
-            campaign_slug, year=year, country=country, use_analytics=use_analytics
+        # Exact country category with no upload-date window, as the API's batch builder counts it
+        rows_by_country = query_manager.execute_country_batch_quarry_style(
+            campaign_slug, year=year, countries=[country], use_analytics=use_analytics, timeout=timeout
         )
-        if not raw_data:
-            return False
-        uploads = sum(int(r.get('uploads', 0) or 0) for r in raw_data)
-        uploaders = max(int(r.get('uploaders', 0) or 0) for r in raw_data)
-        images_used = sum(int(r.get('images_used', 0) or 0) for r in raw_data)
-        new_uploaders = max(int(r.get('new_uploaders', 0) or 0) for r in raw_data)
-        first = raw_data[0]
-        campaign_name = (first.get('campaign_name') or campaign_slug).replace('_', ' ')
-        country_display = (first.get('country') or country).strip()
-        category_name = f"Images_from_{first.get('campaign_name', campaign_slug).replace(' ', '_')}_{year}_in_{country_display.replace(' ', '_')}"
+        row = rows_by_country.get(country)
+        if not row or not int(row.get('uploads', 0) or 0):
+            logger.info(f'No files for {safe_key}; no country detail to prebuild')
+            return True
         data = {
-            'campaign': campaign_name,
+            'campaign': (row.get('campaign_name') or campaign_slug).replace('_', ' '),
             'year': year,
-            'country': country_display,
-            'category_name': category_name,
-            'total_uploads': uploads,
-            'total_uploaders': uploaders,
-            'total_images_used': images_used,
-            'total_new_uploaders': new_uploaders,
+            'country': country,
+            'category_name': row.get('category_name'),
+            'total_uploads': int(row.get('uploads', 0) or 0),
+            'total_uploaders': int(row.get('uploaders', 0) or 0),
+            'total_images_used': int(row.get('images_used', 0) or 0),
+            'total_new_uploaders': int(row.get('new_uploaders', 0) or 0),
             'daily_stats': [],
         }
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
+        write_cache(cache_file, data)
         logger.info(f'Prebuilt country detail: {safe_key}')
         return True
     except CampaignNotFoundError:
         return False
+    except DatabaseError:
+        if raise_errors:
+            raise
+        logger.warning(f'Prebuild country detail failed {safe_key}', exc_info=True)
+        return False
     except Exception as e:
         logger.warning(f'Prebuild country detail failed {safe_key}: {e}')
         return False
@@ -143,39 +169,312 @@ def get_tasks_from_processed_data(data_dir: Path, recent_years_only: int = 3) ->
     return tasks
 
 
-def main():
+def build_from_bulk(
+    tasks: list,
+    bulk_dir: Path,
+    country_detail_dir: Path,
+    uploaders_dir: Path,
+    logger,
+) -> tuple:
+    """
+    Write both caches for every task the bulk aggregates cover.
+
+    Cache files get the bulk file's modification time, so their TTL counts
+    from when the aggregates were generated. A cache file newer than the bulk
+    file (refreshed from the replica by the API since) is kept as it is.
+
+    Returns:
+        Tuple of (built tasks, tasks missing from the bulk data).
+    """
+    built, missing = [], []
+    bulk_years = {}
+    for task in tasks:
+        campaign_slug, year, country = task
+        if (campaign_slug, year) not in bulk_years:
+            try:
+                generated = bulk_year_path(bulk_dir, campaign_slug, year).stat().st_mtime
+            except OSError:
+                generated = None
+            bulk_years[(campaign_slug, year)] = (generated, load_bulk_year(bulk_dir, campaign_slug, year))
+        generated, countries = bulk_years[(campaign_slug, year)]
+        entry = countries.get(country)
+        if not entry or 'country_detail' not in entry or 'uploaders' not in entry:
+            missing.append(task)
+            continue
+        safe_key = safe_cache_key(campaign_slug, year, country)
+        try:
+            for path, data in (
+                (country_detail_dir / f"{safe_key}.json", entry['country_detail']),
+                (uploaders_dir / f"{safe_key}.json", entry['uploaders']),
+            ):
+                if not _newer_than(path, generated):
+                    write_cache(path, data, mtime=generated)
+        except OSError as e:
+            logger.warning(f'Prebuild from bulk failed {safe_key}: {e}')
+            missing.append(task)
+            continue
+        built.append(task)
+    return built, missing
+
+
+def _newer_than(path: Path, timestamp: Optional[float]) -> bool:
+    """True if path exists and was modified after timestamp."""
+    try:
+        return timestamp is not None and path.stat().st_mtime > timestamp
+    except OSError:
+        return False
+
+
+def rank_tasks(tasks: list, hits: dict, recent_years_only: int = 3) -> list:
+    """
+    Order tasks by expected demand and drop old keys nobody requests.
+
+    Score is the decayed hit count of the task's country-detail plus uploaders
+    cache keys. Tasks from the recent_years_only most recent years are always
+    kept (new campaign years have no history yet); older ones only with hits.
+    Ties keep file order.
+    """
+    import time
+    current_year = int(time.strftime('%Y', time.gmtime()))
+    detail_hits = hits.get('country_detail', {})
+    uploaders_hits = hits.get('uploaders', {})
+    scored = []
+    for i, (campaign_slug, year, country) in enumerate(tasks):
+        key = safe_cache_key(campaign_slug, year, country)
+        score = detail_hits.get(key, 0.0) + uploaders_hits.get(key, 0.0)
+        recent = recent_years_only <= 0 or (current_year - year) < recent_years_only
+        if score > 0 or recent:
+            scored.append((-score, i, (campaign_slug, year, country)))
+    scored.sort()
+    return [task for _, _, task in scored]
+
+
+def traffic_coverage(built_keys: set, hits: dict) -> dict:
+    """Share of recorded hits (per cache kind) whose keys were built in this run."""
+    coverage = {}
+    for kind, keys in hits.items():
+        total = sum(keys.values())
+        covered = sum(v for k, v in keys.items() if k in built_keys)
+        coverage[kind] = round(100 * covered / total, 1) if total else 0.0
+    return coverage
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0 if empty)."""
+    import math
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def run_task(
+    task: tuple,
+    query_manager,
+    logger,
+    country_detail_dir: Path,
+    uploaders_dir: Path,
+    timeout: Optional[int],
+    retries: int,
+    backoff_sec: float,
+    token: Optional[CancelToken] = None,
+) -> dict:
+    """
+    Build both caches for one (campaign, year, country), retrying database errors
+    with exponential backoff. Queries still running when token is cancelled are
+    killed on the replica. Returns a result dict with timings and outcome.
+    """
+    import random
+    import time
+    campaign_slug, year, country = task
+    start = time.time()
+    result = {'task': task, 'detail': False, 'uploaders': False, 'attempts': 0, 'timeouts': 0, 'error': None}
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        try:
+            with query_scope(token=token), memory_phase('prebuild:replica_task'):
+                if not result['detail']:
+                    result['detail'] = build_one_country_detail_cache(
+                        campaign_slug, year, country, country_detail_dir, query_manager, logger,
+                        timeout=timeout, raise_errors=True
+                    )
+                result['uploaders'] = build_one_uploaders_cache(
+                    campaign_slug, year, country, uploaders_dir, query_manager, logger,
+                    timeout=timeout, raise_errors=True
+                )
+            result['error'] = None
+            break
+        except QueryCancelledError as e:
+            result['error'] = str(e)
+            break
+        except DatabaseError as e:
+            if isinstance(e, QueryTimeoutError):
+                result['timeouts'] += 1
+            result['error'] = str(e)
+            if attempt < retries:
+                delay = backoff_sec * (2 ** attempt) * (1 + random.random() / 2)
+                logger.warning(
+                    f'Prebuild {safe_cache_key(*task)} attempt {attempt + 1} failed ({e}); '
+                    f'retrying in {delay:.0f}s'
+                )
+                time.sleep(delay)
+    if result['error']:
+        logger.warning(f'Prebuild failed {safe_cache_key(*task)} after {result["attempts"]} attempts: {result["error"]}')
+    result['seconds'] = time.time() - start
+    return result
+
+
+def main(
+    max_seconds: Optional[float] = None,
+    max_queries: Optional[int] = None,
+    workers: Optional[int] = None,
+    token: Optional[CancelToken] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    skip_keys: Optional[set] = None,
+):
+    """
+    Prebuild caches from the bulk aggregates, then query the replica for the
+    remaining keys, most-requested first, until done or a budget runs out.
+
+    Args:
+        max_seconds: Stop starting new replica tasks after this many seconds.
+        max_queries: Stop before exceeding this many replica queries (2 per task).
+        workers: Tasks built concurrently (default Config.PREBUILD_WORKERS). Every
+            worker query still waits for one of the process's connection slots.
+        token: Cancelling it stops starting tasks and kills the running queries
+            (run as a script, SIGTERM cancels it).
+        on_progress: Called when the replica phase starts and after each task
+            with tasks_done, tasks_total, queries, the finished task and task_ok.
+        skip_keys: Cache keys (safe_cache_key) not to query again, e.g. tasks a
+            paused prebuild job finished before it stopped.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
     logger = get_logger('prebuild_uploaders')
     cfg = Config()
     data_dir = cfg.DATA_DIR
     uploaders_dir = cfg.UPLOADERS_CACHE_DIR
     country_detail_dir = cfg.COUNTRY_DETAIL_CACHE_DIR
+    if max_seconds is None:
+        max_seconds = cfg.PREBUILD_MAX_SECONDS
+    if max_queries is None:
+        max_queries = cfg.PREBUILD_MAX_QUERIES
+    workers = max(1, min(workers or cfg.PREBUILD_WORKERS, connection_limit()))
+    token = token or CancelToken()
 
-    RECENT_YEARS = 3
-    tasks = get_tasks_from_processed_data(data_dir, recent_years_only=RECENT_YEARS)
-    if not tasks:
+    hits = load_request_stats(data_dir / STATS_FILENAME)
+    all_tasks = get_tasks_from_processed_data(data_dir, recent_years_only=0)
+    if not all_tasks:
         logger.warning('No (campaign, year, country) tasks from processed data')
         return 0
 
-    logger.info(f'Prebuilding uploaders + country detail for {len(tasks)} tasks (recent {RECENT_YEARS} years)')
+    with memory_phase('prebuild:bulk'):
+        bulk_built, missing = build_from_bulk(all_tasks, cfg.BULK_DATA_DIR, country_detail_dir, uploaders_dir, logger)
+    built_keys = {safe_cache_key(*task) for task in bulk_built}
+    logger.info(
+        f'Prebuilt {len(bulk_built)}/{len(all_tasks)} keys from bulk aggregates; '
+        f'{len(missing)} keys missing from bulk data'
+    )
+    tasks = rank_tasks(missing, hits, recent_years_only=cfg.PREBUILD_RECENT_YEARS)
+    if skip_keys:
+        built_keys.update(key for key in (safe_cache_key(*task) for task in tasks) if key in skip_keys)
+        tasks = [task for task in tasks if safe_cache_key(*task) not in skip_keys]
+    if not tasks:
+        coverage = traffic_coverage(built_keys, hits)
+        logger.info(
+            f'Prebuild done: no replica queries needed; '
+            f'traffic coverage {coverage or "n/a (no request stats yet)"}'
+        )
+        return 0
+
+    logger.info(
+        f'Querying uploaders + country detail for {len(tasks)} tasks with {workers} worker(s) '
+        f'(recent {cfg.PREBUILD_RECENT_YEARS} years + requested keys, most requested first; '
+        f'budget: {max_seconds or "no"} s, {max_queries or "no"} queries)'
+    )
     query_manager = get_query_manager()
-    ok_uploaders = 0
-    ok_detail = 0
-    fail = 0
-    for campaign_slug, year, country in tasks:
-        if build_one_country_detail_cache(
-            campaign_slug, year, country, country_detail_dir, query_manager, logger
-        ):
-            ok_detail += 1
-        if build_one_uploaders_cache(
-            campaign_slug, year, country, uploaders_dir, query_manager, logger
-        ):
-            ok_uploaders += 1
-        else:
-            fail += 1
-
-    logger.info(f'Prebuild done: country_detail {ok_detail} ok, uploaders {ok_uploaders} ok, {fail} uploaders failed')
+    results = []
+    queries = 0
+    stopped = None
+    start = time.time()
+    pending_tasks = iter(tasks)
+    if on_progress:
+        on_progress({'tasks_done': 0, 'tasks_total': len(tasks), 'queries': 0, 'task': None, 'task_ok': False})
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prebuild') as pool:
+        running = set()
+        while True:
+            while len(running) < workers and not stopped:
+                task = next(pending_tasks, None)
+                if task is None:
+                    break
+                if token.cancelled:
+                    stopped = token.reason or 'cancel'
+                    break
+                if max_seconds is not None and time.time() - start >= max_seconds:
+                    stopped = 'time budget'
+                    break
+                if max_queries is not None and queries + 2 > max_queries:
+                    stopped = 'query budget'
+                    break
+                queries += 2
+                running.add(pool.submit(
+                    run_task, task, query_manager, logger, country_detail_dir, uploaders_dir,
+                    cfg.PREBUILD_QUERY_TIMEOUT_SEC, cfg.PREBUILD_RETRIES, cfg.PREBUILD_RETRY_BACKOFF_SEC,
+                    token
+                ))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results.append(future.result())
+                if results[-1]['detail'] and results[-1]['uploaders']:
+                    built_keys.add(safe_cache_key(*results[-1]['task']))
+                if on_progress:
+                    on_progress({
+                        'tasks_done': len(results),
+                        'tasks_total': len(tasks),
+                        'queries': queries,
+                        'task': results[-1]['task'],
+                        'task_ok': bool(results[-1]['detail'] and results[-1]['uploaders']),
+                    })
+
+    elapsed = time.time() - start
+    ok_detail = sum(1 for r in results if r['detail'])
+    ok_uploaders = sum(1 for r in results if r['uploaders'])
+    # A task failed if either of its caches was not built
+    fail = sum(1 for r in results if not (r['detail'] and r['uploaders']))
+    latencies = sorted(r['seconds'] for r in results)
+    coverage = traffic_coverage(built_keys, hits)
+    if stopped:
+        logger.info(f'Prebuild stopped by {stopped} after {len(results)}/{len(tasks)} tasks')
+    logger.info(
+        f'Prebuild done in {elapsed:.0f}s: {len(bulk_built)} from bulk, country_detail {ok_detail} ok, '
+        f'uploaders {ok_uploaders} ok, {fail} tasks failed, {queries} queries; '
+        f'traffic coverage {coverage or "n/a (no request stats yet)"}'
+    )
+    logger.info(
+        f'Prebuild throughput {60 * len(results) / elapsed if elapsed else 0:.1f} tasks/min; '
+        f'task latency p50 {_percentile(latencies, 50):.1f}s, p95 {_percentile(latencies, 95):.1f}s, '
+        f'p99 {_percentile(latencies, 99):.1f}s, max {latencies[-1] if latencies else 0:.1f}s; '
+        f'retries {sum(r["attempts"] - 1 for r in results)}, timeouts {sum(r["timeouts"] for r in results)}'
+    )
     return 0 if fail == 0 else 1
 
 
 if __name__ == '__main__':
-    sys.exit(main())
+    import argparse
+    parser = argparse.ArgumentParser(description='Prebuild uploaders + country detail caches.')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='Stop starting new replica tasks after this many seconds')
+    parser.add_argument('--max-queries', type=int, default=None,
+                        help='Stop before exceeding this many replica queries (2 per task)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Build this many tasks concurrently (capped by the connection share)')
+    args = parser.parse_args()
+    import signal
+    # A stopped Toolforge job must not leave its queries running on the replica
+    cancel_token = CancelToken()
+    signal.signal(signal.SIGTERM, lambda signum, frame: cancel_token.cancel('SIGTERM'))
+    sys.exit(main(
+        max_seconds=args.max_seconds, max_queries=args.max_queries, workers=args.workers, token=cancel_token
+    ))
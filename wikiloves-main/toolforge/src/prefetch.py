@@ -0,0 +1,132 @@
+"""
+Speculative prefetch of country caches when a campaign is viewed.
+
+After loading /api/data/<campaign>, users almost always open one of the top
+few countries next. When campaign data or its summary is served, the top-N
+countries by uploads in the most recent years get their country detail and
+uploaders caches built at low priority, so the click is served from cache.
+
+Prefetch never competes with real requests for the replica: it uses the
+low-priority lane of the refresh queue, is limited by a per-minute query
+budget, and skips keys whose caches are already fresh or being built.
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from config import Config
+from cache_refresh import PRIORITY_PREFETCH
+from file_cache import is_fresh, safe_cache_key
+from logger import get_logger
+from miss_batcher import MissBatcher
+
+
+class PrefetchTarget(NamedTuple):
+    """One kind of cache to warm: the batcher that builds it and where it lives."""
+    batcher: MissBatcher
+    cache_dir: Path
+    soft_ttl: float
+
+
+class QueryBudget:
+    """Token bucket limiting background queries per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(0, per_minute)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.capacity / 60.0)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class PrefetchPolicy:
+    """Decides which country caches to warm for a viewed campaign."""
+
+    def __init__(self, top_n: int, recent_years: int, queries_per_minute: int, min_interval_sec: float):
+        self.top_n = top_n
+        self.recent_years = recent_years
+        self.min_interval_sec = min_interval_sec
+        self.budget = QueryBudget(queries_per_minute)
+        self._last_run: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def select(self, processed: Dict[str, Any]) -> List[Tuple[int, List[str]]]:
+        """Top-N countries by uploads for each of the most recent years."""
+        years = sorted(
+            (y for y in processed.get('years') or [] if y.get('year')),
+            key=lambda y: int(y['year']),
+            reverse=True
+        )[:self.recent_years]
+        selection = []
+        for y in years:
+            rows = y.get('country_rows') or []
+            if rows:
+                ranked = [(r.get('images', 0) or 0, r.get('country')) for r in rows]
+            else:
+                ranked = [(r.get('uploads', 0) or 0, r.get('name')) for r in y.get('country_stats') or []]
+            ranked.sort(key=lambda t: t[0], reverse=True)
+            countries = [name for _, name in ranked if name][:self.top_n]
+            if countries:
+                selection.append((int(y['year']), countries))
+        return selection
+
+    def schedule(self, campaign_slug: str, processed: Dict[str, Any], targets: List[PrefetchTarget]) -> int:
+        """
+        Enqueue low-priority builds for the selected countries of a campaign.
+
+        Returns:
+            Number of grouped queries enqueued.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_run.get(campaign_slug)
+            if last is not None and now - last < self.min_interval_sec:
+                return 0
+            self._last_run[campaign_slug] = now
+
+        enqueued = 0
+        for year, countries in self.select(processed):
+            for target in targets:
+                missing = [
+                    c for c in countries
+                    if not is_fresh(target.cache_dir / f"{safe_cache_key(campaign_slug, year, c)}.json", target.soft_ttl)
+                    and not target.batcher.is_inflight(campaign_slug, year, c)
+                ]
+                if not missing:
+                    continue
+                # One grouped query per (target, year): spend one token for the batch
+                if not self.budget.try_acquire():
+                    get_logger().info(f'Prefetch budget exhausted; skipped {campaign_slug} {year} {target.batcher.name}')
+                    return enqueued
+                for country in missing:
+                    target.batcher.submit(campaign_slug, year, country, priority=PRIORITY_PREFETCH)
+                enqueued += 1
+        return enqueued
+
+
+# Global prefetch policy instance
+_prefetch_policy: Optional[PrefetchPolicy] = None
+
+
+def get_prefetch_policy() -> PrefetchPolicy:
+    """Get global prefetch policy instance."""
+    global _prefetch_policy
+    if _prefetch_policy is None:
+        _prefetch_policy = PrefetchPolicy(
+            top_n=Config.PREFETCH_TOP_N,
+            recent_years=Config.PREFETCH_RECENT_YEARS,
+            queries_per_minute=Config.PREFETCH_QUERIES_PER_MINUTE,
+            min_interval_sec=Config.PREFETCH_MIN_INTERVAL_SEC,
+        )
+    return _prefetch_policy
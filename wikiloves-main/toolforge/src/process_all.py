@@ -3,8 +3,11 @@
 Process bulk TSV files from fetch_all.sh into JSON cache files.
 
 Reads: /tmp/wl_bulk/{campaign}_{year}.tsv
+       ~/shared/data/actors.sqlite (fill it first: actor_registry.py --fill-from-tsv /tmp/wl_bulk)
 Writes:
   ~/shared/data/{campaign}_processed.json          (year-level summary + country_rows)
+  ~/shared/data/manifest.json                      (known campaign/year/country keys)
+  ~/shared/data/bulk/{campaign}_{year}.json        (per-country aggregates for prebuild)
   ~/shared/data/country_detail/{campaign}_{year}_{Country}.json
   ~/shared/data/uploaders/{campaign}_{year}_{Country}.json
 """
@@ -14,15 +17,26 @@ import json
 import os
 import re
 import sys
+import time
 from collections import defaultdict
 from pathlib import Path
 
+from actor_registry import ACTOR_REGISTRY_FILENAME, ActorRegistry, collect_tsv_actor_ids
+from bulk_aggregates import BULK_DIRNAME, load_bulk_year, write_bulk_year
+from memory_profile import memory_phase
+from negative_cache import write_manifest
+
 TSV_DIR = "/tmp/wl_bulk"
 STATIC_DIR = Path(os.path.expanduser("~/shared/static_data"))
 
 DATA_DIR = Path(os.path.expanduser("~/shared/data"))
 COUNTRY_DETAIL_DIR = DATA_DIR / "country_detail"
 UPLOADERS_DIR = DATA_DIR / "uploaders"
+BULK_DIR = DATA_DIR / BULK_DIRNAME
+# Stop when more than this share of TSV actor ids has no stored registration: the
+# registry was not filled (actor_registry.py --fill-from-tsv) and every uploader
+# would count as not new. --allow-missing-registrations processes anyway
+MAX_MISSING_REGISTRATIONS = 0.5
 
 CAMPAIGN_META = {
     "earth":      {"name": "Wiki Loves Earth",           "prefix": "Images_from_Wiki_Loves_Earth",           "comp_month": 5},
@@ -201,8 +215,21 @@ def clean_reg(reg_str):
     return reg_str.replace("-", "").replace(" ", "").replace(":", "").replace("T", "")
 
 
-def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
+def process_campaign(slug, country_whitelist=None, images_used_tsv=None, used_files=None, actor_registry=None,
+                     timings=None):
+    """
+    Aggregate the campaign's TSV files and write its JSON cache files.
+
+    If timings (a dict) is given, seconds spent reading/aggregating rows and
+    writing output files are added to timings['aggregate'] and
+    timings['write_outputs'] (used by bench_process_all.py).
+    """
     meta = CAMPAIGN_META[slug]
+    if timings is not None:
+        timings.setdefault("aggregate", 0.0)
+        timings.setdefault("write_outputs", 0.0)
+    # actor_id -> registration, looked up once per actor in the local store
+    registrations = {}
     campaign_name = meta["name"]
     prefix = meta["prefix"]
     comp_month = meta["comp_month"]
@@ -236,12 +263,15 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
             "uploaders": set(),
             "new_uploaders": set(),
             "user_reg": {},
-            "daily": defaultdict(lambda: {"uploads": 0, "uploaders": set(), "new_uploaders": set()}),
+            "daily": defaultdict(lambda: {"uploads": 0, "images_used": 0, "uploaders": set(), "new_uploaders": set()}),
             "user_uploads": defaultdict(int),
+            "images_used": 0,
+            "user_used": defaultdict(int),
         })
 
         skipped_countries = set()
         row_count = 0
+        stage_start = time.perf_counter()
 
         with open(tsv_path, "r", encoding="utf-8") as f:
             reader = csv.DictReader(f, delimiter="\t")
@@ -263,7 +293,14 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
                     continue
 
                 name = r.get("actor_name", "")
-                reg = r.get("user_registration", "") or ""
+                if "user_registration" in r:
+                    reg = r.get("user_registration", "") or ""
+                else:
+                    actor_id = r.get("actor_id", "")
+                    if actor_id not in registrations:
+                        found = actor_registry.get(int(actor_id)) if actor_registry and actor_id.isdigit() else None
+                        registrations[actor_id] = found or ""
+                    reg = registrations[actor_id]
                 date = r.get("upload_date", "") or ""
 
                 c = countries[country]
@@ -271,6 +308,11 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
                 c["uploaders"].add(name)
                 c["user_uploads"][name] += 1
 
+                used = used_files is not None and is_file_used(used_files, r.get("page_id"))
+                if used:
+                    c["images_used"] += 1
+                    c["user_used"][name] += 1
+
                 if name not in c["user_reg"]:
                     c["user_reg"][name] = reg
 
@@ -281,10 +323,16 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
 
                 if date:
                     c["daily"][date]["uploads"] += 1
+                    if used:
+                        c["daily"][date]["images_used"] += 1
                     c["daily"][date]["uploaders"].add(name)
                     if is_new:
                         c["daily"][date]["new_uploaders"].add(name)
 
+        if timings is not None:
+            timings["aggregate"] += time.perf_counter() - stage_start
+            stage_start = time.perf_counter()
+
         if row_count == 0:
             print(f"  {slug} {year}: empty")
             continue
@@ -299,6 +347,7 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
         year_total_new = set()
 
         year_images_used_total = 0
+        bulk_countries = {}
 
         for country_name in sorted(countries.keys()):
             c = countries[country_name]
@@ -313,10 +362,15 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
             country_slug = country_name.replace(' ', '_')
             no_in_fallback = meta.get("no_in_country", {}).get(year)
             is_no_in = country_name == "International" or country_name == no_in_fallback
+            category_keys = [
+                f"{pfx}_{year}" if is_no_in else f"{pfx}_{year}_in_{country_slug}"
+                for pfx in [prefix] + (meta.get("alt_prefixes") or [])
+            ]
             country_iu = 0
-            if images_used_tsv:
-                for pfx in [prefix] + (meta.get("alt_prefixes") or []):
-                    key = f"{pfx}_{year}" if is_no_in else f"{pfx}_{year}_in_{country_slug}"
+            if used_files is not None:
+                country_iu = c["images_used"]
+            elif images_used_tsv:
+                for key in category_keys:
                     country_iu = images_used_tsv.get(key, 0)
                     if country_iu:
                         break
@@ -346,6 +400,7 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
                 daily_stats.append({
                     "date": dt,
                     "uploads": d["uploads"],
+                    "images_used": d["images_used"],
                     "uploaders": upl,
                     "new_uploaders": nu,
                     "new_uploaders_pct": f"{pct}%",
@@ -374,6 +429,7 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
                     {
                         "username": u,
                         "uploads": cnt,
+                        "images_used": c["user_used"].get(u, 0),
                         "percentage": round(100 * cnt / total, 2) if total else 0,
                     }
                     for u, cnt in c["user_uploads"].items()
@@ -387,6 +443,10 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
             with open(upl_path, "w", encoding="utf-8") as f:
                 json.dump(upl_data, f, ensure_ascii=False)
 
+            bulk_countries[country_name] = {"country_detail": detail, "uploaders": upl_data}
+
+        write_bulk_year(BULK_DIR, slug, year, bulk_countries)
+
         # Sort country_rows by images descending
         country_rows.sort(key=lambda x: x["images"], reverse=True)
 
@@ -407,6 +467,8 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
             "country_rows": country_rows,
         }
         years_data.append(year_entry)
+        if timings is not None:
+            timings["write_outputs"] += time.perf_counter() - stage_start
 
         print(f"  {slug} {year}: {len(countries)} countries, {year_total_uploads} uploads, "
               f"{year_images_used_total} images_used, {year_uploaders_total} uploaders, {year_new_total} new", flush=True)
@@ -437,9 +499,12 @@ def process_campaign(slug, country_whitelist=None, images_used_tsv=None):
         "years": years_data,
     }
 
+    stage_start = time.perf_counter()
     out_path = DATA_DIR / f"{slug}_processed.json"
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(processed, f, ensure_ascii=False)
+    if timings is not None:
+        timings["write_outputs"] += time.perf_counter() - stage_start
     print(f"  Saved {out_path}", flush=True)
 
 
@@ -510,6 +575,43 @@ def load_images_used_tsv(slug):
     return lookup
 
 
+def load_used_files(slug):
+    """
+    Load the ids of files with global usage generated by the fetch script.
+    File: /tmp/wl_bulk/{slug}_used_files.tsv  (page_id)
+    Returns a bitset (bytearray, bit n set if page n is used), or None if the file is missing.
+    """
+    tsv_path = Path(TSV_DIR) / f"{slug}_used_files.tsv"
+    if not tsv_path.exists():
+        return None
+    bits = bytearray()
+    try:
+        with open(tsv_path, "r", encoding="utf-8") as f:
+            reader = csv.DictReader(f, delimiter="\t")
+            for row in reader:
+                page_id = int(row.get("page_id", 0) or 0)
+                if page_id <= 0:
+                    continue
+                byte = page_id >> 3
+                if byte >= len(bits):
+                    bits.extend(bytes(max(byte + 1 - len(bits), len(bits))))
+                bits[byte] |= 1 << (page_id & 7)
+    except (OSError, ValueError) as e:
+        print(f"  Warning: could not read used files TSV {tsv_path}: {e}")
+        return None
+    return bits
+
+
+def is_file_used(bits, page_id):
+    """True if page_id is set in a bitset from load_used_files."""
+    try:
+        page_id = int(page_id)
+    except (TypeError, ValueError):
+        return False
+    byte = page_id >> 3
+    return 0 <= byte < len(bits) and bool(bits[byte] & (1 << (page_id & 7)))
+
+
 def merge_images_used(slug, processed_data, images_lookup):
     """Merge images_used from static data into processed + detail cache files."""
     merged_count = 0
@@ -559,6 +661,18 @@ def merge_images_used(slug, processed_data, images_lookup):
                     except (json.JSONDecodeError, OSError):
                         pass
 
+        # Keep the bulk aggregates in line with the country_detail files
+        bulk = load_bulk_year(BULK_DIR, slug, year)
+        patched = False
+        for cr in yd.get("country_rows", []):
+            cr_iu = images_lookup.get((slug, year, cr["country"].lower()), 0)
+            entry = bulk.get(cr["country"])
+            if cr_iu and entry:
+                entry["country_detail"]["total_images_used"] = cr_iu
+                patched = True
+        if patched:
+            write_bulk_year(BULK_DIR, slug, year, bulk)
+
     return merged_count
 
 
@@ -596,15 +710,38 @@ def main():
         print(f"  Country whitelist loaded for {wl_years} campaign-years")
     print()
 
+    # Registrations for TSVs without user_registration (filled by actor_registry.py --fill-from-tsv)
+    actor_registry = ActorRegistry(DATA_DIR / ACTOR_REGISTRY_FILENAME)
+    print(f"Actor registry: {actor_registry.count()} actors")
+    tsv_actor_ids = collect_tsv_actor_ids(Path(TSV_DIR))
+    if tsv_actor_ids:
+        missing = len(tsv_actor_ids) - len(actor_registry.get_many(tsv_actor_ids))
+        share = missing / len(tsv_actor_ids)
+        if missing:
+            print(f"  {missing}/{len(tsv_actor_ids)} TSV actors ({share:.0%}) have no stored registration")
+        if share > MAX_MISSING_REGISTRATIONS:
+            print("ERROR: registrations missing for most TSV actors; new uploader counts would be 0.")
+            print(f"  Run first: python3 actor_registry.py --fill-from-tsv {TSV_DIR}")
+            print("  (or pass --allow-missing-registrations to process anyway)")
+            if "--allow-missing-registrations" not in sys.argv[1:]:
+                sys.exit(1)
+    print()
+
     for slug in campaigns:
         print(f"=== {CAMPAIGN_META[slug]['name']} ({slug}) ===")
         iu_tsv = load_images_used_tsv(slug)
         if iu_tsv:
             print(f"  Loaded {len(iu_tsv)} images_used entries from TSV")
-        process_campaign(slug, country_whitelist=country_whitelist, images_used_tsv=iu_tsv)
-
-        # Merge images_used from static data
-        if images_lookup:
+        used_files = load_used_files(slug)
+        if used_files is not None:
+            print(f"  Loaded used-files bitset ({len(used_files)} bytes); images_used from per-file flags")
+        with memory_phase(f"process_campaign:{slug}"):
+            process_campaign(slug, country_whitelist=country_whitelist, images_used_tsv=iu_tsv,
+                             used_files=used_files, actor_registry=actor_registry)
+
+        # Merge images_used from static data, only for campaigns without per-file
+        # usage flags (their counts from process_campaign are exact)
+        if images_lookup and used_files is None:
             out_path = DATA_DIR / f"{slug}_processed.json"
             if out_path.exists():
                 with open(out_path, "r", encoding="utf-8") as f:
@@ -616,10 +753,14 @@ def main():
                     print(f"  Merged images_used for {merged} country entries")
         print()
 
+    manifest_path = write_manifest(DATA_DIR)
+    print(f"Wrote known-keys manifest: {manifest_path}")
+
     print("Done! All JSON cache files generated.")
     print(f"  Processed JSONs: {DATA_DIR}/<campaign>_processed.json")
     print(f"  Country detail:  {COUNTRY_DETAIL_DIR}/")
     print(f"  Uploaders:       {UPLOADERS_DIR}/")
+    print(f"  Bulk aggregates: {BULK_DIR}/")
 
 
 if __name__ == "__main__":
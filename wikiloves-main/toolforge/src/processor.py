@@ -11,6 +11,7 @@ from pathlib import Path
 
 from config import Config
 from errors import ProcessingError, CampaignNotFoundError
+from negative_cache import write_manifest
 
 # Import campaign metadata - check src/ directory first (Toolforge deployment), then backend
 try:
@@ -302,7 +303,7 @@ class DataProcessor:
         output_path: Optional[str] = None
     ) -> str:
         """
-        Save processed data to file.
+        Save processed data to file and refresh the known-keys manifest.
         
         Args:
             data: Processed campaign data.
@@ -321,9 +322,15 @@ class DataProcessor:
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
-            return str(output_path)
         except Exception as e:
             raise ProcessingError(f"Error saving processed data: {str(e)}") from e
+        
+        # Keep the known-keys manifest in sync so the API can 404 unknown countries without a query
+        try:
+            write_manifest(output_path.parent)
+        except OSError:
+            pass
+        return str(output_path)
 
 
 # Global processor instance
@@ -5,12 +5,15 @@ Loads unified queries and generates campaign-specific queries.
 
 import os
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any
 import sys
 
 from config import Config
-from errors import QueryGenerationError, CampaignNotFoundError
+from errors import QueryCancelledError, QueryGenerationError, CampaignNotFoundError
 from database import get_db
+from column_values import decode_value, encode_value
+from query_watchdog import current_token
+from actor_registry import get_actor_registry, is_new_registration
 
 # Import campaign metadata - check src/ directory first (Toolforge deployment), then backend
 try:
@@ -30,6 +33,30 @@ except ImportError:
             return None
 
 
+
+def _text(value: Any) -> Any:
+    """Column value as str: the replica returns VARBINARY columns (cl_to, actor_name, ...) as bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+def _decode_columns(rows: List[Dict[str, Any]], columns: tuple) -> List[Dict[str, Any]]:
+    """Decode the given text columns of result rows to str (in place); returns rows."""
+    for r in rows:
+        for column in columns:
+            if column in r:
+                r[column] = _text(r[column])
+    return rows
+
+
+def _raise_if_cancelled() -> None:
+    """Stop a multi-query loop between queries once its query_scope token is cancelled."""
+    token = current_token()
+    if token is not None and token.cancelled:
+        raise QueryCancelledError(f"Cancelled ({token.reason})")
+
+
 class QueryManager:
     """Manages SQL queries for campaign data fetching."""
     
@@ -128,48 +155,35 @@ class QueryManager:
             country_pattern = country.replace(" ", "_")
             country_filter = f" AND cl.cl_to LIKE '%_in_{country_pattern}%'"
 
+        files = self._files_subquery(f"""
+  AND (
+    {' OR '.join([f"cl.cl_to LIKE '{pattern}'" for pattern in category_patterns])}
+  )
+  AND cl.cl_to REGEXP '[0-9]{{4}}$'
+  {year_filter}
+  {country_filter}""")
+
         # Generate query based on unified query structure
         query = f"""
 SELECT 
     '{campaign_slug}' AS campaign_slug,
     '{campaign_name}' AS campaign_name,
-    CAST(SUBSTRING_INDEX(cl.cl_to, '_', -1) AS UNSIGNED) AS year,
+    CAST(SUBSTRING_INDEX(f.cl_to, '_', -1) AS UNSIGNED) AS year,
     CASE 
-        WHEN cl.cl_to LIKE '%_in_%' THEN 
-            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(cl.cl_to, '_in_', -1), '_', 1))
+        WHEN f.cl_to LIKE '%_in_%' THEN 
+            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(f.cl_to, '_in_', -1), '_', 1))
         ELSE 'Global'
     END AS country,
-    COUNT(DISTINCT i.img_name) AS uploads,
-    COUNT(DISTINCT a.actor_name) AS uploaders,
-    COUNT(DISTINCT CASE 
-        WHEN il_used.il_to IS NOT NULL THEN i.img_name 
-    END) AS images_used,
-    COUNT(DISTINCT CASE 
-        WHEN u.user_registration >= CONCAT(CAST(SUBSTRING_INDEX(cl.cl_to, '_', -1) AS UNSIGNED), '{start_month:02d}', '01000000')
-            AND u.user_registration <= CONCAT(CAST(SUBSTRING_INDEX(cl.cl_to, '_', -1) AS UNSIGNED), '{end_month:02d}', '31235959')
-        THEN a.actor_name
-    END) AS new_uploaders
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id
-    AND p.page_namespace = 6 
-    AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND (
-    {' OR '.join([f"cl.cl_to LIKE '{pattern}'" for pattern in category_patterns])}
-  )
-  AND cl.cl_to REGEXP '[0-9]{{4}}$'
-  {year_filter}
-  {country_filter}
+    COUNT(DISTINCT f.page_id) AS uploads,
+    COUNT(DISTINCT f.actor_id) AS uploaders,
+    COUNT(DISTINCT CASE WHEN f.is_used THEN f.page_id END) AS images_used,
+    GROUP_CONCAT(DISTINCT f.actor_id) AS actor_ids
+FROM {files}
 GROUP BY 
-    CAST(SUBSTRING_INDEX(cl.cl_to, '_', -1) AS UNSIGNED),
+    CAST(SUBSTRING_INDEX(f.cl_to, '_', -1) AS UNSIGNED),
     CASE 
-        WHEN cl.cl_to LIKE '%_in_%' THEN 
-            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(cl.cl_to, '_in_', -1), '_', 1))
+        WHEN f.cl_to LIKE '%_in_%' THEN 
+            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(f.cl_to, '_in_', -1), '_', 1))
         ELSE 'Global'
     END
 ORDER BY year DESC, uploads DESC;
@@ -198,57 +212,40 @@ ORDER BY year DESC, uploads DESC;
             raise CampaignNotFoundError(f"Campaign not found: {campaign_slug}")
         
         campaign_name = campaign.get('name', '')
-        start_month, end_month = self._get_campaign_dates(campaign_slug)
-        start_date = f"{year}{start_month:02d}01000000"
-        end_date = f"{year}{end_month:02d}31235959"
         
         country_filter = ""
         if country:
             country_filter = f"AND cl.cl_to LIKE '%_in_{country.replace(' ', '_')}%'"
         
+        files = self._files_subquery(f"""
+  AND CAST(SUBSTRING_INDEX(cl.cl_to, '_', -1) AS UNSIGNED) = {year}
+  AND (
+    cl.cl_to LIKE '%Wiki_Loves_{campaign_name.replace(' ', '_')}%'
+    OR cl.cl_to LIKE '%{campaign_slug}%'
+  )
+  {country_filter}""")
+
         query = f"""
 SELECT 
     '{campaign_slug}' AS campaign_slug,
     {year} AS year,
     CASE 
-        WHEN cl.cl_to LIKE '%_in_%' THEN 
-            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(cl.cl_to, '_in_', -1), '_', 1))
+        WHEN f.cl_to LIKE '%_in_%' THEN 
+            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(f.cl_to, '_in_', -1), '_', 1))
         ELSE 'Global'
     END AS country,
+    f.actor_id,
     a.actor_name AS username,
-    COUNT(DISTINCT i.img_name) AS images,
-    COUNT(DISTINCT CASE 
-        WHEN il_used.il_to IS NOT NULL THEN i.img_name 
-    END) AS images_used,
-    u.user_registration AS user_registration,
-    CASE 
-        WHEN u.user_registration >= '{start_date}'
-            AND u.user_registration <= '{end_date}'
-        THEN 1
-        ELSE 0
-    END AS is_new_uploader
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id
-    AND p.page_namespace = 6 
-    AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND CAST(SUBSTRING_INDEX(cl.cl_to, '_', -1) AS UNSIGNED) = {year}
-  AND (
-    cl.cl_to LIKE '%Wiki_Loves_{campaign_name.replace(' ', '_')}%'
-    OR cl.cl_to LIKE '%{campaign_slug}%'
-  )
-  {country_filter}
+    COUNT(DISTINCT f.page_id) AS images,
+    COUNT(DISTINCT CASE WHEN f.is_used THEN f.page_id END) AS images_used
+FROM {files}
+JOIN actor_image a ON a.actor_id = f.actor_id
 GROUP BY 
+    f.actor_id,
     a.actor_name,
-    u.user_registration,
     CASE 
-        WHEN cl.cl_to LIKE '%_in_%' THEN 
-            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(cl.cl_to, '_in_', -1), '_', 1))
+        WHEN f.cl_to LIKE '%_in_%' THEN 
+            TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(f.cl_to, '_in_', -1), '_', 1))
         ELSE 'Global'
     END
 ORDER BY images DESC
@@ -265,38 +262,23 @@ LIMIT 500;
         """
         Quarry-style: exact category match for uploader list.
         Fast (~20 sec) because it filters to one category.
-        Returns: username, images, images_used, user_registration, is_new_uploader.
+        Returns: actor_id, username, images, images_used (registration is
+        resolved locally, see attach_registrations).
         """
         campaign = get_campaign_by_prefix(campaign_slug)
         if not campaign:
             raise CampaignNotFoundError(f"Campaign not found: {campaign_slug}")
-        start_month, end_month = self._get_campaign_dates(campaign_slug)
-        start_date = f"{year}{start_month:02d}01000000"
-        end_date = f"{year}{end_month:02d}31235959"
         cat_escaped = category_name.replace("\\", "\\\\").replace("'", "''")
+        files = self._files_subquery(f"AND cl.cl_to = '{cat_escaped}'")
         return f"""
 SELECT 
+    f.actor_id,
     a.actor_name AS username,
-    COUNT(DISTINCT i.img_name) AS images,
-    COUNT(DISTINCT CASE WHEN il_used.il_to IS NOT NULL THEN i.img_name END) AS images_used,
-    u.user_registration AS user_registration,
-    CASE 
-        WHEN u.user_registration >= '{start_date}' AND u.user_registration <= '{end_date}'
-        THEN 1
-        ELSE 0
-    END AS is_new_uploader
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id
-    AND p.page_namespace = 6
-    AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND cl.cl_to = '{cat_escaped}'
-GROUP BY a.actor_name, u.user_registration
+    COUNT(*) AS images,
+    SUM(f.is_used) AS images_used
+FROM {files}
+JOIN actor_image a ON a.actor_id = f.actor_id
+GROUP BY f.actor_id, a.actor_name
 ORDER BY images DESC
 LIMIT 500
 """
@@ -339,6 +321,66 @@ WHERE cl.cl_type = 'file'
   AND cl.cl_to LIKE '{like_pattern}'
   AND cl.cl_to NOT LIKE '%/%'
 ORDER BY cl.cl_to
+"""
+    
+    def get_category_fingerprint_query(
+        self,
+        campaign_slug: str,
+        year: int
+    ) -> str:
+        """
+        Change-detection probe: member count and newest cl_timestamp per country
+        category of a campaign year. Reads only the categorylinks (cl_to, cl_timestamp)
+        index, so it takes milliseconds where the aggregation takes minutes.
+        Returns: category_name, members, last_added.
+        """
+        like_pattern = f"{self._get_category_prefix(campaign_slug)}{year}_in_%"
+        return f"""
+SELECT
+    cl.cl_to AS category_name,
+    COUNT(*) AS members,
+    MAX(cl.cl_timestamp) AS last_added
+FROM categorylinks cl
+WHERE cl.cl_to LIKE '{self._escape_literal(like_pattern)}'
+  AND cl.cl_to NOT LIKE '%/%'
+GROUP BY cl.cl_to
+"""
+    
+    def get_upload_count_query(
+        self,
+        campaign_slug: str,
+        year: Optional[int] = None,
+        country: Optional[str] = None
+    ) -> str:
+        """
+        Fast path: file count per country category, read from the categorylinks
+        (cl_to, cl_type, ...) index alone. Answers in milliseconds but counts every
+        file member (redirects included) and has no uploader or usage columns.
+        Returns: category_name, year, country, uploads.
+        """
+        prefix = self._get_category_prefix(campaign_slug)
+        if year and country:
+            category = self.get_country_category_name(campaign_slug, year, country)
+            category_filter = f"cl.cl_to = '{self._escape_literal(category)}'"
+        elif year:
+            category_filter = f"cl.cl_to LIKE '{self._escape_literal(f'{prefix}{year}_in_%')}'"
+        else:
+            category_filter = f"cl.cl_to LIKE '{self._escape_literal(f'{prefix}%_in_%')}'"
+            if country:
+                country_pattern = self._escape_literal(country.replace(' ', '_'))
+                category_filter += f"\n  AND cl.cl_to LIKE '%_in_{country_pattern}'"
+        return f"""
+SELECT
+    cl.cl_to AS category_name,
+    CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(cl.cl_to, '_in_', 1), '_', -1) AS UNSIGNED) AS year,
+    REPLACE(SUBSTRING_INDEX(cl.cl_to, '_in_', -1), '_', ' ') AS country,
+    COUNT(*) AS uploads
+FROM categorylinks cl
+WHERE cl.cl_type = 'file'
+  AND {category_filter}
+  AND cl.cl_to NOT LIKE '%/%'
+GROUP BY cl.cl_to
+ORDER BY year DESC, uploads DESC
 """
     
     def get_quarry_category_aggregation_query(
@@ -351,11 +393,9 @@ ORDER BY cl.cl_to
         """
         Quarry-style: exact category match, single aggregation.
         Fast (~14 sec on Quarry) because it filters to one category.
-        Returns: uploads, uploaders, images_used, new_uploaders.
+        Returns: uploads, uploaders, images_used, actor_ids (new_uploaders is
+        resolved locally, see attach_new_uploaders).
         """
-        start_month, end_month = self._get_campaign_dates(campaign_slug)
-        start_date = f"{year}{start_month:02d}01000000"
-        end_date = f"{year}{end_month:02d}31235959"
         # Extract country from category: Images_from_Wiki_Loves_Earth_2025_in_Germany -> Germany
         # Use REPLACE to escape single quotes in category_name for SQL
         cat_escaped = category_name.replace("\\", "\\\\").replace("'", "''")
@@ -364,27 +404,116 @@ SELECT
     '{campaign_slug}' AS campaign_slug,
     '{campaign_name}' AS campaign_name,
     {year} AS year,
-    REPLACE(SUBSTRING_INDEX(cl.cl_to, '_in_', -1), '_', ' ') AS country,
-    COUNT(DISTINCT i.img_name) AS uploads,
-    COUNT(DISTINCT a.actor_name) AS uploaders,
-    COUNT(DISTINCT CASE WHEN il_used.il_to IS NOT NULL THEN i.img_name END) AS images_used,
-    COUNT(DISTINCT CASE 
-        WHEN u.user_registration >= '{start_date}' AND u.user_registration <= '{end_date}'
-        THEN a.actor_name
-    END) AS new_uploaders
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id
-    AND p.page_namespace = 6
-    AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND cl.cl_to = '{cat_escaped}'
+    REPLACE(SUBSTRING_INDEX(MAX(f.cl_to), '_in_', -1), '_', ' ') AS country,
+    COUNT(*) AS uploads,
+    COUNT(DISTINCT f.actor_id) AS uploaders,
+    SUM(f.is_used) AS images_used,
+    GROUP_CONCAT(DISTINCT f.actor_id) AS actor_ids
+FROM {self._files_subquery(f"AND cl.cl_to = '{cat_escaped}'")}
 """
     
+    def get_quarry_category_batch_aggregation_query(
+        self,
+        category_names: List[str],
+        campaign_slug: str,
+        campaign_name: str,
+        year: int
+    ) -> str:
+        """
+        Quarry-style aggregation for several exact categories in one query.
+        Same columns as get_quarry_category_aggregation_query plus category_name,
+        one row per category that has files.
+        """
+        categories_sql = ', '.join(f"'{self._escape_literal(c)}'" for c in category_names)
+        return f"""
+SELECT 
+    f.cl_to AS category_name,
+    '{campaign_slug}' AS campaign_slug,
+    '{campaign_name}' AS campaign_name,
+    {year} AS year,
+    REPLACE(SUBSTRING_INDEX(f.cl_to, '_in_', -1), '_', ' ') AS country,
+    COUNT(*) AS uploads,
+    COUNT(DISTINCT f.actor_id) AS uploaders,
+    SUM(f.is_used) AS images_used,
+    GROUP_CONCAT(DISTINCT f.actor_id) AS actor_ids
+FROM {self._files_subquery(f"AND cl.cl_to IN ({categories_sql})")}
+GROUP BY f.cl_to
+"""
+    
+    def get_quarry_uploader_batch_query(
+        self,
+        category_names: List[str],
+        campaign_slug: str,
+        year: int
+    ) -> str:
+        """
+        Quarry-style uploader list for several exact categories in one query.
+        Same columns as get_quarry_uploader_query plus category_name. Not limited:
+        callers trim each category's list themselves.
+        """
+        campaign = get_campaign_by_prefix(campaign_slug)
+        if not campaign:
+            raise CampaignNotFoundError(f"Campaign not found: {campaign_slug}")
+        categories_sql = ', '.join(f"'{self._escape_literal(c)}'" for c in category_names)
+        return f"""
+SELECT 
+    f.cl_to AS category_name,
+    f.actor_id,
+    a.actor_name AS username,
+    COUNT(*) AS images,
+    SUM(f.is_used) AS images_used
+FROM {self._files_subquery(f"AND cl.cl_to IN ({categories_sql})")}
+JOIN actor_image a ON a.actor_id = f.actor_id
+GROUP BY f.cl_to, f.actor_id, a.actor_name
+ORDER BY f.cl_to, images DESC
+"""
+    
+    def get_country_category_name(self, campaign_slug: str, year: int, country: str) -> str:
+        """
+        Exact country category for a campaign year, e.g.
+        Images_from_Wiki_Loves_Earth_2025_in_Germany.
+        
+        Raises:
+            CampaignNotFoundError: If campaign not found.
+        """
+        campaign = get_campaign_by_prefix(campaign_slug)
+        if not campaign:
+            raise CampaignNotFoundError(f"Campaign not found: {campaign_slug}")
+        campaign_name = campaign.get('name', campaign_slug).replace(' ', '_')
+        return f"Images_from_{campaign_name}_{year}_in_{country.replace(' ', '_')}"
+    
+    @staticmethod
+    def _files_subquery(where_sql: str) -> str:
+        """
+        Derived table `f` with one row per (category, file) matching where_sql
+        (extra conditions on cl, p and i): cl_to, page_id, actor_id and is_used.
+
+        is_used is an EXISTS semi-join on imagelinks.il_to = file title, so a
+        file used on many pages still yields one row. Aggregations join actors
+        and users to these rows and count integer ids (page_id, actor_id).
+        """
+        return f"""(
+    SELECT
+        cl.cl_to,
+        p.page_id,
+        i.img_actor AS actor_id,
+        EXISTS (
+            SELECT 1 FROM imagelinks il WHERE il.il_to = p.page_title
+        ) AS is_used
+    FROM categorylinks cl
+    JOIN page p ON cl.cl_from = p.page_id
+        AND p.page_namespace = 6
+        AND p.page_is_redirect = 0
+    JOIN image i ON i.img_name = p.page_title
+    WHERE cl.cl_type = 'file'
+      {where_sql}
+) f"""
+    
+    @staticmethod
+    def _escape_literal(value: str) -> str:
+        """Escape a value for use inside a single-quoted SQL string literal."""
+        return value.replace("\\", "\\\\").replace("'", "''")
+    
     def _get_campaign_dates(self, campaign_slug: str) -> tuple:
         """
         Get start and end months for a campaign.
@@ -407,6 +536,67 @@ WHERE cl.cl_type = 'file'
         
         return campaign_dates.get(campaign_slug, (3, 3))  # Default to March
     
+    def _registration_window(self, campaign_slug: str, year: int) -> tuple:
+        """Registration timestamps that count as "new uploader" for a campaign year."""
+        start_month, end_month = self._get_campaign_dates(campaign_slug)
+        return f"{year}{start_month:02d}01000000", f"{year}{end_month:02d}31235959"
+    
+    @staticmethod
+    def _parse_actor_ids(value: Any) -> List[int]:
+        """Actor ids from a GROUP_CONCAT column."""
+        if not value:
+            return []
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode('ascii', 'ignore')
+        return [int(a) for a in str(value).split(',') if a.strip().isdigit()]
+    
+    def attach_new_uploaders(
+        self,
+        rows: List[Dict[str, Any]],
+        campaign_slug: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Replace the actor_ids column of aggregation rows by new_uploaders.
+        
+        Registrations come from the local actor registry; the replica is only
+        asked for actors not seen before.
+        
+        Returns:
+            The same rows, modified in place.
+        """
+        per_row = [self._parse_actor_ids(r.pop('actor_ids', None)) for r in rows]
+        all_ids = {a for ids in per_row for a in ids}
+        registrations = get_actor_registry().ensure(all_ids) if all_ids else {}
+        for r, ids in zip(rows, per_row):
+            start_date, end_date = self._registration_window(campaign_slug, int(r.get('year') or 0))
+            r['new_uploaders'] = sum(
+                1 for a in ids if is_new_registration(registrations.get(a, ''), start_date, end_date)
+            )
+        return rows
+    
+    def attach_registrations(
+        self,
+        rows: List[Dict[str, Any]],
+        campaign_slug: str,
+        year: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Add user_registration and is_new_uploader to uploader rows (by actor_id)
+        from the local actor registry.
+        
+        Returns:
+            The same rows, modified in place.
+        """
+        registrations = get_actor_registry().ensure(
+            int(r['actor_id']) for r in rows if r.get('actor_id') is not None
+        ) if rows else {}
+        start_date, end_date = self._registration_window(campaign_slug, year)
+        for r in rows:
+            registration = registrations.get(int(r.get('actor_id') or 0), '')
+            r['user_registration'] = registration or None
+            r['is_new_uploader'] = 1 if is_new_registration(registration, start_date, end_date) else 0
+        return rows
+    
     def execute_unified_query(self, use_analytics: bool = True) -> List[Dict[str, Any]]:
         """
         Execute the unified query for all campaigns.
@@ -419,14 +609,15 @@ WHERE cl.cl_type = 'file'
         """
         query = self.get_unified_query()
         db = get_db()
-        return db.execute_query(query, use_analytics=use_analytics)
+        return _decode_columns(db.execute_query(query, use_analytics=use_analytics), ('campaign_slug', 'campaign_name', 'country'))
     
     def execute_campaign_query(
         self,
         campaign_slug: str,
         year: Optional[int] = None,
         country: Optional[str] = None,
-        use_analytics: bool = True
+        use_analytics: bool = True,
+        timeout: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Execute a campaign-specific query.
@@ -436,19 +627,23 @@ WHERE cl.cl_type = 'file'
             year: Optional year filter.
             country: Optional country filter.
             use_analytics: Use analytics database.
+            timeout: Optional query timeout in seconds.
 
         Returns:
             List of result dictionaries.
         """
         query = self.get_campaign_query(campaign_slug, year, country)
         db = get_db()
-        return db.execute_query(query, use_analytics=use_analytics)
+        rows = db.execute_query(query, use_analytics=use_analytics, timeout=timeout, template='campaign')
+        return self.attach_new_uploaders(_decode_columns(rows, ('country',)), campaign_slug)
     
     def execute_campaign_quarry_style(
         self,
         campaign_slug: str,
         use_analytics: bool = True,
-        years: Optional[List[int]] = None
+        years: Optional[List[int]] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        checkpoint: Optional[Any] = None
     ) -> List[Dict[str, Any]]:
         """
         Quarry-style: discover categories per year, then run exact-match aggregation per category.
@@ -458,6 +653,17 @@ WHERE cl.cl_type = 'file'
             campaign_slug: Campaign slug.
             use_analytics: Use analytics database.
             years: Optional list of years. If None, uses recent years (e.g. 2020-2025).
+            on_progress: Called after each year's discovery and each category with
+                year, year_index, years_total, category, category_index,
+                category_total and rows (collected so far).
+            checkpoint: Optional store with get(key) / put(key, data) (see
+                job_store.JobCheckpoints). Discovered categories and each
+                category's rows are saved there, and work already saved is
+                not queried again, so a stopped fetch resumes where it stopped.
+        
+        Raises:
+            QueryCancelledError: If the query_scope token is cancelled; checked at
+                every category boundary, and the running query is killed.
         
         Returns:
             List of rows compatible with process_campaign_data (campaign_slug, year, country, uploads, uploaders, images_used, new_uploaders).
@@ -474,25 +680,49 @@ WHERE cl.cl_type = 'file'
             years = list(range(current_year, current_year - 6, -1))  # 2025 down to 2020
         
         all_rows = []
-        for year in years:
-            try:
-                discovery_query = self.get_category_discovery_query(campaign_slug, year)
-                discovery_results = db.execute_query(discovery_query, use_analytics=use_analytics)
-            except Exception:
-                continue
-            for row in discovery_results:
-                cat_name = row.get('category_name')
-                if not cat_name:
-                    continue
+        for year_index, year in enumerate(years):
+            _raise_if_cancelled()
+            categories_key = f'{campaign_slug}:{year}:categories'
+            saved = checkpoint.get(categories_key) if checkpoint else None
+            if saved is not None:
+                categories = [decode_value(c) for c in saved]
+            else:
                 try:
-                    agg_query = self.get_quarry_category_aggregation_query(
-                        cat_name, campaign_slug, campaign_name, year
-                    )
-                    agg_results = db.execute_query(agg_query, use_analytics=use_analytics)
-                    if agg_results:
-                        all_rows.extend(agg_results)
+                    discovery_query = self.get_category_discovery_query(campaign_slug, year)
+                    discovery_results = db.execute_query(discovery_query, use_analytics=use_analytics, template='category_discovery')
+                except QueryCancelledError:
+                    raise
                 except Exception:
                     continue
+                categories = [_text(row.get('category_name')) for row in discovery_results if row.get('category_name')]
+                if checkpoint:
+                    checkpoint.put(categories_key, [encode_value(c) for c in categories])
+            progress = {'year': year, 'year_index': year_index, 'years_total': len(years),
+                        'category': None, 'category_index': 0, 'category_total': len(categories)}
+            if on_progress:
+                on_progress(dict(progress, rows=len(all_rows)))
+            for category_index, cat_name in enumerate(categories):
+                _raise_if_cancelled()
+                rows_key = f'{campaign_slug}:{year}:{category_index}'
+                saved = checkpoint.get(rows_key) if checkpoint else None
+                if saved is not None:
+                    all_rows.extend({k: decode_value(v) for k, v in row.items()} for row in saved)
+                else:
+                    try:
+                        agg_query = self.get_quarry_category_aggregation_query(
+                            cat_name, campaign_slug, campaign_name, year
+                        )
+                        agg_results = db.execute_query(agg_query, use_analytics=use_analytics, template='category_aggregation')
+                        rows = self.attach_new_uploaders(_decode_columns(agg_results, ('country',)), campaign_slug) if agg_results else []
+                        all_rows.extend(rows)
+                        if checkpoint:
+                            checkpoint.put(rows_key, [{k: encode_value(v) for k, v in row.items()} for row in rows])
+                    except QueryCancelledError:
+                        raise
+                    except Exception:
+                        pass
+                if on_progress:
+                    on_progress(dict(progress, category=cat_name, category_index=category_index + 1, rows=len(all_rows)))
         return all_rows
     
     def execute_uploader_query(
@@ -500,7 +730,8 @@ WHERE cl.cl_type = 'file'
         campaign_slug: str,
         year: int,
         country: Optional[str] = None,
-        use_analytics: bool = False
+        use_analytics: bool = False,
+        timeout: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Execute an uploader statistics query.
@@ -510,13 +741,15 @@ WHERE cl.cl_type = 'file'
             year: Campaign year.
             country: Optional country filter.
             use_analytics: Use analytics database.
+            timeout: Optional query timeout in seconds.
         
         Returns:
             List of result dictionaries.
         """
         query = self.get_uploader_query(campaign_slug, year, country)
         db = get_db()
-        return db.execute_query(query, use_analytics=use_analytics)
+        rows = db.execute_query(query, use_analytics=use_analytics, timeout=timeout, template='uploaders')
+        return self.attach_registrations(_decode_columns(rows, ('username',)), campaign_slug, year)
     
     def execute_uploader_quarry_style(
         self,
@@ -536,17 +769,171 @@ WHERE cl.cl_type = 'file'
             use_analytics: Use analytics DB (default False = web replica, faster for short queries).
         
         Returns:
-            List of dicts with username, images, images_used, user_registration, is_new_uploader.
+            List of dicts with actor_id, username, images, images_used, user_registration, is_new_uploader.
+        """
+        category_name = self.get_country_category_name(campaign_slug, year, country)
+        query = self.get_quarry_uploader_query(category_name, campaign_slug, year)
+        db = get_db()
+        rows = db.execute_query(query, use_analytics=use_analytics, template='uploaders_category')
+        return self.attach_registrations(_decode_columns(rows, ('username',)), campaign_slug, year)
+    
+    def execute_country_batch_quarry_style(
+        self,
+        campaign_slug: str,
+        year: int,
+        countries: List[str],
+        use_analytics: bool = True,
+        timeout: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregate stats for several countries of one campaign year in a single query.
+        
+        Args:
+            campaign_slug: Campaign slug.
+            year: Campaign year.
+            countries: Country display names.
+            use_analytics: Use analytics database.
+            timeout: Optional query timeout in seconds.
+        
+        Returns:
+            Dict mapping each requested country that has files to its aggregation row.
+        """
+        by_category = {
+            self.get_country_category_name(campaign_slug, year, c): c for c in countries
+        }
+        rows = self.execute_category_batch_quarry_style(
+            campaign_slug, year, list(by_category), use_analytics=use_analytics, timeout=timeout
+        )
+        return {by_category[cat]: row for cat, row in rows.items()}
+    
+    def execute_category_batch_quarry_style(
+        self,
+        campaign_slug: str,
+        year: int,
+        category_names: List[str],
+        use_analytics: bool = True,
+        timeout: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Aggregate stats for several exact categories of one campaign year in a single query.
+        
+        Args:
+            campaign_slug: Campaign slug.
+            year: Campaign year.
+            category_names: Category names (e.g. Images_from_Wiki_Loves_Earth_2025_in_Germany).
+            use_analytics: Use analytics database.
+            timeout: Optional query timeout in seconds.
+        
+        Returns:
+            Dict mapping each requested category that has files to its aggregation row
+            (text columns decoded to str).
         """
         campaign = get_campaign_by_prefix(campaign_slug)
         if not campaign:
             raise CampaignNotFoundError(f"Campaign not found: {campaign_slug}")
-        campaign_name = campaign.get('name', campaign_slug).replace(' ', '_')
-        country_underscores = country.replace(' ', '_')
-        category_name = f"Images_from_{campaign_name}_{year}_in_{country_underscores}"
-        query = self.get_quarry_uploader_query(category_name, campaign_slug, year)
+        if not category_names:
+            return {}
+        query = self.get_quarry_category_batch_aggregation_query(
+            category_names, campaign_slug, campaign.get('name', campaign_slug), year
+        )
+        db = get_db()
+        rows = db.execute_query(query, use_analytics=use_analytics, timeout=timeout, template='category_batch')
+        rows = self.attach_new_uploaders(
+            _decode_columns(rows, ('category_name', 'campaign_slug', 'campaign_name', 'country')), campaign_slug
+        )
+        wanted = set(category_names)
+        return {r['category_name']: r for r in rows if r.get('category_name') in wanted}
+    
+    def execute_category_fingerprints(
+        self,
+        campaign_slug: str,
+        year: int,
+        use_analytics: bool = False
+    ) -> Dict[str, List[Any]]:
+        """
+        Run the change-detection probe for a campaign year.
+        
+        Returns:
+            Dict mapping category name -> [members, last_added] (last_added as a string).
+        """
+        query = self.get_category_fingerprint_query(campaign_slug, year)
+        db = get_db()
+        fingerprints = {}
+        for r in db.execute_query(query, use_analytics=use_analytics, template='category_fingerprints'):
+            last_added = _text(r.get('last_added'))
+            fingerprints[_text(r.get('category_name'))] = [int(r.get('members', 0) or 0), str(last_added or '')]
+        return fingerprints
+    
+    def execute_upload_counts(
+        self,
+        campaign_slug: str,
+        year: Optional[int] = None,
+        country: Optional[str] = None,
+        use_analytics: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Run the index-only upload count query (see get_upload_count_query).
+        
+        Returns:
+            Rows with campaign_slug, campaign_name, year, country, category_name and
+            uploads; uploaders, images_used and new_uploaders are None (not known yet).
+        """
+        campaign = get_campaign_by_prefix(campaign_slug)
+        if not campaign:
+            raise CampaignNotFoundError(f"Campaign not found: {campaign_slug}")
+        query = self.get_upload_count_query(campaign_slug, year, country)
+        db = get_db()
+        rows = []
+        for r in db.execute_query(query, use_analytics=use_analytics, template='upload_counts'):
+            rows.append({
+                'campaign_slug': campaign_slug,
+                'campaign_name': campaign.get('name', campaign_slug),
+                'year': int(r.get('year', 0) or 0),
+                'country': _text(r.get('country')),
+                'category_name': _text(r.get('category_name')),
+                'uploads': int(r.get('uploads', 0) or 0),
+                'uploaders': None,
+                'images_used': None,
+                'new_uploaders': None,
+            })
+        return rows
+    
+    def execute_uploader_batch_quarry_style(
+        self,
+        campaign_slug: str,
+        year: int,
+        countries: List[str],
+        use_analytics: bool = False,
+        timeout: Optional[int] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Uploader lists for several countries of one campaign year in a single query.
+        
+        Args:
+            campaign_slug: Campaign slug.
+            year: Campaign year.
+            countries: Country display names.
+            use_analytics: Use analytics DB (default False = web replica).
+            timeout: Optional query timeout in seconds.
+        
+        Returns:
+            Dict mapping each requested country that has files to its uploader rows
+            (username, images, images_used, user_registration, is_new_uploader;
+            text columns decoded to str), ordered by images descending.
+        """
+        by_category = {
+            self.get_country_category_name(campaign_slug, year, c): c for c in countries
+        }
+        query = self.get_quarry_uploader_batch_query(list(by_category), campaign_slug, year)
         db = get_db()
-        return db.execute_query(query, use_analytics=use_analytics)
+        rows = db.execute_query(query, use_analytics=use_analytics, timeout=timeout, template='uploaders_batch')
+        rows = self.attach_registrations(_decode_columns(rows, ('category_name', 'username')), campaign_slug, year)
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rows:
+            country = by_category.get(r.get('category_name'))
+            if country is not None:
+                result.setdefault(country, []).append(r)
+        return result
 
 
 # Global query manager instance
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Query plan regression check for the SQL templates in queries.py.
+
+Renders every template with representative parameters, runs EXPLAIN and
+compares the access path of each table (index search or full scan, index
+used), the join order and the estimated rows with the snapshot in
+query_plans.json. Against the stand-in database each query is also timed
+and checked against its budget. Exits 1 when a plan degrades or a budget is
+exceeded, so it can run before deploying a queries.py change:
+
+    python3 query_plans.py                 # stand-in (generated if missing), compare with snapshot
+    python3 query_plans.py --update        # accept the current plans as the new snapshot
+    python3 query_plans.py --replica       # MariaDB EXPLAIN on the web replica (on Toolforge)
+
+The stand-in is generated at scale 'small' with a fixed seed so its
+statistics (and so its plans) are the same on every machine.
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import Config
+from queries import QueryManager
+
+SNAPSHOT_FILE = Path(__file__).parent / 'query_plans.json'
+STANDIN_SCALE = 'small'
+STANDIN_SEED = 0
+STANDIN_CAMPAIGNS = ('earth',)
+STANDIN_YEARS = (2024, 2025)
+
+# Tables where a full scan is a regression (the derived table f and GROUP BY temp b-trees are fine)
+BASE_TABLES = {'categorylinks', 'page', 'image', 'imagelinks', 'actor', 'actor_image', 'user'}
+# Estimated rows may grow this much before the plan counts as degraded
+ROWS_GROWTH_LIMIT = 10.0
+
+# Template -> SQL rendered with representative parameters
+TEMPLATES: Dict[str, Callable[[QueryManager], str]] = {
+    'campaign': lambda qm: qm.get_campaign_query('earth', 2025),
+    'campaign_country': lambda qm: qm.get_campaign_query('earth', 2025, 'Germany'),
+    'uploaders': lambda qm: qm.get_uploader_query('earth', 2025, 'Germany'),
+    'uploaders_category': lambda qm: qm.get_quarry_uploader_query(
+        'Images_from_Wiki_Loves_Earth_2025_in_Germany', 'earth', 2025),
+    'uploaders_batch': lambda qm: qm.get_quarry_uploader_batch_query(
+        ['Images_from_Wiki_Loves_Earth_2025_in_Germany', 'Images_from_Wiki_Loves_Earth_2025_in_Ukraine'],
+        'earth', 2025),
+    'category_discovery': lambda qm: qm.get_category_discovery_query('earth', 2025),
+    'category_aggregation': lambda qm: qm.get_quarry_category_aggregation_query(
+        'Images_from_Wiki_Loves_Earth_2025_in_Germany', 'earth', 'Wiki Loves Earth', 2025),
+    'category_batch': lambda qm: qm.get_quarry_category_batch_aggregation_query(
+        ['Images_from_Wiki_Loves_Earth_2025_in_Germany', 'Images_from_Wiki_Loves_Earth_2025_in_Ukraine'],
+        'earth', 'Wiki Loves Earth', 2025),
+    'category_fingerprints': lambda qm: qm.get_category_fingerprint_query('earth', 2025),
+    'upload_counts': lambda qm: qm.get_upload_count_query('earth', 2025),
+}
+
+# Milliseconds each template may take on the stand-in (scale 'small')
+TIME_BUDGET_MS = {
+    'campaign': 2000,
+    'campaign_country': 2000,
+    'uploaders': 2000,
+    'uploaders_category': 500,
+    'uploaders_batch': 500,
+    'category_discovery': 500,
+    'category_aggregation': 500,
+    'category_batch': 500,
+    'category_fingerprints': 200,
+    'upload_counts': 200,
+}
+
+_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_SQLITE_STEP = re.compile(
+    r'^(?P<access>SCAN|SEARCH)\s+(?P<alias>\w+)'
+    r'(?:\s+USING\s+(?:COVERING\s+)?(?:INDEX\s+(?P<index>\w+)|(?P<pk>INTEGER PRIMARY KEY|PRIMARY KEY)))?'
+    r'(?:\s+\((?P<terms>[^)]*)\))?'
+)
+_SQL_KEYWORDS = {'on', 'where', 'join', 'left', 'inner', 'group', 'order', 'limit', 'and'}
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """alias -> table name for the FROM/JOIN clauses of a query."""
+    aliases = {}
+    for table, alias in _ALIAS.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+# --- Stand-in (SQLite EXPLAIN QUERY PLAN) ------------------------------------------
+
+def _standin_connection(path: Optional[Path]):
+    from standin_db import generate, open_sqlite
+    if path is None:
+        path = Config.DATA_DIR / f'standin_plans_{STANDIN_SCALE}_{STANDIN_SEED}.sqlite'
+        if not path.exists():
+            print(f'Generating stand-in {path} ...')
+            generate(path, scale=STANDIN_SCALE, seed=STANDIN_SEED,
+                     campaigns=STANDIN_CAMPAIGNS, years=STANDIN_YEARS)
+    return open_sqlite(path)
+
+
+def _index_stats(conn) -> Dict[str, Dict[str, List[int]]]:
+    """sqlite_stat1 as table -> index -> [rows, rows per 1st column value, per 1st+2nd, ...]."""
+    stats: Dict[str, Dict[str, List[int]]] = {}
+    for table, index, stat in conn.execute('SELECT tbl, idx, stat FROM sqlite_stat1'):
+        numbers = [int(n) for n in stat.split() if n.isdigit()]
+        stats.setdefault(table, {})[index or table] = numbers
+    return stats
+
+
+def _estimate_rows(stats, table: str, index: Optional[str], terms: str, access: str) -> Optional[int]:
+    table_stats = stats.get(table, {})
+    if not table_stats:
+        return None
+    total = next(iter(table_stats.values()))[0]
+    if access == 'SCAN':
+        return total
+    if index is None:
+        return 1  # primary key / rowid lookup
+    numbers = table_stats.get(index)
+    if not numbers:
+        return None
+    equalities = len(re.findall(r'\w+=\?', terms or ''))
+    if equalities:
+        return numbers[min(equalities, len(numbers) - 1)]
+    # Range only: SQLite itself assumes a quarter of the rows
+    return max(1, total // 4)
+
+
+def explain_standin(conn, sql: str) -> List[Dict[str, Any]]:
+    """Plan steps of one query on the stand-in, in execution (join) order."""
+    from standin_db import translate_query
+    aliases = table_aliases(sql)
+    stats = _index_stats(conn)
+    steps = []
+    for _id, _parent, _unused, detail in conn.execute('EXPLAIN QUERY PLAN ' + translate_query(sql)):
+        match = _SQLITE_STEP.match(detail)
+        if not match:
+            continue
+        table = aliases.get(match['alias'], match['alias'])
+        index = match['index'] or ('PRIMARY' if match['pk'] else None)
+        steps.append({
+            'table': table,
+            'access': match['access'],
+            'index': index,
+            'est_rows': _estimate_rows(stats, table, match['index'], match['terms'], match['access']),
+            'detail': detail,
+        })
+    return steps
+
+
+def time_standin(conn, sql: str, runs: int = 3) -> float:
+    """Best of `runs` executions, in milliseconds."""
+    from standin_db import translate_query
+    translated = translate_query(sql)
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(translated).fetchall()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 1)
+
+
+# --- Replica (MariaDB EXPLAIN) -----------------------------------------------------
+
+def explain_replica(sql: str) -> List[Dict[str, Any]]:
+    """Plan steps of one query on the web replica (MariaDB EXPLAIN rows)."""
+    from database import get_db
+    aliases = table_aliases(sql)
+    steps = []
+    for row in get_db().execute_query('EXPLAIN ' + sql, use_analytics=False):
+        alias = row.get('table') or ''
+        if isinstance(alias, (bytes, bytearray)):
+            alias = alias.decode('utf-8')
+        table = aliases.get(alias, alias)
+        access = 'SCAN' if row.get('type') in ('ALL', 'index') else 'SEARCH'
+        steps.append({
+            'table': table,
+            'access': access,
+            'index': row.get('key'),
+            'est_rows': int(row['rows']) if row.get('rows') is not None else None,
+            'detail': f"{row.get('select_type')} {alias} type={row.get('type')} key={row.get('key')} "
+                      f"ref={row.get('ref')} extra={row.get('Extra')}",
+        })
+    return steps
+
+
+# --- Comparison --------------------------------------------------------------------
+
+def compare_plans(name: str, old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[str]:
+    """Regressions of a template's plan against its snapshot (empty list if none)."""
+    problems = []
+    old_order = [s['table'] for s in old if s['table'] in BASE_TABLES]
+    new_order = [s['table'] for s in new if s['table'] in BASE_TABLES]
+    if old_order != new_order:
+        problems.append(f"{name}: join order {' > '.join(old_order)} became {' > '.join(new_order)}")
+    old_by_table = {}
+    for s in old:
+        old_by_table.setdefault(s['table'], []).append(s)
+    for s in new:
+        if s['table'] not in BASE_TABLES or not old_by_table.get(s['table']):
+            continue
+        before = old_by_table[s['table']].pop(0)
+        if before['access'] == 'SEARCH' and s['access'] == 'SCAN':
+            problems.append(f"{name}: {s['table']} is now a full scan (was {before['detail']})")
+        elif before['index'] != s['index']:
+            problems.append(f"{name}: {s['table']} uses index {s['index']} instead of {before['index']}")
+        if before.get('est_rows') and s.get('est_rows') and s['est_rows'] > before['est_rows'] * ROWS_GROWTH_LIMIT:
+            problems.append(
+                f"{name}: {s['table']} estimated rows {before['est_rows']} -> {s['est_rows']}"
+            )
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Check query plans of the queries.py templates against a snapshot.')
+    parser.add_argument('--replica', action='store_true', help='EXPLAIN on the web replica instead of the stand-in')
+    parser.add_argument('--db', default=None, help='Stand-in database to use (default: generated, fixed seed)')
+    parser.add_argument('--update', action='store_true', help='Write the current plans to the snapshot')
+    parser.add_argument('--only', nargs='+', default=None, help='Template names to check')
+    args = parser.parse_args()
+
+    backend = 'replica' if args.replica else 'standin'
+    snapshot = {}
+    if SNAPSHOT_FILE.exists():
+        with open(SNAPSHOT_FILE, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    baseline = snapshot.get(backend, {})
+
+    qm = QueryManager()
+    conn = None if args.replica else _standin_connection(Path(args.db) if args.db else None)
+    current: Dict[str, Any] = {}
+    problems: List[str] = []
+    for name, render in TEMPLATES.items():
+        if args.only and name not in args.only:
+            continue
+        sql = render(qm)
+        # Timings are checked against budgets but not snapshotted (they depend on the machine)
+        entry: Dict[str, Any] = {'plan': explain_replica(sql) if args.replica else explain_standin(conn, sql)}
+        ms = None
+        if conn is not None:
+            ms = time_standin(conn, sql)
+            budget = TIME_BUDGET_MS.get(name)
+            if budget and ms > budget:
+                problems.append(f"{name}: {ms} ms exceeds its budget of {budget} ms")
+        current[name] = entry
+        access = ', '.join(
+            f"{s['table']}:{s['access'].lower()}" + (f"({s['index']})" if s['index'] else '')
+            for s in entry['plan'] if s['table'] in BASE_TABLES
+        )
+        print(f"{name:<22} {'' if ms is None else ms:>8} ms  {access}")
+        if name in baseline and not args.update:
+            problems.extend(compare_plans(name, baseline[name]['plan'], entry['plan']))
+
+    if args.update:
+        snapshot[backend] = {**baseline, **current}
+        with open(SNAPSHOT_FILE, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Updated {SNAPSHOT_FILE.name} ({backend})')
+        return 0
+    missing = [n for n in current if n not in baseline]
+    if missing:
+        print(f"No snapshot for {', '.join(missing)} (run with --update)")
+    if problems:
+        print('\nPlan regressions:')
+        print('\n'.join(f'  {p}' for p in problems))
+        return 1
+    print('\nPlans match the snapshot.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Deadlines and server-side cancellation for replica queries.
+
+A client-side read timeout only drops the socket: the replica keeps running
+the statement (for up to MAX_QUERY_TIME) and the tool's user keeps paying
+for one of its ten connections. Every query started by
+DatabaseConnection.execute_query therefore registers its connection id and
+deadline here. A watchdog thread issues KILL QUERY from a side connection
+when the deadline passes or the owning job's CancelToken is cancelled, and
+execute_query turns the interrupted statement into QueryTimeoutError or
+QueryCancelledError.
+
+Deadlines and tokens are set per thread with query_scope, so callers several
+layers above execute_query (prebuild workers, request handlers) do not have
+to pass them through every QueryManager method.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from logger import get_logger
+
+DEADLINE = 'deadline'
+CANCELLED = 'cancelled'
+
+# kill_query(use_analytics, connection_id)
+KillFn = Callable[[bool, int], None]
+
+
+class CancelToken:
+    """Set by the owner of a job to stop the queries running on its behalf."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = CANCELLED) -> None:
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+_scope = threading.local()
+
+
+@contextmanager
+def query_scope(deadline: Optional[float] = None, token: Optional[CancelToken] = None):
+    """
+    Apply a deadline (absolute time.time() value) and/or cancel token to every
+    query run by this thread inside the block. Nested scopes keep the earliest
+    deadline; an inner token replaces the outer one.
+    """
+    previous = (current_deadline(), current_token())
+    deadlines = [d for d in (previous[0], deadline) if d is not None]
+    _scope.deadline = min(deadlines) if deadlines else None
+    _scope.token = token or previous[1]
+    try:
+        yield
+    finally:
+        _scope.deadline, _scope.token = previous
+
+
+def current_deadline() -> Optional[float]:
+    """Deadline of the enclosing query_scope in this thread, if any."""
+    return getattr(_scope, 'deadline', None)
+
+
+def current_token() -> Optional[CancelToken]:
+    """Cancel token of the enclosing query_scope in this thread, if any."""
+    return getattr(_scope, 'token', None)
+
+
+class QueryWatchdog:
+    """Kills registered queries whose deadline passed or whose token was cancelled."""
+
+    def __init__(self, kill_query: KillFn, interval_sec: float):
+        self.kill_query = kill_query
+        self.interval_sec = interval_sec
+        self._lock = threading.Lock()
+        # handle -> {'connection_id', 'use_analytics', 'deadline', 'token', 'killed'}
+        self._active: Dict[int, Dict[str, Any]] = {}
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._kills = {DEADLINE: 0, CANCELLED: 0}
+
+    def register(
+        self,
+        connection_id: int,
+        use_analytics: bool,
+        deadline: float,
+        token: Optional[CancelToken] = None
+    ) -> int:
+        """Watch one running statement. Returns a handle for unregister."""
+        handle = next(self._seq)
+        with self._lock:
+            self._active[handle] = {
+                'connection_id': connection_id,
+                'use_analytics': use_analytics,
+                'deadline': deadline,
+                'token': token,
+                'killed': None,
+            }
+            self._ensure_thread()
+        return handle
+
+    def unregister(self, handle: int) -> Optional[str]:
+        """
+        Stop watching a statement.
+
+        Returns:
+            DEADLINE or CANCELLED if the watchdog killed it, else None.
+        """
+        with self._lock:
+            entry = self._active.pop(handle, None)
+        return entry['killed'] if entry else None
+
+    def stats(self) -> Dict[str, int]:
+        """Watched statements and kills so far, for status endpoints."""
+        with self._lock:
+            return {
+                'active': len(self._active),
+                'killed_deadline': self._kills[DEADLINE],
+                'killed_cancelled': self._kills[CANCELLED],
+            }
+
+    def check(self) -> None:
+        """Kill every due statement once (called by the watchdog thread)."""
+        now = time.time()
+        due = []
+        with self._lock:
+            for entry in self._active.values():
+                if entry['killed']:
+                    continue
+                token = entry['token']
+                if token is not None and token.cancelled:
+                    entry['killed'] = CANCELLED
+                elif now >= entry['deadline']:
+                    entry['killed'] = DEADLINE
+                else:
+                    continue
+                self._kills[entry['killed']] += 1
+                due.append(dict(entry))
+        for entry in due:
+            try:
+                self.kill_query(entry['use_analytics'], entry['connection_id'])
+                get_logger().warning(
+                    f"Killed query on connection {entry['connection_id']} ({entry['killed']})"
+                )
+            except Exception as e:
+                get_logger().error(f"KILL QUERY {entry['connection_id']} failed: {e}")
+
+    def _ensure_thread(self) -> None:
+        # Started lazily, like the refresh workers: threads do not survive uWSGI's fork
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='query-watchdog', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval_sec)
+            self.check()
+
+
+# Global watchdog instance
+_watchdog: Optional[QueryWatchdog] = None
+
+
+def get_query_watchdog() -> QueryWatchdog:
+    """Get global query watchdog instance."""
+    global _watchdog
+    if _watchdog is None:
+        from database import get_db
+        _watchdog = QueryWatchdog(get_db().kill_query, interval_sec=Config.DB_WATCHDOG_INTERVAL_SEC)
+    return _watchdog
@@ -0,0 +1,144 @@
+"""
+Latency-based routing between the web and analytics replicas.
+
+Call sites pass a template name with each query (e.g. 'category_batch').
+For every (template, host) pair the router keeps an exponentially weighted
+average of the observed run time, where a timeout counts as having used the
+whole limit the query ran with. A routed query goes to the host with the best expected
+completion time among those expected to finish within their limit. The
+caller's use_analytics choice wins while there is no history for it, and
+averages not updated for max_age_sec are forgotten so a host that timed out
+is tried again later.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from config import Config
+
+WEB = 'web'
+ANALYTICS = 'analytics'
+
+
+def host_label(use_analytics: bool) -> str:
+    return ANALYTICS if use_analytics else WEB
+
+
+def host_limit(use_analytics: bool, timeout: Optional[float] = None) -> float:
+    """Longest a query may run on a host (its maximum, or the caller's timeout if lower)."""
+    limit = Config.MAX_QUERY_TIME if use_analytics else Config.MAX_WEB_QUERY_TIME
+    return min(timeout, limit) if timeout else limit
+
+
+class ReplicaRouter:
+    """Per-template latency statistics and host choice."""
+
+    def __init__(self, alpha: float, headroom: float, max_age_sec: float):
+        self.alpha = alpha
+        self.headroom = headroom
+        self.max_age_sec = max_age_sec
+        self._lock = threading.Lock()
+        # (template, host) -> {'avg_sec', 'samples', 'timeouts', 'updated'}
+        self._stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def expected_seconds(self, template: str, use_analytics: bool) -> Optional[float]:
+        """Average run time of template on a host, or None without recent history."""
+        with self._lock:
+            entry = self._stats.get((template, host_label(use_analytics)))
+            if not entry or time.time() - entry['updated'] > self.max_age_sec:
+                return None
+            return entry['avg_sec']
+
+    def choose(self, template: str, use_analytics: bool, timeout: Optional[float] = None) -> bool:
+        """
+        Pick the host for one query.
+
+        Args:
+            template: Query template name.
+            use_analytics: The caller's preferred host.
+            timeout: Optional caller timeout in seconds.
+
+        Returns:
+            True for the analytics replica, False for the web replica.
+        """
+        preferred, other = use_analytics, not use_analytics
+        estimates = {h: self.expected_seconds(template, h) for h in (preferred, other)}
+        eligible = [
+            h for h in (preferred, other)
+            if estimates[h] is None or estimates[h] < host_limit(h, timeout) * self.headroom
+        ]
+        if preferred in eligible and estimates[preferred] is None:
+            return preferred
+        known = [h for h in eligible if estimates[h] is not None]
+        if known:
+            return min(known, key=lambda h: estimates[h])
+        if eligible:
+            return eligible[0]
+        # Neither host is expected to make it: use the one with the higher limit
+        return max((preferred, other), key=lambda h: host_limit(h, timeout))
+
+    def record(
+        self,
+        template: str,
+        use_analytics: bool,
+        seconds: float,
+        timed_out: bool = False,
+        timeout: Optional[float] = None
+    ) -> None:
+        """
+        Add one observation.
+
+        Args:
+            seconds: Run time of the query.
+            timed_out: The query hit its limit; it counts as having run for that limit.
+            timeout: The query's effective limit (caller timeout tightened by its
+                query_scope deadline), so a timeout under a short limit does not
+                count as the host's whole maximum.
+        """
+        if timed_out:
+            seconds = timeout if timeout is not None else host_limit(use_analytics)
+        with self._lock:
+            entry = self._stats.get((template, host_label(use_analytics)))
+            now = time.time()
+            if entry is None:
+                entry = self._stats[(template, host_label(use_analytics))] = {
+                    'avg_sec': seconds, 'samples': 0, 'timeouts': 0, 'updated': now,
+                }
+            elif now - entry['updated'] > self.max_age_sec:
+                entry['avg_sec'] = seconds
+            else:
+                entry['avg_sec'] += self.alpha * (seconds - entry['avg_sec'])
+            entry['samples'] += 1
+            entry['updated'] = now
+            if timed_out:
+                entry['timeouts'] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Statistics per template and host, for status endpoints."""
+        with self._lock:
+            out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+            for (template, host), entry in sorted(self._stats.items()):
+                out.setdefault(template, {})[host] = {
+                    'avg_sec': round(entry['avg_sec'], 2),
+                    'samples': entry['samples'],
+                    'timeouts': entry['timeouts'],
+                    'age_sec': int(time.time() - entry['updated']),
+                }
+            return out
+
+
+# Global router instance
+_router: Optional[ReplicaRouter] = None
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Get global replica router instance."""
+    global _router
+    if _router is None:
+        _router = ReplicaRouter(
+            alpha=Config.DB_ROUTING_EWMA_ALPHA,
+            headroom=Config.DB_ROUTING_HEADROOM,
+            max_age_sec=Config.DB_ROUTING_MAX_AGE_SEC,
+        )
+    return _router
@@ -0,0 +1,102 @@
+"""
+Request statistics for cache keys.
+
+The API counts hits per (cache kind, cache key) in memory and periodically
+merges them into shared/data/request_stats.json. Stored counts decay with a
+configurable half-life so they track current demand; prebuild_uploaders_cache
+uses them to decide which keys to refresh first.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import Config
+
+STATS_FILENAME = 'request_stats.json'
+
+
+def load_request_stats(path: Path) -> Dict[str, Dict[str, float]]:
+    """Read decayed hit counts: {kind: {cache_key: hits}}. Empty if missing."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('hits', {})
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+class RequestStats:
+    """Cheap in-memory hit counter flushed to a shared JSON file."""
+
+    def __init__(self, path: Path, flush_interval_sec: float, half_life_sec: float):
+        self.path = path
+        self.flush_interval_sec = flush_interval_sec
+        self.half_life_sec = half_life_sec
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.time()
+
+    def record(self, kind: str, key: str) -> None:
+        """Count one request for a cache key. Flushes at most every flush_interval_sec."""
+        with self._lock:
+            self._counts[(kind, key)] += 1
+            due = time.time() - self._last_flush >= self.flush_interval_sec
+            if due:
+                self._last_flush = time.time()
+        if due:
+            threading.Thread(target=self.flush, name='request-stats-flush', daemon=True).start()
+
+    def flush(self) -> None:
+        """Merge pending counts into the stats file, decaying what was stored."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._counts = self._counts, Counter()
+            if not pending:
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                stored = {}
+            now = time.time()
+            elapsed = max(0.0, now - stored.get('updated_at', now))
+            decay = 0.5 ** (elapsed / self.half_life_sec) if self.half_life_sec else 1.0
+            hits = {
+                kind: {k: v * decay for k, v in keys.items() if v * decay >= 0.01}
+                for kind, keys in stored.get('hits', {}).items()
+            }
+            for (kind, key), n in pending.items():
+                bucket = hits.setdefault(kind, {})
+                bucket[key] = bucket.get(key, 0.0) + n
+            tmp_path = self.path.with_name(f'.{self.path.name}.{os.getpid()}.tmp')
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'updated_at': now, 'hits': hits}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                # Keep the counts for the next flush rather than losing them
+                with self._lock:
+                    self._counts.update(pending)
+
+
+# Global request stats instance
+_request_stats: Optional[RequestStats] = None
+
+
+def get_request_stats() -> RequestStats:
+    """Get global request stats instance (flushed on interpreter exit)."""
+    global _request_stats
+    if _request_stats is None:
+        _request_stats = RequestStats(
+            Config.DATA_DIR / STATS_FILENAME,
+            flush_interval_sec=Config.REQUEST_STATS_FLUSH_SEC,
+            half_life_sec=Config.REQUEST_STATS_HALF_LIFE_SEC,
+        )
+        atexit.register(_request_stats.flush)
+    return _request_stats
@@ -7,16 +7,28 @@ import time
 import sys
 import json
 from pathlib import Path
-from flask import Blueprint, jsonify, request
-from typing import Dict, Any, Optional
+from flask import Blueprint, Response, jsonify, request
+from typing import Dict, Any, List, Optional
 import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from queries import get_query_manager
-from processor import get_processor
 from database import get_db
-from logger import get_logger, log_processing_start, log_processing_complete, log_query_execution
-from errors import CampaignNotFoundError, DatabaseError, ProcessingError, QueryTimeoutError
+from logger import get_logger, log_processing_start, log_query_execution
+from errors import CampaignNotFoundError, CircuitOpenError, DatabaseError, ProcessingError, QueryTimeoutError
 from config import Config
+from file_cache import STALE, read_cache, safe_cache_key, write_cache
+from cache_refresh import get_refresh_queue
+from negative_cache import get_key_manifest, get_negative_cache, normalize_country
+from miss_batcher import MissBatcher, get_batcher
+from prefetch import PrefetchTarget, get_prefetch_policy
+from request_stats import get_request_stats
+from replica_router import get_replica_router
+from query_watchdog import get_query_watchdog, query_scope
+from circuit_breaker import breaker_stats, replica_available
+from db_cassette import get_cassette
+from job_store import ALL_RESOURCES, CANCEL, PAUSE, RUNNING, get_job_store, resource_key
+from job_events import get_job_broadcaster
 
 try:
     import campaigns_metadata
@@ -24,21 +36,318 @@ try:
 except ImportError:
     _BATCH_CAMPAIGNS = ['earth', 'monuments', 'science', 'folklore', 'africa', 'food', 'public_art']
 
-# Global processing status
-_processing_status: Dict[str, Any] = {
-    'is_processing': False,
-    'current_task': None,
-    'start_time': None,
-    'last_update': None,
-    'error': None
-}
+# Last /api/health database probe, reused for Config.HEALTH_PROBE_CACHE_SEC
+_health_probe: Dict[str, Any] = {'checked_at': 0.0, 'healthy': False, 'error': None}
+_health_probe_lock = threading.Lock()
 
-# Lock for thread-safe status updates
-_status_lock = threading.Lock()
 
-# Uploaders cache: keys currently being built in background (so we don't block the request)
-_uploaders_building = set()
-_uploaders_building_lock = threading.Lock()
+def _processing_status() -> Dict[str, Any]:
+    """Fetch job status for /api/status (the job store holds the state; see job_worker.py)."""
+    store = get_job_store()
+    active = store.active_jobs()
+    running = [job for job in active if job['status'] == RUNNING]
+    current = running[0] if running else (active[0] if active else None)
+    last = store.list_jobs(limit=1)
+    if current is None:
+        return {
+            'is_processing': False,
+            'current_task': None,
+            'start_time': None,
+            'last_update': last[0]['finished'] if last else None,
+            'error': last[0]['error'] if last else None,
+            'running': 0,
+            'queued': 0,
+            'jobs': [],
+        }
+    tasks = []
+    for job in running or [current]:
+        step = (job['progress'] or {}).get('step')
+        tasks.append(f"{job['description']}: {step}" if step else job['description'])
+    return {
+        'is_processing': True,
+        'current_task': '; '.join(tasks),
+        'start_time': current['started'] or current['created'],
+        'last_update': current['heartbeat'] or current['created'],
+        'error': None,
+        'running': len(running),
+        'queued': len(active) - len(running),
+        'jobs': active,
+    }
+
+
+def _cached_response(data: Dict[str, Any], state: str, age: float):
+    """JSON response for a cache hit, with headers describing its freshness."""
+    response = jsonify(data)
+    response.headers['X-Cache'] = 'STALE' if state == STALE else 'HIT'
+    response.headers['Age'] = str(int(age))
+    if state == STALE:
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def _last_known_response(cache_file: Path) -> Optional[Any]:
+    """
+    Serve a cache file regardless of age while the replica is unavailable.
+
+    Returns:
+        The response, or None if there is no cache file at all.
+    """
+    data, _, age = read_cache(cache_file, 0, float('inf'))
+    if data is None:
+        return None
+    response = jsonify(data)
+    response.headers['X-Cache'] = 'STALE'
+    response.headers['Age'] = str(int(age))
+    response.headers['Warning'] = '111 - "Revalidation Failed"'
+    return response
+
+
+def _unavailable_response(cache_file: Path, message: str, retry_after: float):
+    """Last known data for cache_file, or 503 with Retry-After when there is none."""
+    response = _last_known_response(cache_file)
+    if response is not None:
+        return response
+    response = jsonify({'error': 'Database unavailable', 'message': message})
+    response.headers['Retry-After'] = str(max(1, int(retry_after)))
+    return response, 503
+
+
+def _replica_unavailable_message() -> str:
+    return 'The Wikimedia replicas are currently unavailable. Please retry in a minute.'
+
+
+def _resolve_country(campaign_slug: str, year: int, country: str) -> Optional[str]:
+    """
+    Canonical country name for a (campaign, year, country) request.
+
+    Returns None when the key is known not to exist: either the manifest covers
+    the campaign year and does not list it, or the DB recently returned nothing for it.
+    """
+    manifest = get_key_manifest()
+    if manifest.covers(campaign_slug, year):
+        return manifest.get_country(campaign_slug, year, country)
+    if get_negative_cache().contains((campaign_slug, year, normalize_country(country))):
+        return None
+    return country
+
+
+def _not_found_response(campaign_slug: str, year: int, country: str):
+    return jsonify({
+        'error': 'Not found',
+        'message': f'No data for campaign "{campaign_slug}" year {year} country "{country}"'
+    }), 404
+
+
+def _build_uploaders_batch(campaign_slug: str, year: int, countries: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Query uploaders for several countries of one campaign year in one grouped query
+    and write each country's cache file.
+
+    Returns:
+        Dict mapping country -> uploaders payload (countries without files are omitted).
+    """
+    logger = get_logger()
+    cfg = Config()
+    query_manager = get_query_manager()
+    rows_by_country = query_manager.execute_uploader_batch_quarry_style(
+        campaign_slug, year=year, countries=countries, use_analytics=False
+    )
+    results = {}
+    for country in countries:
+        raw_data = rows_by_country.get(country)
+        if not raw_data:
+            get_negative_cache().add((campaign_slug, year, normalize_country(country)))
+            continue
+        total = sum(int(r.get('images', 0) or 0) for r in raw_data)
+        result = []
+        for r in raw_data[:cfg.UPLOADERS_PER_COUNTRY_LIMIT]:
+            uploads = int(r.get('images', 0) or 0)
+            result.append({
+                'username': (r.get('username') or '').strip(),
+                'uploads': uploads,
+                'images_used': int(r.get('images_used', 0) or 0),
+                'percentage': round(100 * uploads / total, 2) if total else 0,
+            })
+        data = {'uploaders': result, 'total_uploads': total}
+        key = safe_cache_key(campaign_slug, year, country)
+        write_cache(cfg.UPLOADERS_CACHE_DIR / f"{key}.json", data)
+        results[country] = data
+    logger.info(
+        f'Uploaders cache written for {len(results)}/{len(countries)} countries '
+        f'of {campaign_slug} {year} in one query'
+    )
+    return results
+
+
+def _build_country_detail_batch(campaign_slug: str, year: int, countries: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Query stats for several countries of one campaign year in one grouped query
+    and write each country's cache file.
+
+    Counts come from the exact country category with no upload-date window, the
+    same aggregation the Quarry-style fetch uses for the campaign pages, so a
+    country's detail agrees with its row there (the former execute_campaign_query
+    path matched categories with LIKE and counted only files uploaded during the
+    campaign months).
+
+    Returns:
+        Dict mapping country -> country detail payload (countries without files are omitted).
+    """
+    logger = get_logger()
+    cfg = Config()
+    query_manager = get_query_manager()
+    rows_by_country = query_manager.execute_country_batch_quarry_style(
+        campaign_slug, year=year, countries=countries, use_analytics=True
+    )
+    results = {}
+    for country in countries:
+        row = rows_by_country.get(country)
+        if not row or not int(row.get('uploads', 0) or 0):
+            get_negative_cache().add((campaign_slug, year, normalize_country(country)))
+            continue
+        data = {
+            'campaign': (row.get('campaign_name') or campaign_slug).replace('_', ' '),
+            'year': year,
+            'country': country,
+            'category_name': row.get('category_name'),
+            'total_uploads': int(row.get('uploads', 0) or 0),
+            'total_uploaders': int(row.get('uploaders', 0) or 0),
+            'total_images_used': int(row.get('images_used', 0) or 0),
+            'total_new_uploaders': int(row.get('new_uploaders', 0) or 0),
+            'daily_stats': [],
+        }
+        key = safe_cache_key(campaign_slug, year, country)
+        try:
+            write_cache(cfg.COUNTRY_DETAIL_CACHE_DIR / f"{key}.json", data)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f'Could not cache country detail for {key}: {e}')
+        results[country] = data
+    logger.info(
+        f'Country detail cache written for {len(results)}/{len(countries)} countries '
+        f'of {campaign_slug} {year} in one query'
+    )
+    return results
+
+
+def _progressive_requested() -> bool:
+    """True if this request asked for (or defaults to) progressive answers on cache misses."""
+    value = request.args.get('progressive')
+    if value is None:
+        return Config.PROGRESSIVE_RESPONSES
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
+def _partial_response(data: Dict[str, Any]):
+    """JSON response for an index-only answer whose full aggregation is still running."""
+    response = jsonify(data)
+    response.headers['X-Cache'] = 'PARTIAL'
+    return response
+
+
+def _partial_country_detail(campaign_slug: str, year: int, country: str) -> Optional[Dict[str, Any]]:
+    """
+    Country detail with only total_uploads filled in, from the index-only count.
+
+    Returns:
+        The partial payload, or None if the index has no files for the country.
+    """
+    rows = get_query_manager().execute_upload_counts(
+        campaign_slug, year=year, country=country, use_analytics=False
+    )
+    uploads = sum(r['uploads'] for r in rows)
+    if not uploads:
+        return None
+    return {
+        'campaign': (rows[0].get('campaign_name') or campaign_slug).replace('_', ' '),
+        'year': year,
+        'country': country,
+        'category_name': rows[0].get('category_name'),
+        'total_uploads': uploads,
+        'total_uploaders': None,
+        'total_images_used': None,
+        'total_new_uploaders': None,
+        'daily_stats': [],
+        'partial': True,
+    }
+
+
+def _query_cache_file(campaign_slug: str, year: Optional[int], country: Optional[str]) -> Path:
+    return Config.QUERY_CACHE_DIR / f"{safe_cache_key(campaign_slug, year or 'all', country or 'all')}.json"
+
+
+def _build_query_result(campaign_slug: str, year: Optional[int], country: Optional[str]) -> Dict[str, Any]:
+    """Run the full campaign query for /api/query and write its cache file."""
+    logger = get_logger()
+    start_time = time.time()
+    raw_data = get_query_manager().execute_campaign_query(
+        campaign_slug,
+        year=year,
+        country=country,
+        use_analytics=True
+    )
+    query_duration = time.time() - start_time
+    log_query_execution(
+        logger,
+        'direct_query',
+        query_duration,
+        rows_returned=len(raw_data),
+        campaign_slug=campaign_slug
+    )
+    data = {
+        'campaign': campaign_slug,
+        'year': year,
+        'country': country,
+        'query_duration_seconds': round(query_duration, 2),
+        'rows_returned': len(raw_data),
+        'data': raw_data
+    }
+    try:
+        write_cache(_query_cache_file(campaign_slug, year, country), data)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f'Could not cache query result for {campaign_slug}: {e}')
+    return data
+
+
+def _prefetch_top_countries(campaign_slug: str, processed: Dict[str, Any]) -> None:
+    """Warm country detail + uploaders caches for the countries users are likely to open next."""
+    cfg = Config()
+    if not cfg.PREFETCH_ENABLED:
+        return
+    try:
+        get_prefetch_policy().schedule(campaign_slug, processed, [
+            PrefetchTarget(_country_detail_batcher(), cfg.COUNTRY_DETAIL_CACHE_DIR, cfg.COUNTRY_DETAIL_CACHE_TTL_SEC),
+            PrefetchTarget(_uploaders_batcher(), cfg.UPLOADERS_CACHE_DIR, cfg.UPLOADERS_CACHE_TTL_SEC),
+        ])
+    except Exception as e:
+        get_logger().warning(f'Prefetch scheduling failed for {campaign_slug}: {e}')
+
+
+def _positive_int(value: Any) -> Optional[int]:
+    """
+    A positive whole number from a JSON body field (int or digit string), or None if absent.
+
+    Raises:
+        ValueError: If the value is present but not a positive whole number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if not isinstance(value, int) or value <= 0:
+        raise ValueError(value)
+    return value
+
+
+def _uploaders_batcher() -> MissBatcher:
+    return get_batcher('uploaders', _build_uploaders_batch)
+
+
+def _country_detail_batcher() -> MissBatcher:
+    return get_batcher('country_detail', _build_country_detail_batch)
 
 
 def register_routes(app):
@@ -50,7 +359,13 @@ def register_routes(app):
         """Health check endpoint."""
         import os
         db = get_db()
-        db_healthy, db_error = db.test_connection(use_analytics=False)
+        # Probe at most every HEALTH_PROBE_CACHE_SEC; the probe goes through the web
+        # replica's circuit breaker, so it does not connect while the breaker is open
+        with _health_probe_lock:
+            if time.time() - _health_probe['checked_at'] >= Config.HEALTH_PROBE_CACHE_SEC:
+                healthy, error = db.test_connection(use_analytics=False)
+                _health_probe.update(checked_at=time.time(), healthy=healthy, error=error)
+            db_healthy, db_error = _health_probe['healthy'], _health_probe['error']
         
         # Check if credential files exist
         my_cnf_path = os.path.expanduser('~/.my.cnf')
@@ -72,6 +387,7 @@ def register_routes(app):
             }
         }
         
+        response['circuit_breakers'] = breaker_stats()
         if db_error:
             response['database_error'] = db_error
         
@@ -80,8 +396,14 @@ def register_routes(app):
     @api.route('/status', methods=['GET'])
     def status():
         """Get current processing status."""
-        with _status_lock:
-            status_copy = _processing_status.copy()
+        status_copy = _processing_status()
+        status_copy['cache_refresh'] = get_refresh_queue().stats()
+        status_copy['db_routing'] = get_replica_router().stats()
+        status_copy['query_watchdog'] = get_query_watchdog().stats()
+        status_copy['circuit_breakers'] = breaker_stats()
+        cassette = get_cassette()
+        if cassette is not None:
+            status_copy['db_cassette'] = cassette.stats()
         
         return jsonify(status_copy)
     
@@ -95,58 +417,20 @@ def register_routes(app):
         db = get_db()
         category = 'Images_from_Wiki_Loves_Earth_2025_in_Germany'
         
-        detail_query = f"""
-SELECT 
-    COUNT(DISTINCT i.img_name) AS uploads,
-    COUNT(DISTINCT a.actor_name) AS uploaders,
-    COUNT(DISTINCT CASE WHEN il_used.il_to IS NOT NULL THEN i.img_name END) AS images_used,
-    COUNT(DISTINCT CASE 
-        WHEN u.user_registration >= '20250501000000' AND u.user_registration <= '20250531235959'
-        THEN a.actor_name
-    END) AS new_uploaders
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id
-    AND p.page_namespace = 6
-    AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND cl.cl_to = '{category}'
-"""
-        uploaders_query = f"""
-SELECT 
-    a.actor_name AS username,
-    COUNT(DISTINCT i.img_name) AS images,
-    COUNT(DISTINCT CASE WHEN il_used.il_to IS NOT NULL THEN i.img_name END) AS images_used,
-    u.user_registration AS user_registration,
-    CASE 
-        WHEN u.user_registration >= '20250501000000' AND u.user_registration <= '20250531235959'
-        THEN 1
-        ELSE 0
-    END AS is_new_uploader
-FROM categorylinks cl
-JOIN page p ON cl.cl_from = p.page_id
-    AND p.page_namespace = 6
-    AND p.page_is_redirect = 0
-JOIN image i ON i.img_name = p.page_title
-JOIN actor_image a ON i.img_actor = a.actor_id
-LEFT JOIN imagelinks il_used ON il_used.il_to = p.page_id
-LEFT JOIN actor act ON a.actor_id = act.actor_id
-LEFT JOIN user u ON act.actor_user = u.user_id
-WHERE cl.cl_type = 'file'
-  AND cl.cl_to = '{category}'
-GROUP BY a.actor_name, u.user_registration
-ORDER BY images DESC
-LIMIT 500
-"""
+        query_manager = get_query_manager()
         try:
+            detail_query = query_manager.get_quarry_category_aggregation_query(
+                category, 'earth', 'Wiki Loves Earth', 2025
+            )
+            uploaders_query = query_manager.get_quarry_uploader_query(category, 'earth', 2025)
             start = time.time()
-            detail_rows = db.execute_query(detail_query, use_analytics=False)
+            detail_rows = query_manager.attach_new_uploaders(
+                db.execute_query(detail_query, use_analytics=False), 'earth'
+            )
             detail_time = time.time() - start
-            uploaders_rows = db.execute_query(uploaders_query, use_analytics=False)
+            uploaders_rows = query_manager.attach_registrations(
+                db.execute_query(uploaders_query, use_analytics=False), 'earth', 2025
+            )
             uploaders_time = time.time() - start - detail_time
             total_time = time.time() - start
             
@@ -185,54 +469,44 @@ LIMIT 500
             logger.error(f'Earth 2025 Germany test failed: {e}', exc_info=True)
             return jsonify({'error': str(e), 'message': 'Query failed'}), 500
 
-    _prebuild_state = {'running': False}
-    _prebuild_lock = threading.Lock()
-
     @api.route('/prebuild/status', methods=['GET'])
     def prebuild_status():
-        """Check if prebuild is currently running."""
-        with _prebuild_lock:
-            running = _prebuild_state['running']
-        return jsonify({'running': running, 'status': 'running' if running else 'idle'})
+        """Check if prebuild is currently running (queued prebuilds count as pending)."""
+        prebuilds = [job for job in get_job_store().active_jobs() if job['kind'] == 'prebuild']
+        running = [job for job in prebuilds if job['status'] == RUNNING]
+        response = {'running': bool(running), 'status': 'running' if running else ('queued' if prebuilds else 'idle')}
+        if prebuilds:
+            response['job_id'] = prebuilds[0]['id']
+            response['progress'] = prebuilds[0]['progress']
+        return jsonify(response)
 
     @api.route('/prebuild', methods=['POST'])
     def trigger_prebuild():
         """
-        Run prebuild (country detail + uploaders cache) in background.
-        Uses the web app's Python env (has pymysql etc). Returns immediately.
+        Queue prebuild (country detail + uploaders cache) for job_worker.py. Returns immediately.
+        Body (optional): {"max_seconds": 1800, "max_queries": 200, "workers": 4}
         """
-        try:
-            with _prebuild_lock:
-                if _prebuild_state['running']:
-                    return jsonify({
-                        'message': 'Prebuild already running',
-                        'status': 'running'
-                    }), 409
-                _prebuild_state['running'] = True
-
-            def run_prebuild():
-                try:
-                    from prebuild_uploaders_cache import main as prebuild_main
-                    prebuild_main()
-                except Exception as e:
-                    logger = get_logger()
-                    logger.error(f'Prebuild failed: {e}', exc_info=True)
-                finally:
-                    with _prebuild_lock:
-                        _prebuild_state['running'] = False
-
-            t = threading.Thread(target=run_prebuild, daemon=True)
-            t.start()
-            return jsonify({
-                'message': 'Prebuild started in background. Country detail and uploaders caches will be filled.',
-                'status': 'started'
-            }), 202
-        except Exception as e:
-            with _prebuild_lock:
-                _prebuild_state['running'] = False
-            logger = get_logger()
-            logger.error(f'Prebuild trigger failed: {e}', exc_info=True)
-            return jsonify({'error': str(e), 'message': 'Failed to start prebuild'}), 500
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body, dict):
+            return jsonify({'error': 'Invalid body', 'message': 'Expected a JSON object'}), 400
+        params = {}
+        for name in ('max_seconds', 'max_queries', 'workers'):
+            try:
+                params[name] = _positive_int(body.get(name))
+            except ValueError:
+                return jsonify({'error': f'Invalid {name}', 'message': f'{name} must be a positive integer'}), 400
+        # Every prebuild worker holds a replica connection of the job budget
+        workers = max(1, min(params['workers'] or Config.PREBUILD_WORKERS, Config.JOB_DB_CONNECTIONS))
+        params['workers'] = workers
+        store = get_job_store()
+        job = store.enqueue('prebuild', params, 'prebuild', [resource_key('prebuild')], connections=workers)
+        get_logger().info(f"Queued job {job['id']}: prebuild")
+        return jsonify({
+            'message': 'Prebuild queued. Country detail and uploaders caches will be filled.',
+            'status': 'started',
+            'job_id': job['id'],
+            **store.queue_info(job['id'])
+        }), 202
     
     @api.route('/campaigns', methods=['GET'])
     def campaigns():
@@ -307,62 +581,31 @@ LIMIT 500
     def get_country_uploaders(campaign_slug: str, year: int, country: str):
         """
         Get per-user (uploader) statistics for a country. Serves from cache when available.
+        Stale cache entries are served as-is and refreshed in the background.
         On cache miss: return immediately with empty list and building=True; build cache in background.
         """
         import urllib.parse
-        import re
-        logger = get_logger()
         country_decoded = urllib.parse.unquote(country).strip()
         if not country_decoded:
             return jsonify({'error': 'Invalid country', 'message': 'Country parameter is empty'}), 400
+        country_name = _resolve_country(campaign_slug, year, country_decoded)
+        if country_name is None:
+            return _not_found_response(campaign_slug, year, country_decoded)
+        country_decoded = country_name
 
         cfg = Config()
-        cache_dir = cfg.UPLOADERS_CACHE_DIR
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        safe_key = re.sub(r'[^\w\-]', '_', f"{campaign_slug}_{year}_{country_decoded}")[:120]
-        cache_file = cache_dir / f"{safe_key}.json"
-        now = time.time()
-        if cache_file.exists() and (now - cache_file.stat().st_mtime) < cfg.UPLOADERS_CACHE_TTL_SEC:
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                return jsonify(data)
-            except (json.JSONDecodeError, OSError):
-                pass
-
-        def build_cache():
-            with _uploaders_building_lock:
-                _uploaders_building.add(safe_key)
-            try:
-                query_manager = get_query_manager()
-                raw_data = query_manager.execute_uploader_quarry_style(
-                    campaign_slug, year=year, country=country_decoded, use_analytics=False
-                )
-                total = sum(int(r.get('images', 0) or 0) for r in raw_data)
-                result = []
-                for r in raw_data:
-                    uploads = int(r.get('images', 0) or 0)
-                    result.append({
-                        'username': (r.get('username') or '').strip(),
-                        'uploads': uploads,
-                        'images_used': int(r.get('images_used', 0) or 0),
-                        'percentage': round(100 * uploads / total, 2) if total else 0,
-                    })
-                data = {'uploaders': result, 'total_uploads': total}
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False)
-                logger.info(f'Uploaders cache written: {safe_key}')
-            except Exception as e:
-                logger.error(f'Background uploaders cache build failed {safe_key}: {e}', exc_info=True)
-            finally:
-                with _uploaders_building_lock:
-                    _uploaders_building.discard(safe_key)
-
-        with _uploaders_building_lock:
-            already_building = safe_key in _uploaders_building
-            if not already_building:
-                t = threading.Thread(target=build_cache, daemon=True)
-                t.start()
+        key = safe_cache_key(campaign_slug, year, country_decoded)
+        cache_file = cfg.UPLOADERS_CACHE_DIR / f"{key}.json"
+        get_request_stats().record('uploaders', key)
+        data, state, age = read_cache(
+            cache_file, cfg.UPLOADERS_CACHE_TTL_SEC, cfg.UPLOADERS_CACHE_MAX_STALE_SEC
+        )
+        if data is None and not replica_available():
+            return _unavailable_response(cache_file, _replica_unavailable_message(), cfg.DB_BREAKER_RESET_SEC)
+        if data is None or state == STALE:
+            _uploaders_batcher().submit(campaign_slug, year, country_decoded)
+        if data is not None:
+            return _cached_response(data, state, age)
 
         return jsonify({
             'uploaders': [],
@@ -375,69 +618,53 @@ LIMIT 500
     def get_country_detail(campaign_slug: str, year: int, country: str):
         """
         Get statistics for a single country in a campaign year.
-        Serves from cache when available; otherwise runs query and caches result for instant future loads.
+        Serves from cache when available (stale entries are served and refreshed in the
+        background); otherwise runs query and caches result for instant future loads.
         """
         import urllib.parse
-        import re
         logger = get_logger()
         country_decoded = urllib.parse.unquote(country).strip()
         if not country_decoded:
             return jsonify({'error': 'Invalid country', 'message': 'Country parameter is empty'}), 400
+        country_name = _resolve_country(campaign_slug, year, country_decoded)
+        if country_name is None:
+            return _not_found_response(campaign_slug, year, country_decoded)
+        country_decoded = country_name
         cfg = Config()
-        cache_dir = cfg.COUNTRY_DETAIL_CACHE_DIR
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        safe_key = re.sub(r'[^\w\-]', '_', f"{campaign_slug}_{year}_{country_decoded}")[:120]
-        cache_file = cache_dir / f"{safe_key}.json"
-        now = time.time()
-        if cache_file.exists() and (now - cache_file.stat().st_mtime) < cfg.COUNTRY_DETAIL_CACHE_TTL_SEC:
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                return jsonify(data)
-            except (json.JSONDecodeError, OSError):
-                pass
+        key = safe_cache_key(campaign_slug, year, country_decoded)
+        cache_file = cfg.COUNTRY_DETAIL_CACHE_DIR / f"{key}.json"
+        get_request_stats().record('country_detail', key)
+        data, state, age = read_cache(
+            cache_file, cfg.COUNTRY_DETAIL_CACHE_TTL_SEC, cfg.COUNTRY_DETAIL_CACHE_MAX_STALE_SEC
+        )
+        if data is not None:
+            if state == STALE:
+                _country_detail_batcher().submit(campaign_slug, year, country_decoded)
+            return _cached_response(data, state, age)
+        if not replica_available():
+            return _unavailable_response(cache_file, _replica_unavailable_message(), cfg.DB_BREAKER_RESET_SEC)
         try:
-            query_manager = get_query_manager()
-            raw_data = query_manager.execute_campaign_query(
-                campaign_slug,
-                year=year,
-                country=country_decoded,
-                use_analytics=True
-            )
-            if not raw_data:
-                return jsonify({
-                    'error': 'Not found',
-                    'message': f'No data for campaign "{campaign_slug}" year {year} country "{country_decoded}"'
-                }), 404
-            uploads = sum(int(r.get('uploads', 0) or 0) for r in raw_data)
-            uploaders = max(int(r.get('uploaders', 0) or 0) for r in raw_data)
-            images_used = sum(int(r.get('images_used', 0) or 0) for r in raw_data)
-            new_uploaders = max(int(r.get('new_uploaders', 0) or 0) for r in raw_data)
-            first = raw_data[0]
-            campaign_name = (first.get('campaign_name') or campaign_slug).replace('_', ' ')
-            country_display = (first.get('country') or country_decoded).strip()
-            category_name = f"Images_from_{first.get('campaign_name', campaign_slug).replace(' ', '_')}_{year}_in_{country_display.replace(' ', '_')}"
-            data = {
-                'campaign': campaign_name,
-                'year': year,
-                'country': country_display,
-                'category_name': category_name,
-                'total_uploads': uploads,
-                'total_uploaders': uploaders,
-                'total_images_used': images_used,
-                'total_new_uploaders': new_uploaders,
-                'daily_stats': [],
-            }
-            try:
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False)
-                logger.info(f'Country detail cache written: {safe_key}')
-            except OSError:
-                pass
+            # Misses for other countries of the same campaign year arriving within
+            # the batch window are answered by the same grouped query.
+            future = _country_detail_batcher().submit(campaign_slug, year, country_decoded)
+            if _progressive_requested():
+                # The batch writes the full entry to cache when it completes
+                try:
+                    partial = _partial_country_detail(campaign_slug, year, country_decoded)
+                except DatabaseError as e:
+                    logger.warning(f'Index-only count failed for {key}, waiting for full query: {e}')
+                    partial = None
+                if partial is not None:
+                    return _partial_response(partial)
+            data = future.result(timeout=cfg.API_TIMEOUT)
+            if data is None:
+                return _not_found_response(campaign_slug, year, country_decoded)
             return jsonify(data)
         except CampaignNotFoundError as e:
             return jsonify({'error': 'Campaign not found', 'message': str(e)}), 404
-        except QueryTimeoutError as e:
+        except CircuitOpenError as e:
+            return _unavailable_response(cache_file, str(e), e.retry_after)
+        except (QueryTimeoutError, FutureTimeoutError) as e:
             logger.error(f'Query timeout for country detail: {e}')
             return jsonify({'error': 'Query timeout', 'message': str(e)}), 503
         except DatabaseError as e:
@@ -461,6 +688,7 @@ LIMIT 500
                 'message': f'No processed data for campaign "{campaign_slug}". '
                            'Trigger a fetch first: POST /api/fetch/all or POST /api/fetch/<campaign_slug>'
             }), 404
+        _prefetch_top_countries(campaign_slug, data)
         return jsonify(data)
     
     @api.route('/data/<campaign_slug>/summary', methods=['GET'])
@@ -476,6 +704,7 @@ LIMIT 500
                 'error': 'Data not found',
                 'message': f'No processed data for campaign "{campaign_slug}". Trigger a fetch first.'
             }), 404
+        _prefetch_top_countries(campaign_slug, data)
         years = data.get('years', [])
         summary = []
         for y in years:
@@ -495,92 +724,28 @@ LIMIT 500
             'years': summary
         })
     
+    def _enqueue_fetch(kind: str, params: Dict[str, Any], description: str, resources: List[str]) -> Dict[str, Any]:
+        """
+        Queue a fetch job for job_worker.py. Jobs touching other campaigns/years
+        run alongside; a job conflicting with an active one waits for it.
+        """
+        store = get_job_store()
+        job = store.enqueue(kind, params, description, resources)
+        get_logger().info(f"Queued job {job['id']}: {description}")
+        return {
+            'job_id': job['id'],
+            'status': 'processing' if job['status'] == RUNNING else job['status'],
+            **store.queue_info(job['id']),
+        }
+    
     @api.route('/fetch/all', methods=['POST'])
     def fetch_all():
-        """Trigger full data refresh for all campaigns."""
-        logger = get_logger()
-        
-        with _status_lock:
-            if _processing_status['is_processing']:
-                return jsonify({
-                    'error': 'Processing already in progress',
-                    'current_task': _processing_status['current_task']
-                }), 409
-            
-            _processing_status.update({
-                'is_processing': True,
-                'current_task': 'fetch_all',
-                'start_time': time.time(),
-                'last_update': time.time(),
-                'error': None
-            })
-        
-        def process_all():
-            try:
-                logger.info('Starting full data refresh')
-                query_manager = get_query_manager()
-                processor = get_processor()
-                
-                # Execute unified query
-                start_time = time.time()
-                raw_data = query_manager.execute_unified_query(use_analytics=True)
-                query_duration = time.time() - start_time
-                
-                log_query_execution(
-                    logger,
-                    'unified_all_campaigns',
-                    query_duration,
-                    rows_returned=len(raw_data)
-                )
-                
-                # Process data
-                processed_data = processor.process_campaign_data(raw_data)
-                
-                # Validate
-                for campaign_slug, campaign_data in processed_data.items():
-                    errors = processor.validate_data(campaign_data)
-                    if errors:
-                        logger.warning(
-                            f'Validation errors for {campaign_slug}',
-                            extra={'errors': errors}
-                        )
-                
-                # Save processed data
-                for campaign_slug, campaign_data in processed_data.items():
-                    output_path = Config().DATA_DIR / f'{campaign_slug}_processed.json'
-                    processor.save_processed_data(campaign_data, str(output_path))
-                
-                duration = time.time() - start_time
-                log_processing_complete(
-                    logger,
-                    records_processed=len(raw_data),
-                    duration_seconds=duration
-                )
-                
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'last_update': time.time(),
-                        'error': None
-                    })
-                
-            except Exception as e:
-                logger.error(f'Error in full refresh: {str(e)}', exc_info=True)
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'error': str(e)
-                    })
-        
-        # Start processing in background thread
-        thread = threading.Thread(target=process_all, daemon=True)
-        thread.start()
+        """Queue a full data refresh for all campaigns."""
+        job = _enqueue_fetch('fetch_all', {}, 'fetch_all', [ALL_RESOURCES])
         
         return jsonify({
             'message': 'Full data refresh started',
-            'status': 'processing'
+            **job
         }), 202
     
     @api.route('/fetch/batch', methods=['POST'])
@@ -591,299 +756,137 @@ LIMIT 500
         Body (optional): {"campaigns": ["earth", "monuments", ...]}
         If omitted, fetches all campaigns from metadata.
         """
-        logger = get_logger()
-        
-        with _status_lock:
-            if _processing_status['is_processing']:
-                return jsonify({
-                    'error': 'Processing already in progress',
-                    'current_task': _processing_status['current_task']
-                }), 409
-            
-            campaigns = _BATCH_CAMPAIGNS
-            try:
-                data = request.get_json(silent=True) or {}
-                if data.get('campaigns'):
-                    campaigns = data['campaigns']
-            except Exception:
-                pass
-            
-            _processing_status.update({
-                'is_processing': True,
-                'current_task': f'fetch_batch({len(campaigns)} campaigns)',
-                'start_time': time.time(),
-                'last_update': time.time(),
-                'error': None
-            })
-        
-        def process_batch():
-            query_manager = get_query_manager()
-            processor = get_processor()
-            completed = []
-            failed = []
-            for i, campaign_slug in enumerate(campaigns):
-                try:
-                    with _status_lock:
-                        _processing_status['current_task'] = f'fetch_batch: {campaign_slug} ({i+1}/{len(campaigns)})'
-                        _processing_status['last_update'] = time.time()
-                    
-                    logger.info(f'Batch fetch: {campaign_slug} ({i+1}/{len(campaigns)}) Quarry-style')
-                    start_time = time.time()
-                    raw_data = query_manager.execute_campaign_quarry_style(
-                        campaign_slug,
-                        use_analytics=True
-                    )
-                    query_duration = time.time() - start_time
-                    
-                    log_query_execution(
-                        logger,
-                        'campaign_query',
-                        query_duration,
-                        rows_returned=len(raw_data),
-                        campaign_slug=campaign_slug
-                    )
-                    
-                    processed_data = processor.process_campaign_data(
-                        raw_data,
-                        campaign_slug=campaign_slug
-                    )
-                    errors = processor.validate_data(processed_data)
-                    if errors:
-                        logger.warning(f'Validation errors for {campaign_slug}', extra={'errors': errors})
-                    
-                    output_path = Config().DATA_DIR / f'{campaign_slug}_processed.json'
-                    processor.save_processed_data(processed_data, str(output_path))
-                    completed.append(campaign_slug)
-                    log_processing_complete(
-                        logger,
-                        campaign_slug=campaign_slug,
-                        records_processed=len(raw_data),
-                        duration_seconds=time.time() - start_time
-                    )
-                except CampaignNotFoundError as e:
-                    logger.error(f'Campaign not found: {campaign_slug}')
-                    failed.append(campaign_slug)
-                except Exception as e:
-                    logger.error(f'Error fetching campaign {campaign_slug}: {str(e)}', exc_info=True)
-                    failed.append(campaign_slug)
-            
-            with _status_lock:
-                _processing_status.update({
-                    'is_processing': False,
-                    'current_task': None,
-                    'last_update': time.time(),
-                    'error': None if not failed else f'Failed: {", ".join(failed)}'
-                })
-            logger.info(f'Batch fetch done: {len(completed)} ok, {len(failed)} failed', extra={
-                'completed': completed,
-                'failed': failed
-            })
+        campaigns = _BATCH_CAMPAIGNS
+        try:
+            data = request.get_json(silent=True) or {}
+            if data.get('campaigns'):
+                campaigns = data['campaigns']
+        except Exception:
+            pass
         
-        thread = threading.Thread(target=process_batch, daemon=True)
-        thread.start()
+        job = _enqueue_fetch(
+            'fetch_batch',
+            {'campaigns': list(campaigns)},
+            f'fetch_batch({len(campaigns)} campaigns)',
+            [resource_key(campaign_slug) for campaign_slug in campaigns]
+        )
         
         return jsonify({
             'message': f'Batch fetch started for {len(campaigns)} campaigns',
             'campaigns': campaigns,
-            'status': 'processing'
+            **job
         }), 202
     
     @api.route('/fetch/<campaign_slug>', methods=['POST'])
     def fetch_campaign(campaign_slug: str):
-        """Fetch data for a specific campaign."""
-        logger = get_logger()
-        
-        with _status_lock:
-            if _processing_status['is_processing']:
-                return jsonify({
-                    'error': 'Processing already in progress',
-                    'current_task': _processing_status['current_task']
-                }), 409
-            
-            _processing_status.update({
-                'is_processing': True,
-                'current_task': f'fetch_{campaign_slug}',
-                'start_time': time.time(),
-                'last_update': time.time(),
-                'error': None
-            })
-        
-        def process_campaign():
-            try:
-                logger.info(f'Starting data fetch for campaign: {campaign_slug} (Quarry-style)')
-                query_manager = get_query_manager()
-                processor = get_processor()
-                
-                # Quarry-style: per-category exact-match queries (fast ~14 sec each)
-                start_time = time.time()
-                raw_data = query_manager.execute_campaign_quarry_style(
-                    campaign_slug,
-                    use_analytics=True
-                )
-                query_duration = time.time() - start_time
-                
-                log_query_execution(
-                    logger,
-                    'campaign_query',
-                    query_duration,
-                    rows_returned=len(raw_data),
-                    campaign_slug=campaign_slug
-                )
-                
-                # Process data
-                processed_data = processor.process_campaign_data(
-                    raw_data,
-                    campaign_slug=campaign_slug
-                )
-                
-                # Validate
-                errors = processor.validate_data(processed_data)
-                if errors:
-                    logger.warning(
-                        f'Validation errors for {campaign_slug}',
-                        extra={'errors': errors}
-                    )
-                
-                # Save processed data
-                output_path = Config().DATA_DIR / f'{campaign_slug}_processed.json'
-                processor.save_processed_data(processed_data, str(output_path))
-                
-                duration = time.time() - start_time
-                log_processing_complete(
-                    logger,
-                    campaign_slug=campaign_slug,
-                    records_processed=len(raw_data),
-                    duration_seconds=duration
-                )
-                
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'last_update': time.time(),
-                        'error': None
-                    })
-                
-            except CampaignNotFoundError as e:
-                logger.error(f'Campaign not found: {campaign_slug}')
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'error': str(e)
-                    })
-            except Exception as e:
-                logger.error(f'Error fetching campaign {campaign_slug}: {str(e)}', exc_info=True)
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'error': str(e)
-                    })
-        
-        # Start processing in background thread
-        thread = threading.Thread(target=process_campaign, daemon=True)
-        thread.start()
+        """Queue a data fetch for a specific campaign."""
+        job = _enqueue_fetch(
+            'fetch_campaign',
+            {'campaign': campaign_slug},
+            f'fetch_{campaign_slug}',
+            [resource_key(campaign_slug)]
+        )
         
         return jsonify({
             'message': f'Data fetch started for campaign: {campaign_slug}',
-            'status': 'processing'
+            **job
         }), 202
     
     @api.route('/fetch/<campaign_slug>/<int:year>', methods=['POST'])
     def fetch_campaign_year(campaign_slug: str, year: int):
-        """Fetch data for a specific campaign and year."""
-        logger = get_logger()
-        
-        with _status_lock:
-            if _processing_status['is_processing']:
-                return jsonify({
-                    'error': 'Processing already in progress',
-                    'current_task': _processing_status['current_task']
-                }), 409
-            
-            _processing_status.update({
-                'is_processing': True,
-                'current_task': f'fetch_{campaign_slug}_{year}',
-                'start_time': time.time(),
-                'last_update': time.time(),
-                'error': None
-            })
-        
-        def process_campaign_year():
-            try:
-                logger.info(f'Starting data fetch for {campaign_slug} {year}')
-                query_manager = get_query_manager()
-                processor = get_processor()
-                
-                # Execute campaign query for specific year
-                start_time = time.time()
-                raw_data = query_manager.execute_campaign_query(
-                    campaign_slug,
-                    year=year,
-                    use_analytics=True
-                )
-                query_duration = time.time() - start_time
-                
-                log_query_execution(
-                    logger,
-                    'campaign_year_query',
-                    query_duration,
-                    rows_returned=len(raw_data),
-                    campaign_slug=campaign_slug
-                )
-                
-                # Process data
-                processed_data = processor.process_campaign_data(
-                    raw_data,
-                    campaign_slug=campaign_slug
-                )
-                
-                # Validate
-                errors = processor.validate_data(processed_data)
-                if errors:
-                    logger.warning(
-                        f'Validation errors for {campaign_slug} {year}',
-                        extra={'errors': errors}
-                    )
-                
-                # Save processed data
-                output_path = Config().DATA_DIR / f'{campaign_slug}_{year}_processed.json'
-                processor.save_processed_data(processed_data, str(output_path))
-                
-                duration = time.time() - start_time
-                log_processing_complete(
-                    logger,
-                    campaign_slug=campaign_slug,
-                    year=year,
-                    records_processed=len(raw_data),
-                    duration_seconds=duration
-                )
-                
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'last_update': time.time(),
-                        'error': None
-                    })
-                
-            except Exception as e:
-                logger.error(f'Error fetching {campaign_slug} {year}: {str(e)}', exc_info=True)
-                with _status_lock:
-                    _processing_status.update({
-                        'is_processing': False,
-                        'current_task': None,
-                        'error': str(e)
-                    })
-        
-        # Start processing in background thread
-        thread = threading.Thread(target=process_campaign_year, daemon=True)
-        thread.start()
+        """Queue a data fetch for a specific campaign and year."""
+        job = _enqueue_fetch(
+            'fetch_campaign_year',
+            {'campaign': campaign_slug, 'year': year},
+            f'fetch_{campaign_slug}_{year}',
+            [resource_key(campaign_slug, year)]
+        )
         
         return jsonify({
             'message': f'Data fetch started for {campaign_slug} {year}',
-            'status': 'processing'
+            **job
+        }), 202
+    
+    @api.route('/jobs', methods=['GET'])
+    def jobs():
+        """Recent fetch jobs, newest first. Query: ?status=queued,running&limit=50"""
+        states = tuple(s for s in request.args.get('status', '').split(',') if s) or None
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        return jsonify({'jobs': get_job_store().list_jobs(states, limit=limit)})
+    
+    @api.route('/jobs/events', methods=['GET'])
+    def job_events():
+        """
+        Server-Sent Events with the progress of queued, running and recently
+        finished jobs (event "progress", data: campaign, year, category_index,
+        category_total, rows, elapsed_sec, eta_sec, ...). Query: ?job=<id> for one job.
+        """
+        broadcaster = get_job_broadcaster()
+        job_id = request.args.get('job', type=int)
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID', 0))
+        except ValueError:
+            last_event_id = 0
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        body = broadcaster.stream(last_event_id, job_id)
+        if body is None:
+            # Stream limit reached: current events now, the browser reconnects after the retry delay
+            return Response(broadcaster.snapshot(last_event_id, job_id), mimetype='text/event-stream', headers=headers)
+        return Response(body, mimetype='text/event-stream', headers=headers)
+    
+    @api.route('/jobs/<int:job_id>', methods=['GET'])
+    def job_detail(job_id: int):
+        """One fetch job with its progress and result."""
+        store = get_job_store()
+        job = store.get(job_id)
+        if job is None:
+            return jsonify({'error': f'Job not found: {job_id}'}), 404
+        job.update(store.queue_info(job_id))
+        return jsonify(job)
+    
+    def _control_job(job_id: int, action: str):
+        """Pause or cancel a job: queued jobs at once, running ones at their next category boundary."""
+        store = get_job_store()
+        job = store.request_control(job_id, action)
+        if job is None:
+            existing = store.get(job_id)
+            if existing is None:
+                return jsonify({'error': f'Job not found: {job_id}'}), 404
+            return jsonify({'error': f"Job already {existing['status']}", 'status': existing['status']}), 409
+        get_logger().info(f'Job {job_id}: {action} requested')
+        if job['status'] == RUNNING:
+            return jsonify({
+                'message': f'Job {job_id} will {action} at its next category boundary; its running query is killed',
+                'status': RUNNING,
+                'control': job['control']
+            }), 202
+        return jsonify({'message': f"Job {job_id} {job['status']}", 'status': job['status']})
+    
+    @api.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id: int):
+        """Cancel a job; its checkpoints are discarded."""
+        return _control_job(job_id, CANCEL)
+    
+    @api.route('/jobs/<int:job_id>/pause', methods=['POST'])
+    def pause_job(job_id: int):
+        """Pause a job, keeping its checkpoints for /resume."""
+        return _control_job(job_id, PAUSE)
+    
+    @api.route('/jobs/<int:job_id>/resume', methods=['POST'])
+    def resume_job(job_id: int):
+        """Queue a paused (or failed) job again; it continues from its checkpoints."""
+        store = get_job_store()
+        job = store.resume(job_id)
+        if job is None:
+            existing = store.get(job_id)
+            if existing is None:
+                return jsonify({'error': f'Job not found: {job_id}'}), 404
+            return jsonify({'error': f"Job is {existing['status']}, not paused", 'status': existing['status']}), 409
+        get_logger().info(f'Job {job_id} resumed')
+        return jsonify({
+            'message': f'Job {job_id} queued to resume from its checkpoints',
+            'status': job['status'],
+            **store.queue_info(job_id)
         }), 202
     
     @api.route('/logs', methods=['GET'])
@@ -912,12 +915,16 @@ LIMIT 500
     @api.route('/query/<campaign_slug>', methods=['GET'])
     def query_campaign(campaign_slug: str):
         """
-        Execute SQL query for a campaign and return raw results immediately.
-        This endpoint runs the SQL query synchronously and returns the data directly.
+        Execute SQL query for a campaign and return raw results.
+        Results are cached (stale entries are served and refreshed in the background);
+        on a miss the query runs synchronously, or in progressive mode the index-only
+        upload counts are returned at once with partial=true while the full query
+        fills the cache in the background.
 
         Query parameters:
         - year: Optional year filter (e.g., ?year=2025)
         - country: Optional country filter (e.g., ?country=Germany)
+        - progressive: Optional, 1/0 to override Config.PROGRESSIVE_RESPONSES
         """
         logger = get_logger()
 
@@ -928,40 +935,46 @@ LIMIT 500
                 import urllib.parse
                 country = urllib.parse.unquote(country).strip() or None
 
+            cfg = Config()
+            cache_file = _query_cache_file(campaign_slug, year, country)
+            refresh_key = ('query', cache_file.stem)
+            data, state, age = read_cache(
+                cache_file, cfg.QUERY_CACHE_TTL_SEC, cfg.QUERY_CACHE_MAX_STALE_SEC
+            )
+            if data is not None:
+                if state == STALE:
+                    get_refresh_queue().enqueue(
+                        refresh_key, lambda: _build_query_result(campaign_slug, year, country)
+                    )
+                return _cached_response(data, state, age)
+            if not replica_available():
+                return _unavailable_response(cache_file, _replica_unavailable_message(), cfg.DB_BREAKER_RESET_SEC)
+
             logger.info(
                 f'Executing SQL query for campaign: {campaign_slug}'
                 + (f', year: {year}' if year else '')
                 + (f', country: {country}' if country else '')
             )
 
-            query_manager = get_query_manager()
-
-            start_time = time.time()
-            raw_data = query_manager.execute_campaign_query(
-                campaign_slug,
-                year=year,
-                country=country,
-                use_analytics=True
-            )
-            query_duration = time.time() - start_time
-
-            log_query_execution(
-                logger,
-                'direct_query',
-                query_duration,
-                rows_returned=len(raw_data),
-                campaign_slug=campaign_slug,
-                year=year
-            )
+            if _progressive_requested():
+                rows = get_query_manager().execute_upload_counts(
+                    campaign_slug, year=year, country=country, use_analytics=False
+                )
+                get_refresh_queue().enqueue(
+                    refresh_key, lambda: _build_query_result(campaign_slug, year, country)
+                )
+                return _partial_response({
+                    'campaign': campaign_slug,
+                    'year': year,
+                    'country': country,
+                    'rows_returned': len(rows),
+                    'data': rows,
+                    'partial': True,
+                })
 
-            return jsonify({
-                'campaign': campaign_slug,
-                'year': year,
-                'country': country,
-                'query_duration_seconds': round(query_duration, 2),
-                'rows_returned': len(raw_data),
-                'data': raw_data
-            })
+            # The client stops waiting after API_TIMEOUT; do not let the query outlive it
+            with query_scope(deadline=time.time() + cfg.API_TIMEOUT):
+                return jsonify(_build_query_result(campaign_slug, year, country))
             
         except CampaignNotFoundError as e:
             logger.error(f'Campaign not found: {campaign_slug}')
@@ -970,6 +983,9 @@ LIMIT 500
                 'message': str(e)
             }), 404
             
+        except CircuitOpenError as e:
+            return _unavailable_response(_query_cache_file(campaign_slug, year, country), str(e), e.retry_after)
+
         except QueryTimeoutError as e:
             logger.error(f'Query timeout for {campaign_slug}: {str(e)}')
             return jsonify({
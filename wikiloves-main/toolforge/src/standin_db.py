@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the commonswiki_p replica.
+
+A SQLite file with the parts of the MediaWiki schema the tool reads
+(categorylinks, page, image, actor, actor_image, user, imagelinks), the
+replica's indexes, and the MySQL functions used by QueryManager
+(SUBSTRING_INDEX, REGEXP, CAST ... AS UNSIGNED, DATE on MediaWiki
+timestamps). With Config.DB_BACKEND = 'standin' (or WIKILOVES_DB_BACKEND=standin)
+DatabaseConnection opens this file instead of the replica, so the queries,
+routes, prebuild and incremental update can be run and benchmarked offline.
+
+Generate a database (seeded, so runs are comparable):
+    python3 standin_db.py --scale monuments --seed 1 --years 2024 2025
+
+Distributions: country sizes follow a Zipf law, uploads per uploader are
+long-tailed (Pareto weights, a few heavy uploaders), a share of files is in
+two country categories, some uploaders register during the campaign, and a
+share of files is used on pages (imagelinks). Redirects, subcategory members
+and files outside any country category are mixed in so the filters of the
+real queries are exercised.
+"""
+
+import itertools
+import random
+import re
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import pymysql
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page (
+    page_id INTEGER PRIMARY KEY,
+    page_namespace INTEGER NOT NULL,
+    page_title TEXT NOT NULL,
+    page_is_redirect INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS page_name_title ON page (page_namespace, page_title);
+CREATE TABLE IF NOT EXISTS categorylinks (
+    cl_from INTEGER NOT NULL,
+    cl_to TEXT NOT NULL,
+    cl_sortkey TEXT NOT NULL DEFAULT '',
+    cl_timestamp TEXT NOT NULL,
+    cl_type TEXT NOT NULL DEFAULT 'page',
+    PRIMARY KEY (cl_from, cl_to)
+);
+CREATE INDEX IF NOT EXISTS cl_sortkey ON categorylinks (cl_to, cl_type, cl_sortkey, cl_from);
+CREATE INDEX IF NOT EXISTS cl_timestamp ON categorylinks (cl_to, cl_timestamp);
+CREATE TABLE IF NOT EXISTS image (
+    img_name TEXT PRIMARY KEY,
+    img_actor INTEGER NOT NULL,
+    img_timestamp TEXT NOT NULL,
+    img_size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS img_actor_timestamp ON image (img_actor, img_timestamp);
+CREATE TABLE IF NOT EXISTS actor (
+    actor_id INTEGER PRIMARY KEY,
+    actor_user INTEGER,
+    actor_name TEXT NOT NULL UNIQUE
+);
+CREATE VIEW IF NOT EXISTS actor_image AS SELECT actor_id, actor_user, actor_name FROM actor;
+CREATE TABLE IF NOT EXISTS user (
+    user_id INTEGER PRIMARY KEY,
+    user_name TEXT NOT NULL UNIQUE,
+    user_registration TEXT
+);
+CREATE TABLE IF NOT EXISTS imagelinks (
+    il_from INTEGER NOT NULL,
+    il_to TEXT NOT NULL,
+    il_from_namespace INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (il_from, il_to)
+);
+CREATE INDEX IF NOT EXISTS il_to ON imagelinks (il_to, il_from);
+"""
+
+# Files per campaign year, country categories, distinct uploaders per campaign year
+SCALES: Dict[str, Dict[str, int]] = {
+    'small': {'files_per_year': 5000, 'countries': 12, 'uploaders_per_year': 600},
+    'earth': {'files_per_year': 80000, 'countries': 35, 'uploaders_per_year': 8000},
+    'monuments': {'files_per_year': 250000, 'countries': 50, 'uploaders_per_year': 20000},
+}
+
+COUNTRIES = [
+    'Germany', 'Ukraine', 'India', 'Russia', 'Spain', 'France', 'Italy', 'Poland', 'Brazil',
+    'Armenia', 'Nigeria', 'Iran', 'Sweden', 'Austria', 'Mexico', 'Nepal', 'Bangladesh',
+    'Pakistan', 'Israel', 'Greece', 'Portugal', 'Serbia', 'Estonia', 'Ghana', 'Kenya',
+    'United_States', 'United_Kingdom', 'the_Netherlands', 'the_Philippines', 'South_Africa',
+    'Bosnia_and_Herzegovina', 'Czech_Republic', 'Sri_Lanka', 'Saudi_Arabia', 'New_Zealand',
+    'Argentina', 'Chile', 'Colombia', 'Peru', 'Egypt', 'Tunisia', 'Morocco', 'Uganda',
+    'Cameroon', 'Albania', 'Georgia', 'Azerbaijan', 'Belarus', 'Latvia', 'Lithuania',
+    'Malta', 'Ireland', 'Belgium', 'Switzerland', 'Denmark', 'Norway', 'Finland', 'Hungary',
+]
+
+# Competition month per campaign (the same windows QueryManager uses)
+CAMPAIGN_MONTHS = {
+    'africa': 3, 'monuments': 9, 'earth': 5, 'folklore': 2,
+    'science': 11, 'food': 7, 'public_art': 5,
+}
+
+MULTI_COUNTRY_SHARE = 0.03  # files also in a second country category
+NO_COUNTRY_SHARE = 0.02  # files only in the campaign-year category
+REDIRECT_SHARE = 0.005  # redirect pages in country categories
+USED_SHARE = 0.25  # files used on at least one page
+NEW_UPLOADER_SHARE = 0.3  # uploaders registered during the campaign month
+ANONYMOUS_SHARE = 0.02  # actors without a user account
+
+
+# --- MySQL compatibility -------------------------------------------------------
+
+def _substring_index(value: Any, delim: str, count: int) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value)
+    if not delim or count == 0:
+        return ''
+    parts = value.split(delim)
+    return delim.join(parts[:count]) if count > 0 else delim.join(parts[count:])
+
+
+def _regexp(pattern: str, value: Any) -> bool:
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+def _mw_date(value: Any) -> Optional[str]:
+    """DATE() of a MediaWiki 'YYYYMMDDHHMMSS' timestamp (or an ISO date)."""
+    if value is None:
+        return None
+    digits = re.sub(r'\D', '', str(value))
+    if len(digits) < 8:
+        return None
+    return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]}"
+
+
+# Result columns the replica returns as VARBINARY, which pymysql hands back as
+# bytes: MediaWiki name, title and timestamp columns, and the aliases QueryManager
+# gives to expressions over them (category_name and country derive from cl_to)
+BINARY_COLUMNS = frozenset({
+    'cl_to', 'category_name', 'country', 'page_title', 'img_name', 'img_timestamp',
+    'actor_name', 'username', 'user_name', 'user_registration', 'il_to',
+})
+
+
+def _replica_value(column: str, value: Any) -> Any:
+    """A result value typed as pymysql returns it from the replica (str -> bytes for binary columns)."""
+    if column in BINARY_COLUMNS and isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+
+_CAST_UNSIGNED = re.compile(r'\bAS\s+UNSIGNED\b', re.IGNORECASE)
+_SET_STATEMENT = re.compile(r'^\s*SET\s', re.IGNORECASE)
+_KILL_STATEMENT = re.compile(r'^\s*KILL\s+(?:QUERY\s+)?(\d+)\s*$', re.IGNORECASE)
+
+
+def translate_query(query: str) -> str:
+    """Rewrite the MySQL-only syntax QueryManager uses into SQLite."""
+    query = _CAST_UNSIGNED.sub('AS INTEGER', query)
+    return query.replace('%s', '?')
+
+
+def open_sqlite(path: Path) -> sqlite3.Connection:
+    """SQLite connection with the MySQL functions and case-sensitive LIKE of the replica."""
+    conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    conn.create_function('SUBSTRING_INDEX', 3, _substring_index, deterministic=True)
+    conn.create_function('REGEXP', 2, _regexp, deterministic=True)
+    conn.create_function('DATE', 1, _mw_date, deterministic=True)
+    # cl_to is varbinary on the replica; case-sensitive LIKE also lets SQLite use the index
+    conn.execute('PRAGMA case_sensitive_like = ON')
+    return conn
+
+
+# --- pymysql-like connection -----------------------------------------------------
+
+_connection_ids = itertools.count(1)
+_open_connections: Dict[int, 'StandinConnection'] = {}
+_open_lock = threading.Lock()
+
+
+class StandinCursor:
+    """
+    The subset of pymysql's DictCursor used by DatabaseConnection. Columns in
+    BINARY_COLUMNS come back as bytes, as from the replica.
+    """
+
+    def __init__(self, connection: 'StandinConnection'):
+        self._connection = connection
+        self._cursor = connection._conn.cursor()
+        self.description = None
+        self._rows: List[Dict[str, Any]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None) -> int:
+        if _SET_STATEMENT.match(query):
+            # Session variables (max_execution_time) have no SQLite equivalent
+            self.description, self._rows = None, []
+            return 0
+        kill = _KILL_STATEMENT.match(query)
+        if kill:
+            kill_connection_query(int(kill.group(1)))
+            self.description, self._rows = None, []
+            return 0
+        try:
+            self._cursor.execute(translate_query(query), tuple(params or ()))
+            rows = self._cursor.fetchall()
+        except sqlite3.OperationalError as e:
+            if 'interrupted' in str(e):
+                raise pymysql.err.OperationalError(1317, 'Query execution was interrupted') from e
+            raise pymysql.err.OperationalError(1064, str(e)) from e
+        except sqlite3.Error as e:
+            raise pymysql.err.ProgrammingError(1064, str(e)) from e
+        self.description = self._cursor.description
+        columns = [d[0] for d in self.description or ()]
+        self._rows = [
+            {column: _replica_value(column, value) for column, value in zip(columns, row)}
+            for row in rows
+        ]
+        return len(self._rows)
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self) -> Optional[Dict[str, Any]]:
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class StandinConnection:
+    """The subset of pymysql.Connection used by DatabaseConnection, backed by SQLite."""
+
+    def __init__(self, path: Path):
+        if not path.exists():
+            raise pymysql.err.OperationalError(
+                2003, f"Stand-in database {path} not found (generate it with standin_db.py)"
+            )
+        self._conn = open_sqlite(path)
+        self._thread_id = next(_connection_ids)
+        with _open_lock:
+            _open_connections[self._thread_id] = self
+
+    def cursor(self) -> StandinCursor:
+        return StandinCursor(self)
+
+    def thread_id(self) -> int:
+        return self._thread_id
+
+    def close(self) -> None:
+        with _open_lock:
+            _open_connections.pop(self._thread_id, None)
+        self._conn.close()
+
+
+def connect_standin(path: Path) -> StandinConnection:
+    """Open the stand-in database like pymysql.connect opens the replica."""
+    return StandinConnection(path)
+
+
+def kill_connection_query(connection_id: int) -> None:
+    """KILL QUERY equivalent: interrupt the statement running on a stand-in connection."""
+    with _open_lock:
+        connection = _open_connections.get(connection_id)
+    if connection is not None:
+        connection._conn.interrupt()
+
+
+# --- Synthetic data ----------------------------------------------------------------
+
+def _zipf_weights(n: int, s: float) -> List[float]:
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def _insert(conn: sqlite3.Connection, table: str, rows: Iterable[tuple]) -> int:
+    rows = list(rows)
+    if rows:
+        placeholders = ', '.join('?' * len(rows[0]))
+        conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', rows)
+    return len(rows)
+
+
+def generate(
+    path: Path,
+    scale: str = 'small',
+    seed: int = 0,
+    campaigns: Sequence[str] = ('earth', 'monuments'),
+    years: Sequence[int] = (2024, 2025),
+) -> Dict[str, int]:
+    """
+    Create (or replace) a stand-in database filled with synthetic campaign data.
+
+    Args:
+        path: SQLite file to write.
+        scale: Key of SCALES.
+        seed: Random seed; the same arguments always give the same database.
+        campaigns: Campaign slugs (keys of campaigns_metadata.ALL_CAMPAIGNS).
+        years: Campaign years.
+
+    Returns:
+        Row count per table.
+    """
+    from campaigns_metadata import ALL_CAMPAIGNS
+
+    params = SCALES[scale]
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    conn = open_sqlite(path)
+    conn.executescript(SCHEMA)
+
+    page_ids = itertools.count(1)
+    counts = {'page': 0, 'categorylinks': 0, 'image': 0, 'actor': 0, 'user': 0, 'imagelinks': 0}
+
+    # Article pages that use files (namespace 0)
+    article_ids = [next(page_ids) for _ in range(max(1000, params['files_per_year'] // 10))]
+    counts['page'] += _insert(conn, 'page', ((pid, 0, f'Article_{pid}', 0) for pid in article_ids))
+
+    actor_ids = itertools.count(1)
+    for slug in campaigns:
+        campaign_name = ALL_CAMPAIGNS[slug]['name'].replace(' ', '_')
+        prefix = f'Images_from_{campaign_name}_'
+        month = CAMPAIGN_MONTHS.get(slug, 3)
+        countries = COUNTRIES[:params['countries']]
+
+        # Uploader pool shared by the campaign's years, so some uploaders return
+        pool_size = int(params['uploaders_per_year'] * 1.5)
+        pool = [next(actor_ids) for _ in range(pool_size)]
+        first_year = min(years)
+        actors, users = [], []
+        for actor_id in pool:
+            name = f'{slug.capitalize()}_uploader_{actor_id}'
+            if rng.random() < ANONYMOUS_SHARE:
+                actors.append((actor_id, None, name))
+                continue
+            if rng.random() < NEW_UPLOADER_SHARE:
+                reg_year = rng.choice(list(years))
+                registration = f'{reg_year}{month:02d}{rng.randint(1, 28):02d}{rng.randint(0, 23):02d}0000'
+            else:
+                registration = f'{rng.randint(first_year - 12, first_year - 1)}{rng.randint(1, 12):02d}150000'
+            actors.append((actor_id, actor_id, name))
+            users.append((actor_id, name, registration))
+        counts['actor'] += _insert(conn, 'actor', actors)
+        counts['user'] += _insert(conn, 'user', users)
+
+        for year in years:
+            year_pool = rng.sample(pool, params['uploaders_per_year'])
+            uploader_weights = list(itertools.accumulate(rng.paretovariate(1.2) for _ in year_pool))
+            country_weights = list(itertools.accumulate(_zipf_weights(len(countries), 1.1)))
+            pages, links, images, usage = [], [], [], []
+            for subcat in countries:
+                # A subcategory member: must be ignored by cl_type = 'file' filters
+                pid = next(page_ids)
+                pages.append((pid, 14, f'{prefix}{year}_in_{subcat}_by_region', 0))
+                links.append((pid, f'{prefix}{year}_in_{subcat}', '', f'{year}{month:02d}01000000', 'subcat'))
+            for n in range(params['files_per_year']):
+                pid = next(page_ids)
+                title = f'{slug.upper()}_{year}_{n}.jpg'
+                timestamp = (
+                    f'{year}{month:02d}{rng.randint(1, 30 if month != 2 else 28):02d}'
+                    f'{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}{rng.randint(0, 59):02d}'
+                )
+                redirect = rng.random() < REDIRECT_SHARE
+                pages.append((pid, 6, title, 1 if redirect else 0))
+                if not redirect:
+                    uploader = rng.choices(year_pool, cum_weights=uploader_weights)[0]
+                    images.append((title, uploader, timestamp, rng.randint(200_000, 12_000_000)))
+                    if rng.random() < USED_SHARE:
+                        for article in rng.sample(article_ids, min(len(article_ids), 1 + int(rng.expovariate(0.8)))):
+                            usage.append((article, title, 0))
+                if rng.random() < NO_COUNTRY_SHARE:
+                    categories = [f'{prefix}{year}']
+                else:
+                    country = rng.choices(countries, cum_weights=country_weights)[0]
+                    categories = [f'{prefix}{year}_in_{country}']
+                    if rng.random() < MULTI_COUNTRY_SHARE:
+                        second = rng.choice(countries)
+                        if second != country:
+                            categories.append(f'{prefix}{year}_in_{second}')
+                for category in categories:
+                    links.append((pid, category, title, timestamp, 'file'))
+            counts['page'] += _insert(conn, 'page', pages)
+            counts['categorylinks'] += _insert(conn, 'categorylinks', links)
+            counts['image'] += _insert(conn, 'image', images)
+            counts['imagelinks'] += _insert(conn, 'imagelinks', set(usage))
+            conn.commit()
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+    return counts
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a local stand-in for the commonswiki_p replica.')
+    parser.add_argument('--out', default=None, help=f'SQLite file (default {Config.STANDIN_DB_PATH})')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--campaigns', nargs='+', default=['earth', 'monuments'])
+    parser.add_argument('--years', nargs='+', type=int, default=[2024, 2025])
+    args = parser.parse_args()
+    out = Path(args.out) if args.out else Config.STANDIN_DB_PATH
+    table_counts = generate(out, scale=args.scale, seed=args.seed, campaigns=args.campaigns, years=args.years)
+    print(f'{out}: ' + ', '.join(f'{table} {n}' for table, n in table_counts.items()))
+    print('Use it with WIKILOVES_DB_BACKEND=standin (or Config.DB_BACKEND = "standin").')